@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'horizonsapi.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,12 +82,39 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default, for development. It's put in WAL mode, so that reads don't wait for a write to finish.
+# In production, use PostgreSQL (through psycopg2-binary, in requirements.txt), which lets cache writes run
+# alongside each other and partitions OrbitalPosition by time (see horizonsapi/migrations/0008_partition_orbitalposition.py):
+#   DATABASE_ENGINE=django.db.backends.postgresql DATABASE_NAME=horizonsapi DATABASE_USER=horizonsapi
+#   DATABASE_PASSWORD=... DATABASE_HOST=127.0.0.1 DATABASE_PORT=5432
+DATABASE_ENGINE = config('DATABASE_ENGINE', default='django.db.backends.sqlite3')
+
+if DATABASE_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': DATABASE_ENGINE,
+            'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                # Seconds to wait for another connection's write to finish before giving up.
+                'timeout': config('SQLITE_TIMEOUT', default=20, cast=float),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DATABASE_ENGINE,
+            'NAME': config('DATABASE_NAME', default='horizonsapi'),
+            'USER': config('DATABASE_USER', default=''),
+            'PASSWORD': config('DATABASE_PASSWORD', default=''),
+            'HOST': config('DATABASE_HOST', default=''),
+            'PORT': config('DATABASE_PORT', default=''),
+        }
     }
-}
+
+# Seconds to keep a database connection open for reuse by later requests, instead of connecting for each one.
+# 0 closes connections at the end of every request.
+DATABASES['default']['CONN_MAX_AGE'] = config('DATABASE_CONN_MAX_AGE', default=600, cast=int)
 
 
 # Password validation
@@ -129,3 +157,96 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+#
+# Local memory by default. To share the cache between worker processes, use for example:
+#   CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache CACHE_LOCATION=/var/tmp/horizonsapi_cache
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379 (needs the redis package)
+
+CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default='horizonsapi'),
+        'TIMEOUT': config('CACHE_TIMEOUT', default=3600, cast=int),
+    }
+}
+
+if CACHE_BACKEND in [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+]:
+    # These backends cull entries once there are more than MAX_ENTRIES (300 by default).
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int),
+    }
+
+
+# Horizons API
+
+# Cache (from CACHES) shared by every worker process, for responses and orbital body metadata.
+# See horizonsapi/response_cache.py for the key scheme.
+HORIZONSAPI_CACHE = config('HORIZONSAPI_CACHE', default='default')
+
+# Where cached orbital positions are served from: 'rows' (the OrbitalPosition table)
+# or 'chunks' (packed monthly EphemerisChunk columns, see horizonsapi/storage.py).
+# Run `python manage.py import_ephemeris_chunks` before switching an existing database to 'chunks'.
+HORIZONSAPI_STORAGE = config('HORIZONSAPI_STORAGE', default='rows')
+
+# In-process cache of serialized orbital_position responses, in front of HORIZONSAPI_CACHE
+# Maximum total size of the cached responses, in bytes. Set it to 0 to disable the cache.
+HORIZONSAPI_RESPONSE_CACHE_BYTES = config('HORIZONSAPI_RESPONSE_CACHE_BYTES', default=64 * 1024 * 1024, cast=int)
+# Seconds a cached response stays valid.
+HORIZONSAPI_RESPONSE_CACHE_TTL = config('HORIZONSAPI_RESPONSE_CACHE_TTL', default=3600, cast=float)
+
+# Seconds to remember that Horizons doesn't know an orbital body, or had no positions for a range,
+# before asking it again.
+HORIZONSAPI_NEGATIVE_CACHE_TTL = config('HORIZONSAPI_NEGATIVE_CACHE_TTL', default=3600, cast=int)
+
+# Send the time spent in each stage of a request (database, Horizons, parsing...) in a Server-Timing header.
+# The same timings, summed over all requests, are always available at /metrics.
+HORIZONSAPI_SERVER_TIMING = config('HORIZONSAPI_SERVER_TIMING', default=False, cast=bool)
+
+# Seconds that browsers and proxies may reuse an orbital_position response for a window that ended in the past.
+# Responses for windows that reach the present or future must be revalidated with their ETag every time.
+# Responses missing some positions are only reused for HORIZONSAPI_NEGATIVE_CACHE_TTL seconds at most.
+HORIZONSAPI_HISTORY_MAX_AGE = config('HORIZONSAPI_HISTORY_MAX_AGE', default=7 * 24 * 60 * 60, cast=int)
+
+# Largest estimated error, in degrees of mean longitude, allowed when a request with interpolate=true is
+# served by interpolating between cached positions, by class of orbital body. See horizonsapi/interpolation.py.
+HORIZONSAPI_INTERPOLATION_TOLERANCES = {
+    'planet': config('HORIZONSAPI_INTERPOLATION_TOLERANCE_PLANET', default=0.001, cast=float),
+    'moon': config('HORIZONSAPI_INTERPOLATION_TOLERANCE_MOON', default=0.01, cast=float),
+    'small_body': config('HORIZONSAPI_INTERPOLATION_TOLERANCE_SMALL_BODY', default=0.001, cast=float),
+    'spacecraft': config('HORIZONSAPI_INTERPOLATION_TOLERANCE_SPACECRAFT', default=0.01, cast=float),
+}
+
+# Horizons API client, see horizonsapi/horizons.py
+HORIZONS_API_URL = config('HORIZONS_API_URL', default='https://ssd.jpl.nasa.gov/api/horizons.api')
+# Seconds to wait for Horizons to connect or send data before giving up.
+HORIZONS_TIMEOUT = config('HORIZONS_TIMEOUT', default=30, cast=float)
+# Times a failed Horizons request is retried, with exponential backoff.
+HORIZONS_RETRIES = config('HORIZONS_RETRIES', default=3, cast=int)
+# Maximum number of Horizons requests running at the same time.
+HORIZONS_MAX_CONNECTIONS = config('HORIZONS_MAX_CONNECTIONS', default=4, cast=int)
+# Directory of recorded Horizons responses. When set, responses are served from it instead of Horizons.
+# To benchmark against a local server instead, run `python manage.py horizons_stub_server`
+# and point HORIZONS_API_URL at it.
+HORIZONS_FIXTURES_DIR = config('HORIZONS_FIXTURES_DIR', default='')
+# 'replay' only serves recorded responses. 'record' fetches and records the ones that are missing.
+HORIZONS_FIXTURES_MODE = config('HORIZONS_FIXTURES_MODE', default='replay')
+
+# Prefetching, see horizonsapi/prefetch.py and `python manage.py prefetch_positions`
+# Record recent requests so the prefetch_positions command can cache what clients will ask for next.
+# The command runs in its own process, so CACHE_BACKEND must be shared (not the default local memory cache).
+HORIZONSAPI_PREFETCH = config('HORIZONSAPI_PREFETCH', default=False, cast=bool)
+# Days from now to keep cached for every recently requested orbital body, center and step.
+HORIZONSAPI_PREFETCH_DAYS = config('HORIZONSAPI_PREFETCH_DAYS', default=7, cast=float)
+# Number of windows, as long as the client's last one, to keep cached after it.
+HORIZONSAPI_PREFETCH_WINDOWS = config('HORIZONSAPI_PREFETCH_WINDOWS', default=2, cast=int)
+# Seconds after its last request that an orbital body, center and step stops being prefetched.
+HORIZONSAPI_PREFETCH_IDLE = config('HORIZONSAPI_PREFETCH_IDLE', default=3600, cast=float)
@@ -16,7 +16,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from horizonsapi.views import metrics
+
 urlpatterns = [
     path('horizonsapi/', include('horizonsapi.urls')),
+    path('metrics', metrics, name='metrics'),
     path('admin/', admin.site.urls),
 ]
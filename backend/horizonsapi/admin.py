@@ -1,7 +1,9 @@
 from django.contrib import admin
 
-from .models import OrbitalBody, OrbitalPosition
+from .models import CoverageInterval, EphemerisChunk, OrbitalBody, OrbitalPosition
 
 # Register your models here.
 admin.site.register(OrbitalPosition)
 admin.site.register(OrbitalBody)
+admin.site.register(EphemerisChunk)
+admin.site.register(CoverageInterval)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class HorizonsapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'horizonsapi'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .database import configure_sqlite
+
+        connection_created.connect(configure_sqlite)
@@ -0,0 +1,158 @@
+from django.db import transaction
+
+from datetime import datetime, timedelta
+import numpy as np
+from typing import Dict, List, Tuple
+
+from .date_utils import group_date_ranges, parse_step, step_timedelta
+from .horizons import UNIX_EPOCH
+from .models import CoverageInterval, OrbitalPosition
+
+# Grid points found on either side of a requested date by find_bracketing_dates, relative to the one at or
+# before it. The outer ones are the neighbours that the interpolation error is estimated from.
+BRACKET_OFFSETS = np.array([-1, 0, 1, 2])
+
+
+def find_covered_dates(
+    orbital_body_id: str, center: str, requested_dates: List[datetime]
+) -> Tuple[List[datetime], List[datetime]]:
+    """
+    Splits the requested dates (which must be ordered) into ones inside a recorded coverage interval
+    and ones that aren't, with a single indexed query. Only the covered dates need to be looked up in the cache.
+    """
+    if len(requested_dates) == 0:
+        return (list(), list())
+
+    coverage_intervals = CoverageInterval.objects.filter(
+        orbital_body_id=orbital_body_id,
+        center=center,
+        start__lte=requested_dates[-1],
+        stop__gte=requested_dates[0],
+    )
+    requested_times = np.array(
+        [int(date.timestamp()) for date in requested_dates], dtype=np.int64
+    )
+    covered = np.zeros(len(requested_dates), dtype=bool)
+    for coverage_interval in coverage_intervals:
+        start = int(coverage_interval.start.timestamp())
+        stop = int(coverage_interval.stop.timestamp())
+        step = int(
+            step_timedelta(
+                coverage_interval.interval, coverage_interval.skip
+            ).total_seconds()
+        )
+        # The requested dates are ordered, so only the ones inside the interval are checked against its grid.
+        first = int(np.searchsorted(requested_times, start, side="left"))
+        last = int(np.searchsorted(requested_times, stop, side="right"))
+        covered[first:last] |= (requested_times[first:last] - start) % step == 0
+
+    covered_dates = list()
+    uncovered_dates = list()
+    for date, is_date_covered in zip(requested_dates, covered.tolist()):
+        if is_date_covered:
+            covered_dates.append(date)
+        else:
+            uncovered_dates.append(date)
+    return (covered_dates, uncovered_dates)
+
+
+def find_bracketing_dates(
+    orbital_body_id: str, center: str, requested_dates: List[datetime]
+) -> List[datetime]:
+    """
+    The cached dates around each requested date, from the recorded coverage intervals: the grid points
+    of every interval it falls in at or before it and after it, and one more on either side.
+    Unlike loading every cached position in the range, this stays proportional to the number of requested dates,
+    however finely the range is cached.
+    """
+    if len(requested_dates) == 0:
+        return list()
+
+    coverage_intervals = CoverageInterval.objects.filter(
+        orbital_body_id=orbital_body_id,
+        center=center,
+        start__lte=requested_dates[-1],
+        stop__gte=requested_dates[0],
+    )
+    requested_times = np.array(
+        [int(date.timestamp()) for date in requested_dates], dtype=np.int64
+    )
+    bracketing_times = [np.empty(0, dtype=np.int64)]
+    for coverage_interval in coverage_intervals:
+        start = int(coverage_interval.start.timestamp())
+        stop = int(coverage_interval.stop.timestamp())
+        step = int(
+            step_timedelta(
+                coverage_interval.interval, coverage_interval.skip
+            ).total_seconds()
+        )
+        inside = requested_times[(requested_times >= start) & (requested_times <= stop)]
+        grid_times = (
+            start + (((inside - start) // step)[:, np.newaxis] + BRACKET_OFFSETS) * step
+        ).ravel()
+        bracketing_times.append(
+            grid_times[(grid_times >= start) & (grid_times <= stop)]
+        )
+
+    return [
+        UNIX_EPOCH + timedelta(seconds=timestamp)
+        for timestamp in np.unique(np.concatenate(bracketing_times)).tolist()
+    ]
+
+
+def record_coverage(orbital_positions: List[OrbitalPosition], step: str) -> None:
+    """
+    Records the ranges that the orbital positions (fetched with the given step) cover,
+    merging them with any overlapping or adjacent intervals on the same time grid.
+    """
+    (skip, interval) = parse_step(step)
+    step_delta = step_timedelta(interval, skip)
+    if step_delta == timedelta():
+        # Calendar steps like months aren't on a fixed grid, so their coverage can't be recorded.
+        return
+
+    times_by_key: Dict[Tuple[str, str], List[datetime]] = dict()
+    for position in orbital_positions:
+        key = (str(position.orbital_body_id), position.center)
+        times_by_key.setdefault(key, list()).append(position.time)
+
+    with transaction.atomic():
+        for (orbital_body_id, center), times in times_by_key.items():
+            for start, stop in group_date_ranges(sorted(times), interval, skip):
+                merge_coverage_interval(
+                    orbital_body_id, center, interval, skip, start, stop
+                )
+
+
+def merge_coverage_interval(
+    orbital_body_id: str,
+    center: str,
+    interval: str,
+    skip: int,
+    start: datetime,
+    stop: datetime,
+) -> CoverageInterval:
+    step = step_timedelta(interval, skip)
+    neighbours = [
+        coverage_interval
+        for coverage_interval in CoverageInterval.objects.select_for_update().filter(
+            orbital_body_id=orbital_body_id,
+            center=center,
+            interval=interval,
+            skip=skip,
+            start__lte=stop + step,
+            stop__gte=start - step,
+        )
+        if (start - coverage_interval.start) % step == timedelta()
+    ]
+    CoverageInterval.objects.filter(
+        id__in=[coverage_interval.id for coverage_interval in neighbours]
+    ).delete()
+    return CoverageInterval.objects.create(
+        orbital_body_id=orbital_body_id,
+        center=center,
+        interval=interval,
+        skip=skip,
+        start=min([start] + [neighbour.start for neighbour in neighbours]),
+        stop=max([stop] + [neighbour.stop for neighbour in neighbours]),
+    )
@@ -0,0 +1,95 @@
+from django.db import connection
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+import csv
+import io
+from typing import List, Tuple
+
+from .models import ELEMENT_FIELDS, OrbitalPosition
+
+# Columns of OrbitalPosition written by copy_orbital_positions, in the order they're copied.
+COPY_COLUMNS = ["orbital_body_id", "center", "time"] + ELEMENT_FIELDS
+
+STAGING_TABLE = "orbital_position_staging"
+
+
+def configure_sqlite(sender, connection: BaseDatabaseWrapper, **kwargs) -> None:
+    """
+    Puts SQLite in WAL mode whenever a connection is opened, so that reads don't wait for a write
+    to finish (writes still happen one at a time). In WAL mode synchronous=NORMAL is still safe
+    from corruption, and saves syncing to disk on every commit.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+
+
+def lock_for_writing() -> None:
+    """
+    On SQLite, takes the write lock at the start of a transaction, before anything is read.
+    Django starts transactions with a plain BEGIN, which only takes the lock at the first write. If another
+    connection writes in the meantime, this one's reads are out of date, so it fails with "database is locked"
+    straight away instead of waiting for the lock. A write that changes nothing takes the lock without doing anything.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {connection.ops.quote_name(OrbitalPosition._meta.db_table)} WHERE 0"
+        )
+
+
+def supports_copy() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def copy_orbital_positions(orbital_positions: List[OrbitalPosition]) -> Tuple[int, int]:
+    """
+    Upserts orbital positions on PostgreSQL by COPYing them into a temporary table, then merging that
+    into OrbitalPosition with a single INSERT ... ON CONFLICT. Must be called inside a transaction.
+    Returns the number of inserted and updated positions.
+    """
+    quote_name = connection.ops.quote_name
+    table = quote_name(OrbitalPosition._meta.db_table)
+    columns = ", ".join(quote_name(column) for column in COPY_COLUMNS)
+    # The columns of the unique_orbital_position constraint.
+    key_columns = ", ".join(
+        quote_name(column) for column in ["orbital_body_id", "center", "time"]
+    )
+    updates = ", ".join(
+        f"{quote_name(field)} = EXCLUDED.{quote_name(field)}"
+        for field in ELEMENT_FIELDS
+    )
+
+    data = io.StringIO()
+    writer = csv.writer(data)
+    for position in orbital_positions:
+        writer.writerow(
+            [position.orbital_body_id, position.center, position.time.isoformat()]
+            + [getattr(position, field) for field in ELEMENT_FIELDS]
+        )
+    data.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {table} WITH NO DATA"
+        )
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)", data
+        )
+        # xmax is 0 for rows that were inserted rather than updated.
+        cursor.execute(
+            f"WITH merged AS ("
+            f"INSERT INTO {table} ({columns}) "
+            f"SELECT DISTINCT ON ({key_columns}) {columns} FROM {STAGING_TABLE} "
+            f"ON CONFLICT ({key_columns}) DO UPDATE SET {updates} "
+            f"RETURNING xmax = 0 AS inserted"
+            f") SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged"
+        )
+        (insert_count, update_count) = cursor.fetchone()
+        # Dropped now rather than at commit, in case more positions are copied in the same transaction.
+        cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+    return (insert_count, update_count)
@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 import re
-from typing import Generator, Tuple
+from typing import Generator, List, Tuple
 
 
 def parse_step(step: str) -> Tuple[int, str]:
@@ -69,3 +69,30 @@ def generate_date_range(
             td = timedelta(minutes=n)
 
         yield start_date + td
+
+
+def step_timedelta(interval: str, skip: int) -> timedelta:
+    if interval == "d":
+        return timedelta(days=skip)
+    elif interval == "h":
+        return timedelta(hours=skip)
+    elif interval == "min":
+        return timedelta(minutes=skip)
+    return timedelta()
+
+
+def group_date_ranges(
+    dates: List[datetime], interval: str, skip: int, max_gap: int = 1
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Merges an ordered list of dates on a regular grid into (start, stop) ranges.
+    Dates up to max_gap steps apart end up in the same range.
+    """
+    step = step_timedelta(interval, skip)
+    ranges: List[Tuple[datetime, datetime]] = list()
+    for date in dates:
+        if len(ranges) > 0 and date - ranges[-1][1] <= step * max_gap:
+            ranges[-1] = (ranges[-1][0], date)
+        else:
+            ranges.append((date, date))
+    return ranges
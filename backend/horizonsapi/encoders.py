@@ -0,0 +1,221 @@
+from django.core import serializers
+
+import json
+import numpy as np
+import struct
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from .iter_utils import batched
+from .kepler import DERIVED_FIELDS, derive_elements
+from .models import ELEMENT_FIELDS, OrbitalPosition, OrbitalPositionEncoder
+
+
+def format_time(orbital_position: OrbitalPosition) -> str:
+    # Times are always whole seconds in UTC, which matches what DjangoJSONEncoder outputs.
+    return orbital_position.time.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def encode_django(orbital_positions: List[OrbitalPosition]) -> str:
+    """The original format: Django's serializer envelope around every orbital position."""
+    return serializers.serialize("json", orbital_positions, cls=OrbitalPositionEncoder)
+
+
+def encode_rows(orbital_positions: List[OrbitalPosition]) -> str:
+    """One object per orbital position, with the time and orbital elements."""
+    rows = list()
+    for orbital_position in orbital_positions:
+        row: Dict[str, Any] = {"time": format_time(orbital_position)}
+        for field in ELEMENT_FIELDS:
+            row[field] = float(getattr(orbital_position, field))
+        rows.append(row)
+    return json.dumps(rows, separators=(",", ":"))
+
+
+def encode_columns(orbital_positions: List[OrbitalPosition]) -> str:
+    """One array per field, each with an entry for every orbital position."""
+    columns: Dict[str, List[Any]] = {
+        "time": [format_time(position) for position in orbital_positions]
+    }
+    for field in ELEMENT_FIELDS:
+        columns[field] = [
+            float(getattr(position, field)) for position in orbital_positions
+        ]
+    return json.dumps(columns, separators=(",", ":"))
+
+
+def element_arrays(orbital_positions: List[OrbitalPosition]) -> Dict[str, np.ndarray]:
+    return {
+        field: np.fromiter(
+            (float(getattr(position, field)) for position in orbital_positions),
+            dtype=np.float64,
+            count=len(orbital_positions),
+        )
+        for field in ELEMENT_FIELDS
+    }
+
+
+def derived_columns(orbital_positions: List[OrbitalPosition]) -> Dict[str, list]:
+    """The time, orbital elements and DERIVED_FIELDS of every orbital position, one list per field."""
+    elements = element_arrays(orbital_positions)
+    columns: Dict[str, List[Any]] = {
+        "time": [format_time(position) for position in orbital_positions]
+    }
+    for field, values in elements.items():
+        columns[field] = values.tolist()
+    for field, values in derive_elements(elements).items():
+        columns[field] = values.tolist()
+    return columns
+
+
+def encode_derived_rows(orbital_positions: List[OrbitalPosition]) -> str:
+    """Like the rows format, with the DERIVED_FIELDS added to every row."""
+    columns = derived_columns(orbital_positions)
+    fields = list(columns.keys())
+    rows = [dict(zip(fields, row)) for row in zip(*columns.values())]
+    return json.dumps(rows, separators=(",", ":"))
+
+
+def encode_derived_columns(orbital_positions: List[OrbitalPosition]) -> str:
+    """Like the columns format, with an extra array for each of the DERIVED_FIELDS."""
+    return json.dumps(derived_columns(orbital_positions), separators=(",", ":"))
+
+
+def time_array(orbital_positions: List[OrbitalPosition]) -> np.ndarray:
+    """Unix timestamps of the orbital positions, as int64."""
+    return np.fromiter(
+        (int(position.time.timestamp()) for position in orbital_positions),
+        dtype=np.int64,
+        count=len(orbital_positions),
+    )
+
+
+def encode_binary(
+    orbital_positions: List[OrbitalPosition], dtype: str = "<f8"
+) -> bytes:
+    """
+    A BINARY_HEADER, the center, then the times (only if they aren't evenly spaced)
+    and a packed little-endian array of each of the ELEMENT_FIELDS, in order.
+    """
+    times = time_array(orbital_positions)
+    steps = np.diff(times)
+    if len(steps) > 0 and np.all(steps == steps[0]) and steps[0] > 0:
+        step = int(steps[0])
+    else:
+        # Calendar month and year steps, and responses with gaps, send every time instead.
+        step = 0
+    if len(orbital_positions) > 0:
+        orbital_body_id = int(orbital_positions[0].orbital_body_id)
+        center = orbital_positions[0].center.encode("utf-8")
+        start = int(times[0])
+    else:
+        (orbital_body_id, center, start) = (0, b"", 0)
+
+    parts = [
+        BINARY_HEADER.pack(
+            BINARY_MAGIC,
+            BINARY_VERSION,
+            np.dtype(dtype).itemsize,
+            len(ELEMENT_FIELDS),
+            len(center),
+            orbital_body_id,
+            start,
+            step,
+            len(orbital_positions),
+        ),
+        # Padded so that every array starts at a multiple of 8 bytes.
+        center.ljust(-(-len(center) // 8) * 8, b"\0"),
+    ]
+    if step == 0:
+        parts.append(times.astype("<i8").tobytes())
+    for values in element_arrays(orbital_positions).values():
+        parts.append(values.astype(dtype).tobytes())
+    return b"".join(parts)
+
+
+def encode_binary32(orbital_positions: List[OrbitalPosition]) -> bytes:
+    """
+    Like the bin format, with float32 arrays at half the size. They only keep about seven significant digits:
+    a semi-major axis near 1 AU to about 9 km, and a mean longitude of a few hundred degrees to about 3e-5 degrees.
+    """
+    return encode_binary(orbital_positions, dtype="<f4")
+
+
+def stream_json_array(
+    orbital_positions: Iterable[OrbitalPosition],
+    encode: Callable[[List[OrbitalPosition]], str],
+) -> Iterator[str]:
+    """Encodes a JSON array batch by batch, using an encoder that outputs a JSON array per batch."""
+    yield "["
+    separator = ""
+    for batch in batched(orbital_positions, STREAM_BATCH_SIZE):
+        yield separator + encode(batch)[1:-1]
+        separator = ","
+    yield "]"
+
+
+def stream_django(orbital_positions: Iterable[OrbitalPosition]) -> Iterator[str]:
+    return stream_json_array(orbital_positions, encode_django)
+
+
+def stream_rows(orbital_positions: Iterable[OrbitalPosition]) -> Iterator[str]:
+    return stream_json_array(orbital_positions, encode_rows)
+
+
+def stream_derived_rows(orbital_positions: Iterable[OrbitalPosition]) -> Iterator[str]:
+    return stream_json_array(orbital_positions, encode_derived_rows)
+
+
+# Layout of the start of a bin or bin32 response, all little-endian:
+# magic b"HZNB", format version, bytes per element value (8 or 4), number of element arrays,
+# length of the center in bytes, orbital body ID, unix time of the first position,
+# seconds between positions (0 if the times are sent as an int64 array instead), number of positions.
+# The header is 40 bytes, so with the center padded to 8 bytes every array can be viewed in place,
+# like new Float64Array(buffer, offset, count) in a browser.
+BINARY_HEADER = struct.Struct("<4sBBBBqqqQ")
+BINARY_MAGIC = b"HZNB"
+BINARY_VERSION = 1
+
+# Response formats for the orbital_position view, selected with the format query parameter.
+# The derived formats also include the anomalies and coordinates computed by kepler.derive_elements.
+ENCODERS: Dict[str, Callable[[List[OrbitalPosition]], str | bytes]] = {
+    "django": encode_django,
+    "rows": encode_rows,
+    "columns": encode_columns,
+    "derived_rows": encode_derived_rows,
+    "derived_columns": encode_derived_columns,
+    "bin": encode_binary,
+    "bin32": encode_binary32,
+}
+DEFAULT_FORMAT = "django"
+
+# Content type of each response format. Clients sending Accept: application/octet-stream
+# without a format parameter get the bin format.
+CONTENT_TYPES = {
+    "django": "application/json",
+    "rows": "application/json",
+    "columns": "application/json",
+    "derived_rows": "application/json",
+    "derived_columns": "application/json",
+    "bin": "application/octet-stream",
+    "bin32": "application/octet-stream",
+}
+BINARY_FORMAT = "bin"
+
+
+def encode_response(
+    response_format: str, orbital_positions: List[OrbitalPosition]
+) -> bytes:
+    data = ENCODERS[response_format](orbital_positions)
+    return data if isinstance(data, bytes) else data.encode("utf-8")
+
+
+# Response formats that can be streamed. The columns formats need every position before it can
+# output the first column, so it can't be.
+STREAM_ENCODERS: Dict[str, Callable[[Iterable[OrbitalPosition]], Iterator[str]]] = {
+    "django": stream_django,
+    "rows": stream_rows,
+    "derived_rows": stream_derived_rows,
+}
+
+# Number of orbital positions encoded at a time when streaming.
+STREAM_BATCH_SIZE = 1000
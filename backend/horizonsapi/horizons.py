@@ -0,0 +1,373 @@
+from django.conf import settings
+
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from functools import lru_cache
+import hashlib
+import http.client
+import io
+import os
+import numpy as np
+import pytz
+import queue
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import urlencode, urlsplit
+
+from .metrics import increment, span
+from .models import ELEMENT_FIELDS, OrbitalPosition
+
+# Format of the START_TIME and STOP_TIME parameters.
+HORIZONS_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# Format of the calendar dates in Horizons ephemeris tables.
+HORIZONS_CALENDAR_FORMAT = "A.D. %Y-%b-%d %H:%M:%S.0000"
+
+# Horizons writes calendar dates before this Julian date in the Julian calendar,
+# so they can't be worked out from the Julian date column with Gregorian arithmetic.
+GREGORIAN_CALENDAR_START_JD = 2299160.5
+UNIX_EPOCH_JD = 2440587.5
+UNIX_EPOCH = pytz.utc.localize(datetime(1970, 1, 1))
+
+# Columns of the ephemeris table requested by fetch_elements_data (QUANTITIES 1,9,20,23,24,29):
+# JDTDB, Calendar Date (TDB), EC, QR, IN, OM, W, Tp, N, MA, TA, A, AD, PR
+JD_COLUMN = 0
+CALENDAR_DATE_COLUMN = 1
+ECCENTRICITY_COLUMN = 2
+INCLINATION_COLUMN = 4
+LONGITUDE_OF_ASCENDING_NODE_COLUMN = 5
+ARGUMENT_OF_PERIAPSIS_COLUMN = 6
+MEAN_ANOMALY_COLUMN = 9
+SEMIMAJOR_AXIS_COLUMN = 11
+
+# Errors that mean a kept-alive connection was closed by the server while it sat in the pool.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+class HorizonsError(Exception):
+    def __init__(self, status: int, body: str):
+        super().__init__(f"Horizons responded with HTTP {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+
+
+class UnknownOrbitalBodyError(Exception):
+    def __init__(self, orbital_body_id: str):
+        super().__init__(f"Horizons doesn't know orbital body {orbital_body_id}")
+        self.orbital_body_id = orbital_body_id
+
+
+class HorizonsClient:
+    """
+    A thread-safe client for the Horizons API.
+    Connections are kept alive and reused, at most max_connections requests run at the same time,
+    failed requests are retried with exponential backoff, and identical requests that are in flight
+    at the same time share a single upstream request.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 30,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_connections: int = 4,
+    ):
+        url = urlsplit(base_url)
+        if url.hostname is None:
+            raise ValueError(f"No host in the Horizons URL {base_url!r}")
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.path = url.path
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.idle_connections: queue.LifoQueue[
+            http.client.HTTPConnection
+        ] = queue.LifoQueue()
+        self.request_slots = threading.BoundedSemaphore(max_connections)
+        self.in_flight: Dict[str, Future] = dict()
+        self.in_flight_lock = threading.Lock()
+
+    def get(self, params: Dict[str, str]) -> str:
+        url = self.path + "?" + urlencode(params, safe="',@")
+
+        with self.in_flight_lock:
+            shared_request = self.in_flight.get(url)
+            if shared_request is None:
+                own_request: Future = Future()
+                self.in_flight[url] = own_request
+
+        if shared_request is not None:
+            return shared_request.result()
+
+        try:
+            result = self.get_with_retries(url)
+            own_request.set_result(result)
+            return result
+        except BaseException as error:
+            own_request.set_exception(error)
+            raise
+        finally:
+            with self.in_flight_lock:
+                del self.in_flight[url]
+
+    def get_with_retries(self, url: str) -> str:
+        attempt = 0
+        while True:
+            try:
+                return self.request(url)
+            except HorizonsError as error:
+                if error.status < 500 or attempt >= self.retries:
+                    raise
+            except (OSError, http.client.HTTPException):
+                if attempt >= self.retries:
+                    raise
+            time.sleep(self.backoff * 2**attempt)
+            attempt += 1
+
+    def request(self, url: str) -> str:
+        with self.request_slots:
+            try:
+                connection = self.idle_connections.get_nowait()
+                try:
+                    return self.request_on(connection, url)
+                except STALE_CONNECTION_ERRORS:
+                    # The server closed the connection while it was idle. Try again on a fresh one.
+                    pass
+            except queue.Empty:
+                pass
+            return self.request_on(self.new_connection(), url)
+
+    def request_on(self, connection: http.client.HTTPConnection, url: str) -> str:
+        try:
+            connection.request("GET", url, headers={"Connection": "keep-alive"})
+            response = connection.getresponse()
+            body = response.read().decode("utf-8")
+        except BaseException:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self.idle_connections.put(connection)
+
+        if response.status != 200:
+            raise HorizonsError(response.status, body)
+        return body
+
+    def new_connection(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.idle_connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def fixture_name(params: Dict[str, str]) -> str:
+    """File name of the recorded response to a Horizons request, the same whatever order the params are in."""
+    query = urlencode(sorted(params.items()), safe="',@")
+    return hashlib.sha256(query.encode("utf-8")).hexdigest() + ".txt"
+
+
+class FixtureClient:
+    """
+    Serves Horizons responses recorded in a directory instead of asking Horizons, for offline
+    benchmarks and load tests. Given an upstream client, responses that haven't been recorded yet
+    are fetched from it and recorded. Otherwise they fail like a Horizons 404 would.
+    """
+
+    def __init__(self, directory: str, upstream: HorizonsClient | None = None):
+        self.directory = directory
+        self.upstream = upstream
+
+    def get(self, params: Dict[str, str]) -> str:
+        path = os.path.join(self.directory, fixture_name(params))
+        try:
+            with open(path, encoding="utf-8") as fixture:
+                return fixture.read()
+        except FileNotFoundError:
+            if self.upstream is None:
+                raise HorizonsError(
+                    404, f"No recorded response in {self.directory} for {params}"
+                )
+
+        result = self.upstream.get(params)
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first, so that a concurrent reader never sees half a response.
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as fixture:
+            fixture.write(result)
+        os.replace(temporary_path, path)
+        return result
+
+    def close(self) -> None:
+        if self.upstream is not None:
+            self.upstream.close()
+
+
+@lru_cache(maxsize=None)
+def get_client() -> HorizonsClient | FixtureClient:
+    client = HorizonsClient(
+        settings.HORIZONS_API_URL,
+        timeout=settings.HORIZONS_TIMEOUT,
+        retries=settings.HORIZONS_RETRIES,
+        max_connections=settings.HORIZONS_MAX_CONNECTIONS,
+    )
+    if settings.HORIZONS_FIXTURES_DIR == "":
+        return client
+    if settings.HORIZONS_FIXTURES_MODE == "record":
+        return FixtureClient(settings.HORIZONS_FIXTURES_DIR, upstream=client)
+    return FixtureClient(settings.HORIZONS_FIXTURES_DIR)
+
+
+def fetch_elements_data(
+    orbital_body_id: str,
+    center: str,
+    start_time: datetime,
+    stop_time: datetime,
+    step: str,
+) -> str:
+    with span("horizons"):
+        result = get_client().get(
+            {
+                "format": "text",
+                "COMMAND": orbital_body_id,
+                "OBJ_DATA": "NO",
+                "MAKE_EPHEM": "YES",
+                "EPHEM_TYPE": "ELEMENTS",
+                "CENTER": center,
+                "START_TIME": start_time.strftime(HORIZONS_DATE_FORMAT),
+                "STOP_TIME": stop_time.strftime(HORIZONS_DATE_FORMAT),
+                "STEP_SIZE": step,
+                "QUANTITIES": "'1,9,20,23,24,29'",
+                "CSV_FORMAT": "YES",
+                "OUT_UNITS": "AU-D",
+            }
+        )
+    increment("horizonsapi_upstream_requests_total")
+    increment("horizonsapi_upstream_bytes_total", len(result.encode("utf-8")))
+    return result
+
+
+class ElementsTable:
+    """
+    The orbital elements from a Horizons ephemeris, as one NumPy array per field.
+    times holds int64 unix timestamps, and columns has an array for each entry in ELEMENT_FIELDS.
+    """
+
+    def __init__(self, times: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.times = times
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def until(self, stop_time: datetime) -> "ElementsTable":
+        """The rows up to and including stop_time."""
+        end = int(np.searchsorted(self.times, int(stop_time.timestamp()), side="right"))
+        return ElementsTable(
+            self.times[:end],
+            {field: values[:end] for field, values in self.columns.items()},
+        )
+
+    def to_orbital_positions(
+        self, orbital_body_id: str, center: str
+    ) -> List[OrbitalPosition]:
+        """Builds an (unsaved) OrbitalPosition for every row."""
+        times = self.times.tolist()
+        columns = [self.columns[field].tolist() for field in ELEMENT_FIELDS]
+        orbital_positions = list()
+        for index, timestamp in enumerate(times):
+            orbital_position = OrbitalPosition(
+                orbital_body_id=orbital_body_id,
+                center=center,
+                time=UNIX_EPOCH + timedelta(seconds=timestamp),
+            )
+            for field, column in zip(ELEMENT_FIELDS, columns):
+                setattr(orbital_position, field, column[index])
+            orbital_positions.append(orbital_position)
+        return orbital_positions
+
+
+def parse_elements_table(response: str) -> ElementsTable:
+    """
+    Parses the ephemeris table between $$SOE and $$EOE in one go.
+    Times come from the Julian date column, except for dates that Horizons writes in the Julian calendar.
+    """
+    start = response.find("$$SOE")
+    end = response.find("$$EOE", start)
+    block = response[start + len("$$SOE") : end]
+    if start == -1 or end == -1 or block.strip() == "":
+        return ElementsTable(
+            np.empty(0, dtype=np.int64),
+            {field: np.empty(0) for field in ELEMENT_FIELDS},
+        )
+
+    table = np.loadtxt(
+        io.StringIO(block),
+        delimiter=",",
+        usecols=(
+            JD_COLUMN,
+            ECCENTRICITY_COLUMN,
+            INCLINATION_COLUMN,
+            LONGITUDE_OF_ASCENDING_NODE_COLUMN,
+            ARGUMENT_OF_PERIAPSIS_COLUMN,
+            MEAN_ANOMALY_COLUMN,
+            SEMIMAJOR_AXIS_COLUMN,
+        ),
+        ndmin=2,
+    )
+    (
+        julian_dates,
+        eccentricity,
+        inclination,
+        longitude_of_ascending_node,
+        argument_of_periapsis,
+        mean_anomaly,
+        semimajor_axis,
+    ) = table.T
+
+    if len(julian_dates) > 0 and julian_dates.min() < GREGORIAN_CALENDAR_START_JD:
+        times = parse_calendar_dates(block)
+    else:
+        times = np.rint((julian_dates - UNIX_EPOCH_JD) * 86400).astype(np.int64)
+
+    longitude_of_periapsis = longitude_of_ascending_node + argument_of_periapsis
+    return ElementsTable(
+        times,
+        {
+            "semimajor_axis": semimajor_axis,
+            "eccentricity": eccentricity,
+            "inclination": inclination,
+            "mean_longitude": longitude_of_periapsis + mean_anomaly,
+            "longitude_of_periapsis": longitude_of_periapsis,
+            "longitude_of_ascending_node": longitude_of_ascending_node,
+        },
+    )
+
+
+def parse_calendar_dates(block: str) -> np.ndarray:
+    timestamps = list()
+    for line in block.splitlines():
+        if line.strip() == "":
+            continue
+        date = datetime.strptime(
+            line.split(",")[CALENDAR_DATE_COLUMN].strip(), HORIZONS_CALENDAR_FORMAT
+        )
+        timestamps.append(int((pytz.utc.localize(date) - UNIX_EPOCH).total_seconds()))
+    return np.array(timestamps, dtype=np.int64)
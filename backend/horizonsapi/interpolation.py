@@ -0,0 +1,172 @@
+from django.conf import settings
+
+from datetime import datetime
+import numpy as np
+from typing import List, Tuple
+
+from .encoders import element_arrays
+from .kepler import SECONDS_PER_DAY, mean_motions
+from .models import ELEMENT_FIELDS, OrbitalPosition
+
+# Angles (degrees) that only drift slowly, so they're interpolated along the shortest way around the circle,
+# and a longitude going from 359 to 1 degree passes through 0 rather than 180.
+# The mean longitude goes all the way round every orbit, so it's unwrapped with the mean motion instead.
+SLOW_ANGLE_FIELDS = [
+    "longitude_of_periapsis",
+    "longitude_of_ascending_node",
+]
+
+# Samples further apart than this fraction of an orbit are never interpolated between, however smooth
+# they look, since the curvature of a series sampled that sparsely says little about what happens in between.
+MAX_BRACKET_FRACTION = 0.25
+
+BODY_CLASSES = ["planet", "moon", "small_body", "spacecraft"]
+
+
+def body_class(orbital_body_id: str) -> str:
+    """Classifies an orbital body by the Horizons ID conventions, for picking an interpolation tolerance."""
+    body_id = int(orbital_body_id)
+    if body_id < 0:
+        return "spacecraft"
+    if body_id <= 10 or (body_id < 1000 and body_id % 100 == 99):
+        # The Sun, barycenters and planets.
+        return "planet"
+    if body_id < 1000:
+        return "moon"
+    return "small_body"
+
+
+def wrap_angle_differences(differences: np.ndarray) -> np.ndarray:
+    return (differences + 180) % 360 - 180
+
+
+def unwrap_mean_longitudes(
+    times: np.ndarray, mean_longitudes: np.ndarray, mean_motions: np.ndarray
+) -> np.ndarray:
+    """
+    Turns mean longitudes (degrees) into a continuous series, adding the whole revolutions made between
+    samples. The mean longitude advances by about the mean motion (degrees per day) times the time between
+    two samples, so each difference is taken as the one within 180 degrees of that. Wrapping differences
+    to the shortest way around the circle instead would alias when samples are more than half an orbit apart.
+    """
+    if len(times) < 2:
+        return mean_longitudes
+    expected_differences = (
+        (mean_motions[:-1] + mean_motions[1:]) / 2 * np.diff(times) / SECONDS_PER_DAY
+    )
+    differences = expected_differences + wrap_angle_differences(
+        np.diff(mean_longitudes) - expected_differences
+    )
+    return mean_longitudes[0] + np.concatenate([[0], np.cumsum(differences)])
+
+
+def estimate_interpolation_errors(
+    times: np.ndarray, mean_longitudes: np.ndarray, periods: np.ndarray
+) -> np.ndarray:
+    """
+    Estimates the error (in degrees of mean longitude, which must be unwrapped) of linearly interpolating
+    between each pair of neighbouring samples, from the bound h**2 / 8 * |f''|. The second derivative is
+    estimated with divided differences at both ends of each interval. Intervals without a neighbouring
+    sample on either side have no estimate, and neither do intervals longer than MAX_BRACKET_FRACTION of
+    the orbital period (seconds), so they're infinite.
+    """
+    errors = np.full(max(len(times) - 1, 0), np.inf)
+    if len(times) < 3:
+        return errors
+
+    gaps = np.diff(times)
+    slopes = np.diff(mean_longitudes) / gaps
+    # Second derivative at every sample that has a neighbour on both sides.
+    curvatures = np.abs(2 * np.diff(slopes) / (gaps[:-1] + gaps[1:]))
+
+    # Each interval takes the larger curvature of its two ends, where there is one.
+    interval_curvatures = np.full(len(gaps), np.nan)
+    interval_curvatures[:-1] = curvatures
+    interval_curvatures[1:] = np.fmax(interval_curvatures[1:], curvatures)
+    known = ~np.isnan(interval_curvatures) & (
+        gaps <= MAX_BRACKET_FRACTION * np.minimum(periods[:-1], periods[1:])
+    )
+    errors[known] = gaps[known] ** 2 / 8 * interval_curvatures[known]
+    return errors
+
+
+def interpolate_positions(
+    samples: List[OrbitalPosition],
+    requested_dates: List[datetime],
+    tolerance: float,
+) -> Tuple[List[OrbitalPosition], List[datetime]]:
+    """
+    Serves the requested dates from cached samples, which must be ordered by time and share a center.
+    Dates with a sample are served from it, and dates between two samples close enough that the
+    estimated interpolation error is within tolerance (degrees of mean longitude) are interpolated.
+    Nothing is interpolated around centers whose GM isn't known, since the mean longitude can't be unwrapped.
+    Returns the positions served and the dates that need fetching.
+    """
+    if len(samples) == 0 or len(requested_dates) == 0:
+        return (list(), requested_dates)
+
+    sample_times = np.array(
+        [sample.time.timestamp() for sample in samples], dtype=np.float64
+    )
+    requested_times = np.array(
+        [date.timestamp() for date in requested_dates], dtype=np.float64
+    )
+    elements = element_arrays(samples)
+    motions = mean_motions(elements["semimajor_axis"], samples[0].center)
+    if motions is None:
+        unwrapped_longitudes = elements["mean_longitude"]
+        errors = np.full(max(len(samples) - 1, 0), np.inf)
+    else:
+        unwrapped_longitudes = unwrap_mean_longitudes(
+            sample_times, elements["mean_longitude"], motions
+        )
+        errors = estimate_interpolation_errors(
+            sample_times, unwrapped_longitudes, 360 / motions * SECONDS_PER_DAY
+        )
+
+    right = np.searchsorted(sample_times, requested_times, side="left")
+    exact = (right < len(samples)) & (
+        sample_times[np.minimum(right, len(samples) - 1)] == requested_times
+    )
+    bracketed = ~exact & (right > 0) & (right < len(samples))
+    left = np.clip(right - 1, 0, max(len(samples) - 2, 0))
+    interpolated = bracketed.copy()
+    interpolated[bracketed] = errors[left[bracketed]] <= tolerance
+
+    indices = np.flatnonzero(interpolated)
+    left = left[indices]
+    fractions = (requested_times[indices] - sample_times[left]) / (
+        sample_times[left + 1] - sample_times[left]
+    )
+    values = dict()
+    for field in ELEMENT_FIELDS:
+        differences = elements[field][left + 1] - elements[field][left]
+        if field == "mean_longitude":
+            differences = unwrapped_longitudes[left + 1] - unwrapped_longitudes[left]
+        elif field in SLOW_ANGLE_FIELDS:
+            differences = wrap_angle_differences(differences)
+        values[field] = (elements[field][left] + fractions * differences).tolist()
+
+    positions = list()
+    missing_dates = list()
+    interpolated_positions = iter(range(len(indices)))
+    for index, date in enumerate(requested_dates):
+        if exact[index]:
+            positions.append(samples[right[index]])
+        elif interpolated[index]:
+            value_index = next(interpolated_positions)
+            position = OrbitalPosition(
+                orbital_body_id=samples[0].orbital_body_id,
+                center=samples[0].center,
+                time=date,
+            )
+            for field in ELEMENT_FIELDS:
+                setattr(position, field, values[field][value_index])
+            positions.append(position)
+        else:
+            missing_dates.append(date)
+    return (positions, missing_dates)
+
+
+def get_tolerance(orbital_body_id: str) -> float:
+    return settings.HORIZONSAPI_INTERPOLATION_TOLERANCES[body_class(orbital_body_id)]
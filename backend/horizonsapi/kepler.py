@@ -0,0 +1,193 @@
+import numpy as np
+from typing import Dict
+
+# Extra fields computed by derive_elements, in the order they are serialized.
+# Angles are in degrees and distances in AU. x, y and z are ecliptic coordinates relative to the center body.
+DERIVED_FIELDS = [
+    "semi_minor_axis",
+    "distance_from_center_to_focus",
+    "argument_of_periapsis",
+    "mean_anomaly",
+    "eccentric_anomaly",
+    "true_anomaly",
+    "x",
+    "y",
+    "z",
+]
+
+# Gravitational parameters (GM, in km^3/s^2) from the JPL DE440 ephemeris, by Horizons ID, of the bodies that
+# orbits are usually given relative to. Barycenters (0 to 9) include the mass of their whole system.
+GRAVITATIONAL_PARAMETERS = {
+    0: 132890518671.29366,
+    1: 22031.868551,
+    2: 324858.592,
+    3: 403503.235502,
+    4: 42828.375816,
+    5: 126712764.1,
+    6: 37940584.8418,
+    7: 5794556.4,
+    8: 6836527.10058,
+    9: 975.5,
+    10: 132712440041.279419,
+    199: 22031.868551,
+    299: 324858.592,
+    301: 4902.800118,
+    399: 398600.435507,
+    499: 42828.37362,
+    599: 126686531.9,
+    699: 37931206.23,
+    799: 5793951.3,
+    899: 6835099.97,
+    999: 869.6,
+}
+
+KILOMETERS_PER_AU = 149597870.7
+SECONDS_PER_DAY = 86400
+
+# Newton's method stops once every anomaly changes by less than this many radians.
+KEPLER_TOLERANCE = 1e-12
+KEPLER_MAX_ITERATIONS = 50
+
+
+def solve_elliptic_kepler(
+    mean_anomaly: np.ndarray, eccentricity: np.ndarray
+) -> np.ndarray:
+    """Solves Kepler's equation M = E - e sin(E) for the eccentric anomaly E (radians)."""
+    # Danby's starting value, which converges for every eccentricity below 1.
+    eccentric_anomaly = mean_anomaly + 0.85 * eccentricity * np.sign(
+        np.sin(mean_anomaly)
+    )
+    for _ in range(KEPLER_MAX_ITERATIONS):
+        delta = (
+            eccentric_anomaly - eccentricity * np.sin(eccentric_anomaly) - mean_anomaly
+        ) / (1 - eccentricity * np.cos(eccentric_anomaly))
+        eccentric_anomaly = eccentric_anomaly - delta
+        if np.all(np.abs(delta) < KEPLER_TOLERANCE):
+            break
+    return eccentric_anomaly
+
+
+def solve_hyperbolic_kepler(
+    mean_anomaly: np.ndarray, eccentricity: np.ndarray
+) -> np.ndarray:
+    """Solves the hyperbolic Kepler equation M = e sinh(H) - H for the hyperbolic anomaly H (radians)."""
+    hyperbolic_anomaly = np.sign(mean_anomaly) * np.log(
+        2 * np.abs(mean_anomaly) / eccentricity + 1.8
+    )
+    for _ in range(KEPLER_MAX_ITERATIONS):
+        delta = (
+            eccentricity * np.sinh(hyperbolic_anomaly)
+            - hyperbolic_anomaly
+            - mean_anomaly
+        ) / (eccentricity * np.cosh(hyperbolic_anomaly) - 1)
+        hyperbolic_anomaly = hyperbolic_anomaly - delta
+        if np.all(np.abs(delta) < KEPLER_TOLERANCE):
+            break
+    return hyperbolic_anomaly
+
+
+def derive_elements(elements: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Computes the DERIVED_FIELDS for whole arrays of orbital elements at once.
+    Takes one array per entry in ELEMENT_FIELDS. Orbits with an eccentricity above 1 are treated as hyperbolic,
+    where Horizons gives a negative semi-major axis and the eccentric anomaly is the hyperbolic anomaly.
+    """
+    semimajor_axis = elements["semimajor_axis"]
+    eccentricity = elements["eccentricity"]
+    inclination = np.radians(elements["inclination"])
+    longitude_of_ascending_node = np.radians(elements["longitude_of_ascending_node"])
+    argument_of_periapsis = np.radians(
+        elements["longitude_of_periapsis"] - elements["longitude_of_ascending_node"]
+    )
+    mean_anomaly = np.radians(
+        elements["mean_longitude"] - elements["longitude_of_periapsis"]
+    )
+
+    hyperbolic = eccentricity > 1
+    elliptic = ~hyperbolic
+    # Elliptic orbits repeat every revolution, so keep the mean anomaly within one.
+    mean_anomaly = np.where(
+        elliptic, np.mod(mean_anomaly + np.pi, 2 * np.pi) - np.pi, mean_anomaly
+    )
+
+    eccentric_anomaly = np.empty_like(mean_anomaly)
+    eccentric_anomaly[elliptic] = solve_elliptic_kepler(
+        mean_anomaly[elliptic], eccentricity[elliptic]
+    )
+    eccentric_anomaly[hyperbolic] = solve_hyperbolic_kepler(
+        mean_anomaly[hyperbolic], eccentricity[hyperbolic]
+    )
+
+    true_anomaly = np.empty_like(mean_anomaly)
+    true_anomaly[elliptic] = 2 * np.arctan2(
+        np.sqrt(1 + eccentricity[elliptic]) * np.sin(eccentric_anomaly[elliptic] / 2),
+        np.sqrt(1 - eccentricity[elliptic]) * np.cos(eccentric_anomaly[elliptic] / 2),
+    )
+    true_anomaly[hyperbolic] = 2 * np.arctan(
+        np.sqrt((eccentricity[hyperbolic] + 1) / (eccentricity[hyperbolic] - 1))
+        * np.tanh(eccentric_anomaly[hyperbolic] / 2)
+    )
+
+    axis = np.abs(semimajor_axis)
+    semi_minor_axis = axis * np.sqrt(np.abs(1 - eccentricity**2))
+    distance = np.empty_like(mean_anomaly)
+    distance[elliptic] = axis[elliptic] * (
+        1 - eccentricity[elliptic] * np.cos(eccentric_anomaly[elliptic])
+    )
+    distance[hyperbolic] = axis[hyperbolic] * (
+        eccentricity[hyperbolic] * np.cosh(eccentric_anomaly[hyperbolic]) - 1
+    )
+
+    # Rotate from the orbital plane into the ecliptic.
+    argument_of_latitude = argument_of_periapsis + true_anomaly
+    x = distance * (
+        np.cos(longitude_of_ascending_node) * np.cos(argument_of_latitude)
+        - np.sin(longitude_of_ascending_node)
+        * np.sin(argument_of_latitude)
+        * np.cos(inclination)
+    )
+    y = distance * (
+        np.sin(longitude_of_ascending_node) * np.cos(argument_of_latitude)
+        + np.cos(longitude_of_ascending_node)
+        * np.sin(argument_of_latitude)
+        * np.cos(inclination)
+    )
+    z = distance * np.sin(argument_of_latitude) * np.sin(inclination)
+
+    return {
+        "semi_minor_axis": semi_minor_axis,
+        "distance_from_center_to_focus": axis * eccentricity,
+        "argument_of_periapsis": np.degrees(argument_of_periapsis),
+        "mean_anomaly": np.degrees(mean_anomaly),
+        "eccentric_anomaly": np.degrees(eccentric_anomaly),
+        "true_anomaly": np.mod(np.degrees(true_anomaly), 360),
+        "x": x,
+        "y": y,
+        "z": z,
+    }
+
+
+def center_gravitational_parameter(center: str) -> float | None:
+    """
+    The GM, in AU^3/day^2, of the body at a Horizons CENTER like 500@10 or @399,
+    or None if it isn't in GRAVITATIONAL_PARAMETERS.
+    """
+    try:
+        body_id = int(center.rpartition("@")[2])
+    except ValueError:
+        return None
+    gravitational_parameter = GRAVITATIONAL_PARAMETERS.get(body_id)
+    if gravitational_parameter is None:
+        return None
+    return gravitational_parameter * SECONDS_PER_DAY**2 / KILOMETERS_PER_AU**3
+
+
+def mean_motions(semimajor_axis: np.ndarray, center: str) -> np.ndarray | None:
+    """
+    The mean motions, in degrees per day, of orbits with the given semi-major axes (AU) around the center,
+    from Kepler's third law. None if the center's GM isn't known.
+    """
+    gravitational_parameter = center_gravitational_parameter(center)
+    if gravitational_parameter is None:
+        return None
+    return np.degrees(np.sqrt(gravitational_parameter / np.abs(semimajor_axis) ** 3))
@@ -0,0 +1,128 @@
+import numpy as np
+from typing import List, NamedTuple
+
+from .encoders import element_arrays
+from .interpolation import wrap_angle_differences
+from .kepler import derive_elements
+from .models import OrbitalPosition
+
+# Tolerances, in degrees, of the levels of detail that are worked out for every sample.
+# Level n keeps the samples needed to draw the trajectory within LOD_TOLERANCES[n - 1], and level 0
+# keeps every sample. Each tolerance is double the one before, from 0.01 to about 20 degrees.
+LOD_TOLERANCES = [0.01 * 2**n for n in range(12)]
+
+
+class LevelOfDetail(NamedTuple):
+    """
+    What a thinned series is asked for with: at most max_points samples, and/or a tolerance
+    in degrees that the trajectory may turn through between two samples.
+    """
+
+    max_points: int | None
+    tolerance: float | None
+
+
+def sample_weights(orbital_positions: List[OrbitalPosition]) -> np.ndarray:
+    """
+    How much detail, in degrees, is lost by leaving out each sample: the angle the trajectory turns
+    through at it, plus how much the orbit itself changes across it. Unperturbed orbits don't change,
+    so the second part picks out maneuvers. The first and last samples weigh nothing, since they're always kept.
+    """
+    weights = np.zeros(len(orbital_positions))
+    if len(orbital_positions) < 3:
+        return weights
+
+    elements = element_arrays(orbital_positions)
+    derived = derive_elements(elements)
+    segments = np.diff(
+        np.stack([derived["x"], derived["y"], derived["z"]], axis=1), axis=0
+    )
+    (before, after) = (segments[:-1], segments[1:])
+    lengths = np.linalg.norm(before, axis=1) * np.linalg.norm(after, axis=1)
+    cosines = np.einsum("ij,ij->i", before, after) / np.where(lengths > 0, lengths, 1)
+    turning_angles = np.degrees(np.arccos(np.clip(cosines, -1, 1)))
+
+    axis = np.abs(elements["semimajor_axis"])
+    eccentricity = elements["eccentricity"]
+    inclination = elements["inclination"]
+    # Relative changes in size and shape, as angles in radians.
+    shape_changes = np.abs(axis[2:] - axis[:-2]) / np.maximum(axis[1:-1], 1e-12)
+    shape_changes += np.abs(eccentricity[2:] - eccentricity[:-2])
+    plane_changes = np.abs(inclination[2:] - inclination[:-2]) + np.abs(
+        np.sin(np.radians(inclination[1:-1]))
+        * wrap_angle_differences(
+            elements["longitude_of_ascending_node"][2:]
+            - elements["longitude_of_ascending_node"][:-2]
+        )
+    )
+    # Turning the line of apsides only moves the orbit in proportion to how eccentric it is.
+    apsis_changes = np.abs(
+        np.minimum(eccentricity[1:-1], 1)
+        * wrap_angle_differences(
+            elements["longitude_of_periapsis"][2:]
+            - elements["longitude_of_periapsis"][:-2]
+        )
+    )
+
+    weights[1:-1] = (
+        turning_angles + np.degrees(shape_changes) + plane_changes + apsis_changes
+    )
+    return weights
+
+
+def detail_levels(orbital_positions: List[OrbitalPosition]) -> np.ndarray:
+    """
+    The coarsest level of detail that each sample is kept at, as an int8 array.
+    At each level, a sample is kept once the weight of the samples since the last one kept reaches the
+    level's tolerance, so samples are dense where the trajectory bends or the orbit changes, and sparse elsewhere.
+    """
+    weights = sample_weights(orbital_positions)
+    levels = np.zeros(len(weights), dtype=np.int8)
+    if len(weights) == 0:
+        return levels
+
+    cumulative_weights = np.cumsum(weights)
+    for level, tolerance in enumerate(LOD_TOLERANCES, start=1):
+        buckets = np.floor(cumulative_weights / tolerance)
+        kept = np.concatenate([[True], buckets[1:] > buckets[:-1]])
+        levels[kept] = level
+    levels[[0, -1]] = len(LOD_TOLERANCES)
+    return levels
+
+
+def select_samples(levels: np.ndarray, level_of_detail: LevelOfDetail) -> np.ndarray:
+    """
+    Indices of the samples to send: the finest level within max_points that is at least as coarse as
+    the tolerance allows. If even the coarsest level has too many samples, it's thinned out evenly.
+    """
+    if len(levels) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    level = 0
+    if level_of_detail.tolerance is not None:
+        level = int(
+            np.searchsorted(LOD_TOLERANCES, level_of_detail.tolerance, side="right")
+        )
+    if level_of_detail.max_points is not None:
+        # Samples kept at each level, from level 0 up.
+        counts = np.cumsum(
+            np.bincount(levels, minlength=len(LOD_TOLERANCES) + 1)[::-1]
+        )[::-1]
+        while (
+            level < len(LOD_TOLERANCES) and counts[level] > level_of_detail.max_points
+        ):
+            level += 1
+
+    indices = np.flatnonzero(levels >= level)
+    if (
+        level_of_detail.max_points is not None
+        and len(indices) > level_of_detail.max_points
+    ):
+        indices = indices[
+            np.unique(
+                np.linspace(0, len(indices) - 1, level_of_detail.max_points).astype(
+                    np.int64
+                )
+            )
+        ]
+    return indices
@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+
+from datetime import datetime, timedelta
+import pytz
+import time
+from typing import List
+
+from horizonsapi.management.commands.benchmark_database import (
+    READ_BODY_ID,
+    create_benchmark_bodies,
+)
+from horizonsapi.models import OrbitalBody, OrbitalPosition
+from horizonsapi.views import cache_orbital_positions
+
+# Same orbital body as benchmark_database reads from, which no real Horizons object uses.
+BENCHMARK_BODY_ID = READ_BODY_ID
+BENCHMARK_CENTER = "500@10"
+
+
+class Command(BaseCommand):
+    help = "Measures how fast orbital positions are written to the cache, per row vs. in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=8760,
+            help="Number of orbital positions to write (default: one year of hourly data)",
+        )
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        create_benchmark_bodies([BENCHMARK_BODY_ID])
+        try:
+            self.report("per-row insert", rows, save_per_row)
+            self.report("per-row update", rows, save_per_row)
+            OrbitalPosition.objects.filter(orbital_body_id=BENCHMARK_BODY_ID).delete()
+            self.report("bulk insert", rows, cache_orbital_positions)
+            self.report("bulk update", rows, cache_orbital_positions)
+        finally:
+            OrbitalBody.objects.filter(id=BENCHMARK_BODY_ID).delete()
+
+    def report(self, label: str, rows: int, write) -> None:
+        orbital_positions = make_positions(rows)
+        start = time.perf_counter()
+        write(orbital_positions)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{label:>15}: {rows} rows in {elapsed:.3f}s ({rows / elapsed:,.0f} rows/s)"
+        )
+
+
+def make_positions(rows: int) -> List[OrbitalPosition]:
+    start_time = pytz.utc.localize(datetime(2000, 1, 1))
+    return [
+        OrbitalPosition(
+            orbital_body_id=BENCHMARK_BODY_ID,
+            center=BENCHMARK_CENTER,
+            time=start_time + timedelta(hours=n),
+            semimajor_axis=1.52367934,
+            eccentricity=0.09340062,
+            inclination=1.84969142,
+            mean_longitude=(n * 0.0218) % 360,
+            longitude_of_periapsis=336.04084,
+            longitude_of_ascending_node=49.55953891,
+        )
+        for n in range(rows)
+    ]
+
+
+def save_per_row(orbital_positions: List[OrbitalPosition]) -> None:
+    """The original caching strategy: one save() per position, falling back to an update."""
+    for new_position in orbital_positions:
+        try:
+            with transaction.atomic():
+                new_position.save()
+        except IntegrityError:
+            OrbitalPosition.objects.filter(
+                orbital_body_id=new_position.orbital_body_id,
+                center=new_position.center,
+                time=new_position.time,
+            ).update(
+                eccentricity=new_position.eccentricity,
+                inclination=new_position.inclination,
+                longitude_of_ascending_node=new_position.longitude_of_ascending_node,
+                longitude_of_periapsis=new_position.longitude_of_periapsis,
+                mean_longitude=new_position.mean_longitude,
+                semimajor_axis=new_position.semimajor_axis,
+            )
@@ -0,0 +1,195 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytz
+import random
+import time
+from typing import List, NamedTuple
+
+from horizonsapi.management.commands.load_test import format_latencies
+from horizonsapi.models import OrbitalBody, OrbitalPosition
+from horizonsapi.views import (
+    cache_orbital_positions,
+    lookup_cached_positions,
+    with_own_connection,
+)
+
+# IDs far above any Horizons uses (negative IDs are spacecraft, and small bodies have at most eight digits),
+# but still within an IntegerField, so the benchmark never touches real orbital bodies or their cached data.
+# Readers read the positions of READ_BODY_ID, and each writer writes its own orbital body's.
+READ_BODY_ID = 2_100_000_000
+FIRST_WRITE_BODY_ID = READ_BODY_ID + 1
+BENCHMARK_BODY_NAME = "Benchmark"
+BENCHMARK_CENTER = "500@10"
+START_TIME = pytz.utc.localize(datetime(2000, 1, 1))
+
+
+class Results(NamedTuple):
+    latencies: List[float]
+    positions: int
+    errors: int
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures read and write throughput of the orbital position cache with concurrent readers and writers, "
+        "on whichever database is configured. Run it once with the default SQLite database and once with "
+        "DATABASE_ENGINE=django.db.backends.postgresql pointed at a local PostgreSQL server to compare them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds to run for"
+        )
+        parser.add_argument(
+            "--seed-rows",
+            type=int,
+            default=5 * 8760,
+            help="Number of hourly positions cached for the readers beforehand (default: five years)",
+        )
+        parser.add_argument(
+            "--window-hours",
+            type=int,
+            default=30 * 24,
+            help="Number of hourly positions each read looks up",
+        )
+        parser.add_argument(
+            "--batch-rows",
+            type=int,
+            default=1000,
+            help="Number of positions each write caches",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.options = options
+        body_ids = [READ_BODY_ID] + [
+            FIRST_WRITE_BODY_ID + writer for writer in range(options["writers"])
+        ]
+        create_benchmark_bodies(body_ids)
+        try:
+            OrbitalPosition.objects.filter(orbital_body_id__in=body_ids).delete()
+            cache_orbital_positions(
+                make_positions(READ_BODY_ID, START_TIME, options["seed_rows"])
+            )
+            self.stdout.write(
+                f"{connection.vendor}: {options['readers']} readers and {options['writers']} writers "
+                f"for {options['duration']:.0f} s"
+            )
+
+            deadline = time.perf_counter() + options["duration"]
+            with ThreadPoolExecutor(
+                max_workers=options["readers"] + options["writers"]
+            ) as executor:
+                reads = [
+                    executor.submit(with_own_connection(self.read), deadline, reader)
+                    for reader in range(options["readers"])
+                ]
+                writes = [
+                    executor.submit(
+                        with_own_connection(self.write),
+                        deadline,
+                        FIRST_WRITE_BODY_ID + writer,
+                    )
+                    for writer in range(options["writers"])
+                ]
+                self.report("reads", [read.result() for read in reads])
+                self.report("writes", [write.result() for write in writes])
+        finally:
+            OrbitalBody.objects.filter(id__in=body_ids).delete()
+
+    def read(self, deadline: float, reader: int) -> Results:
+        randomizer = random.Random(self.options["seed"] + reader)
+        window_hours = self.options["window_hours"]
+        (latencies, positions, errors) = (list(), 0, 0)
+        while time.perf_counter() < deadline:
+            start_hour = randomizer.randrange(
+                max(self.options["seed_rows"] - window_hours, 1)
+            )
+            requested_dates = [
+                START_TIME + timedelta(hours=start_hour + hour)
+                for hour in range(window_hours)
+            ]
+            start = time.perf_counter()
+            try:
+                (cached_positions, _) = lookup_cached_positions(
+                    str(READ_BODY_ID), BENCHMARK_CENTER, requested_dates
+                )
+            except DatabaseError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            positions += len(cached_positions)
+        return Results(latencies, positions, errors)
+
+    def write(self, deadline: float, orbital_body_id: int) -> Results:
+        batch_rows = self.options["batch_rows"]
+        (latencies, positions, errors) = (list(), 0, 0)
+        batch_start = START_TIME
+        while time.perf_counter() < deadline:
+            orbital_positions = make_positions(orbital_body_id, batch_start, batch_rows)
+            start = time.perf_counter()
+            try:
+                cache_orbital_positions(orbital_positions)
+            except DatabaseError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            positions += batch_rows
+            batch_start += timedelta(hours=batch_rows)
+        return Results(latencies, positions, errors)
+
+    def report(self, label: str, results: List[Results]) -> None:
+        latencies = [latency for result in results for latency in result.latencies]
+        positions = sum(result.positions for result in results)
+        errors = sum(result.errors for result in results)
+        duration = self.options["duration"]
+        line = (
+            f"{label:>6}: {len(latencies) / duration:8,.1f}/s, {positions / duration:10,.0f} positions/s, "
+            f"{errors} errors"
+        )
+        if len(latencies) >= 2:
+            line += ", " + format_latencies(latencies)
+        self.stdout.write(line)
+
+
+def create_benchmark_bodies(body_ids: List[int]) -> None:
+    """
+    Creates the orbital bodies the benchmark caches positions for. They're deleted afterwards, with all their
+    positions, so this refuses to go on if any of the IDs belongs to an orbital body the benchmark didn't create.
+    """
+    other_bodies = OrbitalBody.objects.filter(id__in=body_ids).exclude(
+        name=BENCHMARK_BODY_NAME
+    )
+    if other_bodies.exists():
+        raise CommandError(
+            "Not benchmarking, since these orbital bodies aren't the benchmark's: "
+            + ", ".join(str(orbital_body) for orbital_body in other_bodies)
+        )
+    for orbital_body_id in body_ids:
+        OrbitalBody.objects.update_or_create(
+            id=orbital_body_id, defaults={"name": BENCHMARK_BODY_NAME}
+        )
+
+
+def make_positions(
+    orbital_body_id: int, start_time: datetime, rows: int
+) -> List[OrbitalPosition]:
+    return [
+        OrbitalPosition(
+            orbital_body_id=orbital_body_id,
+            center=BENCHMARK_CENTER,
+            time=start_time + timedelta(hours=n),
+            semimajor_axis=1.52367934,
+            eccentricity=0.09340062,
+            inclination=1.84969142,
+            mean_longitude=(n * 0.0218) % 360,
+            longitude_of_periapsis=336.04084,
+            longitude_of_ascending_node=49.55953891,
+        )
+        for n in range(rows)
+    ]
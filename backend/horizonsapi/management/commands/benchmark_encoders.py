@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytz
+import time
+from typing import List
+
+from horizonsapi.encoders import ENCODERS, encode_response
+from horizonsapi.models import OrbitalPosition
+
+
+class Command(BaseCommand):
+    help = "Measures the size and speed of each orbital_position response format."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        orbital_positions = make_positions(rows)
+        for name in ENCODERS.keys():
+            best = None
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                data = encode_response(name, orbital_positions)
+                elapsed = time.perf_counter() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+            self.stdout.write(
+                f"{name:>15}: {len(data):>10,} bytes, {best * 1000:8.1f} ms per {rows} positions"
+            )
+
+
+def make_positions(rows: int) -> List[OrbitalPosition]:
+    """Orbital positions as they come out of the database, with Decimal elements."""
+    start_time = pytz.utc.localize(datetime(2000, 1, 1))
+    return [
+        OrbitalPosition(
+            id=n + 1,
+            orbital_body_id=499,
+            center="500@10",
+            time=start_time + timedelta(hours=n),
+            semimajor_axis=Decimal("1.52367934"),
+            eccentricity=Decimal("0.09340062"),
+            inclination=Decimal("1.84969142"),
+            mean_longitude=Decimal(n * 218 % 3600000) / 10000,
+            longitude_of_periapsis=Decimal("336.04084000"),
+            longitude_of_ascending_node=Decimal("49.55953891"),
+        )
+        for n in range(rows)
+    ]
@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand
+
+from datetime import datetime, timedelta
+import io
+import pytz
+import time
+from typing import Callable, List
+
+from horizonsapi.horizons import parse_elements_table
+from horizonsapi.models import OrbitalPosition
+from horizonsapi.stub import synthetic_elements_table
+
+
+class Command(BaseCommand):
+    help = "Compares the line-by-line Horizons parser with the vectorized one."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        response = make_response(rows)
+        parsers = {
+            "line by line": lambda: legacy_parse_elements_data(response, "499", "@10"),
+            "table": lambda: parse_elements_table(response),
+            "table + models": lambda: parse_elements_table(
+                response
+            ).to_orbital_positions("499", "@10"),
+        }
+        for name, parse in parsers.items():
+            best = best_time(parse, options["repeat"])
+            self.stdout.write(
+                f"{name:>15}: {best * 1000:8.1f} ms per {rows} rows, {rows / best:12,.0f} rows/s"
+            )
+
+
+def best_time(function: Callable, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def make_response(rows: int) -> str:
+    """A Horizons ephemeris response with hourly elements."""
+    start_time = datetime(2000, 1, 1)
+    dates = [start_time + timedelta(hours=n) for n in range(rows)]
+    return synthetic_elements_table("499", dates)
+
+
+def legacy_parse_elements_data(
+    response: str, orbital_body_id: str, center: str
+) -> List[OrbitalPosition]:
+    """The parser orbital_position used before parse_elements_table."""
+    orbital_positions = list()
+    reading_elements = False
+    for line in io.StringIO(response):
+        if "$$EOE" in line:
+            break
+
+        elif reading_elements:
+            elements = line.split(",")
+            orbital_position = OrbitalPosition()
+            orbital_position.orbital_body_id = int(orbital_body_id)
+            orbital_position.time = pytz.utc.localize(
+                datetime.strptime(elements[1].strip(), "A.D. %Y-%b-%d %H:%M:%S.0000")
+            )
+            orbital_position.semimajor_axis = float(elements[11])
+            orbital_position.eccentricity = float(elements[2])
+            orbital_position.inclination = float(elements[4])
+            argument_of_periapsis = float(elements[6])
+            mean_anomaly = float(elements[9])
+            orbital_position.longitude_of_ascending_node = float(elements[5])
+            orbital_position.mean_longitude = (
+                orbital_position.longitude_of_ascending_node
+                + argument_of_periapsis
+                + mean_anomaly
+            )
+            orbital_position.longitude_of_periapsis = (
+                orbital_position.longitude_of_ascending_node + argument_of_periapsis
+            )
+            orbital_position.center = center
+            orbital_positions.append(orbital_position)
+
+        elif "$$SOE" in line:
+            reading_elements = True
+    return orbital_positions
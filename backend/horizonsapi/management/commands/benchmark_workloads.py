@@ -0,0 +1,130 @@
+from django.core.management.base import BaseCommand
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import random
+import time
+from typing import List, Set, Tuple
+from urllib.parse import urlencode
+
+from horizonsapi.management.commands.load_test import format_latencies, timed_request
+from horizonsapi.views import DATE_FORMAT
+
+# Requested windows are picked from this range, which the stub server has ephemerides for.
+FIRST_WINDOW_START = datetime(1700, 1, 1)
+LAST_WINDOW_STOP = datetime(2400, 1, 1)
+
+WORKLOADS = ["cold", "warm", "mixed"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives orbital_position on a running server with cold-cache, warm-cache and mixed workloads, "
+        "and reports throughput and latency. Run the server against the stub Horizons API "
+        "(see horizons_stub_server) with a fresh database, so that cold requests really miss the cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "base_url", help="URL of the server, like http://127.0.0.1:8000"
+        )
+        parser.add_argument("--orbital-body-ids", default="199,299,399,499,599")
+        parser.add_argument("--center", default="500@10")
+        parser.add_argument("--step", default="1d")
+        parser.add_argument(
+            "--window-days", type=int, default=30, help="Length of each requested range"
+        )
+        parser.add_argument(
+            "--workloads",
+            default=",".join(WORKLOADS),
+            help=f"Comma separated workloads to run, out of {', '.join(WORKLOADS)}",
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument(
+            "--hot-windows",
+            type=int,
+            default=10,
+            help="Number of ranges the warm workload keeps requesting",
+        )
+        parser.add_argument(
+            "--hot-fraction",
+            type=float,
+            default=0.8,
+            help="Fraction of the mixed workload's requests that go to the warm ranges",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--timeout", type=float, default=60)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options["seed"])
+        self.orbital_body_ids = options["orbital_body_ids"].split(",")
+        self.window_length = timedelta(days=options["window_days"])
+        self.window_count = (
+            LAST_WINDOW_STOP - FIRST_WINDOW_START
+        ) // self.window_length
+        self.used_windows: Set[Tuple[str, int]] = set()
+
+        hot_urls = [self.cold_url() for _ in range(options["hot_windows"])]
+        self.stdout.write(f"Warming up {len(hot_urls)} ranges")
+        for url in hot_urls:
+            timed_request(url, options["timeout"])
+
+        for workload in options["workloads"].split(","):
+            if workload == "cold":
+                urls = [self.cold_url() for _ in range(options["requests"])]
+            elif workload == "warm":
+                urls = [
+                    self.random.choice(hot_urls) for _ in range(options["requests"])
+                ]
+            elif workload == "mixed":
+                urls = [
+                    self.random.choice(hot_urls)
+                    if self.random.random() < options["hot_fraction"]
+                    else self.cold_url()
+                    for _ in range(options["requests"])
+                ]
+            else:
+                self.stderr.write(f"Unknown workload: {workload}")
+                continue
+            self.run_workload(workload, urls)
+
+    def run_workload(self, workload: str, urls: List[str]) -> None:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.options["concurrency"]) as executor:
+            results = list(executor.map(self.try_request, urls))
+        elapsed = time.perf_counter() - start
+        latencies = [latency for latency in results if latency is not None]
+        error_count = len(results) - len(latencies)
+        summary = f"{workload:>5}: {len(results) / elapsed:8.1f} req/s, "
+        if len(latencies) > 1:
+            summary += format_latencies(latencies)
+        self.stdout.write(summary + f", {error_count} errors")
+
+    def try_request(self, url: str) -> float | None:
+        try:
+            return timed_request(url, self.options["timeout"])
+        except OSError:
+            return None
+
+    def cold_url(self) -> str:
+        """A URL for a range of an orbital body that this run hasn't requested yet."""
+        while True:
+            orbital_body_id = self.random.choice(self.orbital_body_ids)
+            window = self.random.randrange(self.window_count)
+            if (orbital_body_id, window) not in self.used_windows:
+                self.used_windows.add((orbital_body_id, window))
+                break
+
+        start_time = FIRST_WINDOW_START + self.window_length * window
+        query = urlencode(
+            {
+                "orbital_body_id": orbital_body_id,
+                "center": self.options["center"],
+                "start_time": start_time.strftime(DATE_FORMAT),
+                "stop_time": (start_time + self.window_length).strftime(DATE_FORMAT),
+                "step": self.options["step"],
+            }
+        )
+        return f"{self.options['base_url'].rstrip('/')}/horizonsapi/orbital_position/?{query}"
@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from datetime import datetime, timedelta
+import pytz
+import time
+from typing import Callable
+
+from horizonsapi.date_utils import generate_date_range, parse_step
+from horizonsapi.models import CoverageInterval, OrbitalPosition
+from horizonsapi.views import COVERAGE_BATCH_SIZE, check_cached_positions
+
+# (description, length of the requested range, step) for the kinds of requests the frontend makes.
+REPRESENTATIVE_RANGES = [
+    ("1 day, hourly", timedelta(days=1), "1h"),
+    ("1 month, daily", timedelta(days=30), "1d"),
+    ("1 year, daily", timedelta(days=365), "1d"),
+    ("1 year, hourly", timedelta(days=365), "1h"),
+]
+
+
+class Command(BaseCommand):
+    help = "Prints the query plans and timings of the cache lookups made by orbital_position."
+
+    def add_arguments(self, parser):
+        parser.add_argument("orbital_body_id", nargs="?", default="499")
+        parser.add_argument("--center", default="500@10")
+        parser.add_argument(
+            "--start-time",
+            default="2020-01-01T00:00:00",
+            help="Start of each requested range, formatted like 2020-01-01T00:00:00",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        orbital_body_id = options["orbital_body_id"]
+        center = options["center"]
+        start_time = pytz.utc.localize(
+            datetime.strptime(options["start_time"], "%Y-%m-%dT%H:%M:%S")
+        )
+        self.stdout.write(
+            f"{connection.vendor}, {OrbitalPosition.objects.count():,} cached orbital positions"
+        )
+
+        for description, length, step in REPRESENTATIVE_RANGES:
+            (skip, interval) = parse_step(step)
+            stop_time = start_time + length
+            requested_dates = list(
+                generate_date_range(start_time, stop_time, interval, skip)
+            )
+            coverage_query = CoverageInterval.objects.filter(
+                orbital_body_id=orbital_body_id,
+                center=center,
+                start__lte=stop_time,
+                stop__gte=start_time,
+            )
+            cached_query = OrbitalPosition.objects.filter(
+                orbital_body_id=orbital_body_id, center=center
+            )
+
+            self.stdout.write(f"\n== {description}: {len(requested_dates)} dates")
+            self.stdout.write("-- coverage lookup")
+            self.stdout.write(explain(coverage_query))
+            self.stdout.write(
+                f"{best_time(lambda: list(coverage_query.all()), options['repeat']) * 1000:.2f} ms"
+            )
+            self.stdout.write(
+                f"-- cached positions lookup ({COVERAGE_BATCH_SIZE} dates per query)"
+            )
+            self.stdout.write(
+                explain(
+                    cached_query.filter(time__in=requested_dates[:COVERAGE_BATCH_SIZE])
+                )
+            )
+            found_count = len(check_cached_positions(requested_dates, cached_query)[0])
+            elapsed = best_time(
+                lambda: check_cached_positions(requested_dates, cached_query),
+                options["repeat"],
+            )
+            self.stdout.write(f"{elapsed * 1000:.2f} ms, {found_count} found")
+
+
+def explain(query) -> str:
+    if connection.vendor == "postgresql":
+        return query.explain(analyze=True, buffers=True)
+    return query.explain()
+
+
+def best_time(function: Callable, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
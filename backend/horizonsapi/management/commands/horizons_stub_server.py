@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from horizonsapi.stub import StubHorizonsServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a local stand-in for the Horizons API with configurable latency and error rate. "
+        "Point HORIZONS_API_URL at http://<host>:<port>/api/horizons.api to use it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument(
+            "--fixtures",
+            help="Directory of responses recorded with HORIZONS_FIXTURES_MODE=record",
+        )
+        parser.add_argument(
+            "--no-synthetic",
+            action="store_true",
+            help="Respond 404 to requests that weren't recorded, instead of making up a response",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0,
+            help="Milliseconds to delay every response",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0,
+            help="Up to this many more milliseconds of random delay",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="Fraction of requests that fail with HTTP 503, from 0 to 1",
+        )
+        parser.add_argument("--seed", type=int, help="Seed for the delays and errors")
+
+    def handle(self, *args, **options):
+        server = StubHorizonsServer(
+            (options["host"], options["port"]),
+            fixtures_directory=options["fixtures"],
+            synthetic=not options["no_synthetic"],
+            latency=options["latency"] / 1000,
+            jitter=options["jitter"] / 1000,
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        )
+        self.stdout.write(
+            f"Serving a stub Horizons API at http://{options['host']}:{server.server_port}/api/horizons.api"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from horizonsapi.models import OrbitalPosition
+from horizonsapi.storage import write_positions
+
+# Number of orbital positions loaded from the OrbitalPosition table at a time.
+IMPORT_BATCH_SIZE = 50000
+
+
+class Command(BaseCommand):
+    help = "Copies cached orbital positions from the OrbitalPosition table into ephemeris chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "orbital_body_ids",
+            nargs="*",
+            help="Only import these orbital bodies (default: all of them)",
+        )
+
+    def handle(self, *args, **options):
+        orbital_positions = OrbitalPosition.objects.order_by(
+            "orbital_body_id", "center", "time"
+        )
+        if len(options["orbital_body_ids"]) > 0:
+            orbital_positions = orbital_positions.filter(
+                orbital_body_id__in=options["orbital_body_ids"]
+            )
+
+        position_count = 0
+        chunk_count = 0
+        batch = list()
+        for orbital_position in orbital_positions.iterator(
+            chunk_size=IMPORT_BATCH_SIZE
+        ):
+            batch.append(orbital_position)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                chunk_count += write_positions(batch)
+                position_count += len(batch)
+                batch = list()
+        chunk_count += write_positions(batch)
+        position_count += len(batch)
+
+        self.stdout.write(
+            f"Imported {position_count} orbital positions into {chunk_count} chunk writes"
+        )
@@ -0,0 +1,214 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+import json
+import pytz
+import time
+from typing import Dict, Generator, List, NamedTuple
+
+from horizonsapi.date_utils import generate_date_range, parse_step
+from horizonsapi.iter_utils import batched
+from horizonsapi.models import OrbitalPosition
+from horizonsapi.views import (
+    DATE_FORMAT,
+    STREAM_FETCH_SIZE,
+    cache_orbital_positions,
+    fetch_missing_positions,
+    find_missing_dates,
+    get_orbital_body,
+    with_own_connection,
+)
+
+
+class IngestTarget(NamedTuple):
+    orbital_body_id: str
+    center: str
+    step: str
+
+
+class Chunk(NamedTuple):
+    target: IngestTarget
+    start_time: datetime
+    stop_time: datetime
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetches orbital positions from Horizons and caches them, in parallel, to seed a new deployment. "
+        "Chunks that are already cached are skipped, so an interrupted ingest can simply be run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("orbital_body_ids", nargs="*")
+        parser.add_argument(
+            "--catalogue",
+            help="JSON file with a list of orbital body IDs, or of objects like the ones in "
+            "frontend/src/data (horizonsId, and optionally parent.horizonsId as the center and timeStep as the step)",
+        )
+        parser.add_argument("--center", default="500@10")
+        parser.add_argument(
+            "--start-time", required=True, help="Formatted like 2020-01-01T00:00:00"
+        )
+        parser.add_argument(
+            "--stop-time", required=True, help="Formatted like 2030-01-01T00:00:00"
+        )
+        parser.add_argument("--step", default="1d")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=STREAM_FETCH_SIZE,
+            help="Most orbital positions fetched per Horizons request",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.HORIZONS_MAX_CONNECTIONS,
+            help="Number of Horizons requests made at the same time",
+        )
+
+    def handle(self, *args, **options):
+        targets = [
+            IngestTarget(orbital_body_id, options["center"], options["step"])
+            for orbital_body_id in options["orbital_body_ids"]
+        ]
+        if options["catalogue"] is not None:
+            targets += read_catalogue(
+                options["catalogue"], options["center"], options["step"]
+            )
+        if len(targets) == 0:
+            raise CommandError("Give some orbital body IDs or a --catalogue")
+
+        start_time = parse_date(options["start_time"])
+        stop_time = parse_date(options["stop_time"])
+        self.started_at = time.perf_counter()
+        self.position_count = 0
+        self.chunk_count = 0
+        skipped_count = 0
+
+        # Only the Horizons requests run in the pool. Checking and writing the cache happens
+        # here, one chunk at a time, so that nothing competes with the writes for SQLite's lock.
+        # At most two chunks per worker are in flight, which bounds the memory used.
+        pending: Dict[Future, Chunk] = dict()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for target in dict.fromkeys(targets):
+                orbital_body = get_orbital_body(target.orbital_body_id)
+                for chunk in split_chunks(
+                    target, start_time, stop_time, options["chunk_size"]
+                ):
+                    missing_dates = find_missing_dates(
+                        orbital_body,
+                        target.orbital_body_id,
+                        target.center,
+                        chunk.start_time,
+                        chunk.stop_time,
+                        target.step,
+                    )
+                    if len(missing_dates) == 0:
+                        skipped_count += 1
+                        continue
+
+                    if orbital_body is None:
+                        # Fetch the first chunk of a new orbital body on its own,
+                        # so that it is only created once.
+                        try:
+                            fetched_positions = fetch_missing_positions(
+                                None,
+                                target.orbital_body_id,
+                                target.center,
+                                missing_dates,
+                                target.step,
+                            )
+                        except Exception as error:
+                            self.report_error(chunk, error)
+                            break
+                        self.finish_chunk(chunk, fetched_positions)
+                        orbital_body = get_orbital_body(target.orbital_body_id)
+                        continue
+
+                    while len(pending) >= options["workers"] * 2:
+                        self.finish_some(pending)
+                    fetch = executor.submit(
+                        with_own_connection(fetch_missing_positions),
+                        orbital_body,
+                        target.orbital_body_id,
+                        target.center,
+                        missing_dates,
+                        target.step,
+                    )
+                    pending[fetch] = chunk
+
+            while len(pending) > 0:
+                self.finish_some(pending)
+
+        elapsed = time.perf_counter() - self.started_at
+        self.stdout.write(
+            f"Cached {self.position_count} orbital positions from {self.chunk_count} chunks "
+            f"in {elapsed:.1f} s ({self.position_count / elapsed:,.0f} positions/s), "
+            f"skipped {skipped_count} chunks that were already cached"
+        )
+
+    def finish_some(self, pending: Dict[Future, Chunk]) -> None:
+        (done, _) = wait(pending.keys(), return_when=FIRST_COMPLETED)
+        for fetch in done:
+            chunk = pending.pop(fetch)
+            try:
+                self.finish_chunk(chunk, fetch.result())
+            except Exception as error:
+                self.report_error(chunk, error)
+
+    def report_error(self, chunk: Chunk, error: Exception) -> None:
+        self.stderr.write(
+            f"Couldn't fetch {chunk.target.orbital_body_id} relative to {chunk.target.center} "
+            f"from {chunk.start_time} to {chunk.stop_time}, run the command again to retry: {error}"
+        )
+
+    def finish_chunk(
+        self, chunk: Chunk, fetched_positions: List[OrbitalPosition]
+    ) -> None:
+        cache_orbital_positions(fetched_positions, chunk.target.step)
+        self.position_count += len(fetched_positions)
+        self.chunk_count += 1
+        elapsed = time.perf_counter() - self.started_at
+        self.stdout.write(
+            f"{chunk.target.orbital_body_id} relative to {chunk.target.center}, "
+            f"{chunk.start_time:%Y-%m-%d %H:%M} to {chunk.stop_time:%Y-%m-%d %H:%M}: "
+            f"{len(fetched_positions)} positions ({self.position_count / elapsed:,.0f} positions/s)"
+        )
+
+
+def read_catalogue(path: str, center: str, step: str) -> List[IngestTarget]:
+    with open(path) as catalogue_file:
+        catalogue = json.load(catalogue_file)
+
+    targets = list()
+    for entry in catalogue:
+        if isinstance(entry, dict):
+            orbital_body_id = str(entry.get("horizonsId", ""))
+            parent = entry.get("parent") or dict()
+            entry_center = parent.get("horizonsId") or center
+            entry_step = entry.get("timeStep") or step
+        else:
+            (orbital_body_id, entry_center, entry_step) = (str(entry), center, step)
+        # Objects like the sun have no Horizons ID of their own.
+        if orbital_body_id.strip() != "":
+            targets.append(
+                IngestTarget(orbital_body_id.strip(), entry_center, entry_step)
+            )
+    return targets
+
+
+def parse_date(date: str) -> datetime:
+    return pytz.utc.localize(datetime.strptime(date, DATE_FORMAT))
+
+
+def split_chunks(
+    target: IngestTarget, start_time: datetime, stop_time: datetime, chunk_size: int
+) -> Generator[Chunk, None, None]:
+    """Splits the range into chunks of at most chunk_size dates."""
+    (skip, interval) = parse_step(target.step)
+    for dates in batched(
+        generate_date_range(start_time, stop_time, interval, skip), chunk_size
+    ):
+        yield Chunk(target, dates[0], dates[-1])
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from concurrent.futures import ThreadPoolExecutor
+import statistics
+import time
+from typing import List
+import urllib.request
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends concurrent requests to a running server and reports throughput and latency. "
+        "Run it against the same URL served by a WSGI server (e.g. gunicorn) and an ASGI server "
+        "(e.g. uvicorn backend.asgi:application) to compare how they scale."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="URL to request, including the query string")
+        parser.add_argument(
+            "--concurrency",
+            default="1,4,16,64",
+            help="Comma separated numbers of concurrent clients to try (default: 1,4,16,64)",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Number of requests to send at each concurrency level",
+        )
+        parser.add_argument("--timeout", type=float, default=60)
+
+    def handle(self, *args, **options):
+        for concurrency in [int(n) for n in options["concurrency"].split(",")]:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                latencies = list(
+                    executor.map(
+                        lambda _: timed_request(options["url"], options["timeout"]),
+                        range(options["requests"]),
+                    )
+                )
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"concurrency {concurrency:>4}: {len(latencies) / elapsed:8.1f} req/s, "
+                + format_latencies(latencies)
+            )
+
+
+def timed_request(url: str, timeout: float) -> float:
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def format_latencies(latencies: List[float]) -> str:
+    percentiles = statistics.quantiles(latencies, n=100)
+    return (
+        f"p50 {percentiles[49] * 1000:7.1f} ms, "
+        f"p95 {percentiles[94] * 1000:7.1f} ms, "
+        f"p99 {percentiles[98] * 1000:7.1f} ms"
+    )
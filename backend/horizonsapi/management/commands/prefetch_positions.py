@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from horizonsapi.prefetch import get_recent_requests, prefetch_windows, utc_now
+from horizonsapi.views import (
+    cache_orbital_positions,
+    fetch_missing_positions,
+    find_missing_dates,
+    get_orbital_body,
+    with_own_connection,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Caches the orbital positions that clients are likely to ask for next, based on recent requests. "
+        "Needs HORIZONSAPI_PREFETCH=True and a CACHE_BACKEND shared with the web server processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Prefetch once and exit"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60,
+            help="Seconds to wait between prefetch rounds",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.HORIZONS_MAX_CONNECTIONS,
+            help="Number of windows prefetched at the same time",
+        )
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                self.prefetch_round(executor)
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+
+    def prefetch_round(self, executor: ThreadPoolExecutor) -> None:
+        now = utc_now()
+        windows = [
+            (target, start_time, stop_time)
+            for target, recent_request in get_recent_requests().items()
+            for start_time, stop_time in prefetch_windows(target, recent_request, now)
+        ]
+        # The cache is checked and written from this thread, and only the Horizons requests
+        # run concurrently, so that nothing competes with the writes for SQLite's lock.
+        fetches = dict()
+        for target, start_time, stop_time in windows:
+            orbital_body = get_orbital_body(target.orbital_body_id)
+            missing_dates = find_missing_dates(
+                orbital_body,
+                target.orbital_body_id,
+                target.center,
+                start_time,
+                stop_time,
+                target.step,
+            )
+            if len(missing_dates) > 0:
+                fetches[(target, start_time, stop_time)] = executor.submit(
+                    with_own_connection(fetch_missing_positions),
+                    orbital_body,
+                    target.orbital_body_id,
+                    target.center,
+                    missing_dates,
+                    target.step,
+                )
+
+        fetched_count = 0
+        for (target, start_time, stop_time), fetch in fetches.items():
+            try:
+                fetched_positions = fetch.result()
+                cache_orbital_positions(fetched_positions, target.step)
+                fetched_count += len(fetched_positions)
+            except Exception as error:
+                self.stderr.write(
+                    f"Couldn't prefetch {target.orbital_body_id} relative to {target.center} "
+                    f"from {start_time} to {stop_time}: {error}"
+                )
+        self.stdout.write(
+            f"{now:%Y-%m-%d %H:%M:%S}: {len(windows)} windows checked, "
+            f"{len(fetches)} fetched, {fetched_count} positions cached"
+        )
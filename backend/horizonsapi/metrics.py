@@ -0,0 +1,202 @@
+from django.conf import settings
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+from typing import Dict, Generator, List, Tuple
+
+# Metrics are kept per process, so with several worker processes each one reports its own,
+# and Prometheus should scrape every worker (or sum them).
+
+# Name: (type, help) of every metric, in the order they are exported.
+METRICS = {
+    "horizonsapi_request_seconds": (
+        "summary",
+        "Time spent handling requests, by view and response status.",
+    ),
+    "horizonsapi_stage_seconds": (
+        "summary",
+        "Time spent in each stage of serving orbital positions.",
+    ),
+    "horizonsapi_response_cache_hits_total": (
+        "counter",
+        "Requests answered from the response cache.",
+    ),
+    "horizonsapi_response_cache_misses_total": (
+        "counter",
+        "Requests that weren't in the response cache.",
+    ),
+    "horizonsapi_positions_cached_total": (
+        "counter",
+        "Requested orbital positions found in the database.",
+    ),
+    "horizonsapi_positions_missing_total": (
+        "counter",
+        "Requested orbital positions that had to be fetched from Horizons.",
+    ),
+    "horizonsapi_positions_served_total": (
+        "counter",
+        "Orbital positions sent to clients.",
+    ),
+    "horizonsapi_positions_written_total": (
+        "counter",
+        "Orbital positions written to the database, by operation.",
+    ),
+    "horizonsapi_upstream_requests_total": ("counter", "Requests made to Horizons."),
+    "horizonsapi_upstream_bytes_total": (
+        "counter",
+        "Bytes of response received from Horizons.",
+    ),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Thread-safe counters and summaries (a running sum and count), exported in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, Dict[Labels, float]] = {
+            name: dict()
+            for name, (metric_type, _) in METRICS.items()
+            if metric_type == "counter"
+        }
+        # The (sum, count) of each summary.
+        self.summaries: Dict[str, Dict[Labels, Tuple[float, int]]] = {
+            name: dict()
+            for name, (metric_type, _) in METRICS.items()
+            if metric_type == "summary"
+        }
+        self.lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.counters[name][key] = self.counters[name].get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            (total, count) = self.summaries[name].get(key, (0, 0))
+            self.summaries[name][key] = (total + seconds, count + 1)
+
+    def render(self) -> str:
+        lines = list()
+        with self.lock:
+            for name, (metric_type, description) in METRICS.items():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                if metric_type == "summary":
+                    for labels, (total, count) in sorted(self.summaries[name].items()):
+                        lines.append(f"{name}_sum{format_labels(labels)} {total}")
+                        lines.append(f"{name}_count{format_labels(labels)} {count}")
+                else:
+                    for labels, value in sorted(self.counters[name].items()):
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: Labels) -> str:
+    if len(labels) == 0:
+        return ""
+    escaped = [
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    ]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+METRICS_REGISTRY = Metrics()
+
+# Stage timings of the request being handled, for its Server-Timing header.
+# Spans in threads the request starts itself aren't included, since those don't share its context.
+request_timings: ContextVar[List[Tuple[str, float]] | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def increment(name: str, value: float = 1, **labels: str) -> None:
+    METRICS_REGISTRY.increment(name, value, **labels)
+
+
+@contextmanager
+def span(stage: str) -> Generator[None, None, None]:
+    """Times a stage of serving orbital positions, for /metrics and the Server-Timing header."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        METRICS_REGISTRY.observe("horizonsapi_stage_seconds", elapsed, stage=stage)
+        timings = request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    totals: Dict[str, float] = dict()
+    for stage, elapsed in timings:
+        totals[stage] = totals.get(stage, 0) + elapsed
+    return ", ".join(
+        f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items()
+    )
+
+
+class MetricsMiddleware:
+    """
+    Times every request, and collects the stage timings of the request so that they can be sent
+    in a Server-Timing header when HORIZONSAPI_SERVER_TIMING is on.
+    Works both ways, so that under ASGI async views like orbital_position_async aren't run in a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks instances as coroutine functions for Django, like MiddlewareMixin does.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timings: List[Tuple[str, float]] = list()
+        token = request_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_timings.reset(token)
+        return self.record(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timings: List[Tuple[str, float]] = list()
+        token = request_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_timings.reset(token)
+        return self.record(request, response, timings, time.perf_counter() - start)
+
+    def record(
+        self, request, response, timings: List[Tuple[str, float]], elapsed: float
+    ):
+        view = "unknown"
+        if request.resolver_match is not None:
+            view = request.resolver_match.url_name or view
+        METRICS_REGISTRY.observe(
+            "horizonsapi_request_seconds",
+            elapsed,
+            view=view,
+            status=str(response.status_code),
+        )
+        if settings.HORIZONSAPI_SERVER_TIMING:
+            response["Server-Timing"] = server_timing_header(
+                timings + [("total", elapsed)]
+            )
+        return response
@@ -0,0 +1,29 @@
+# Generated by Django 4.0 on 2026-10-18 12:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('horizonsapi', '0004_orbitalbody_first_ephemeris_date_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EphemerisChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('center', models.CharField(max_length=20)),
+                ('month', models.DateTimeField()),
+                ('times', models.BinaryField()),
+                ('elements', models.BinaryField()),
+                ('orbital_body', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='horizonsapi.orbitalbody')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ephemerischunk',
+            constraint=models.UniqueConstraint(fields=('orbital_body', 'center', 'month'), name='unique_ephemeris_chunk'),
+        ),
+    ]
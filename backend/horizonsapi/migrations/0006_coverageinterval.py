@@ -0,0 +1,30 @@
+# Generated by Django 4.0 on 2026-10-18 13:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('horizonsapi', '0005_ephemerischunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoverageInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('center', models.CharField(max_length=20)),
+                ('interval', models.CharField(max_length=5)),
+                ('skip', models.IntegerField()),
+                ('start', models.DateTimeField()),
+                ('stop', models.DateTimeField()),
+                ('orbital_body', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='horizonsapi.orbitalbody')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='coverageinterval',
+            index=models.Index(fields=['orbital_body', 'center', 'start', 'stop'], name='coverage_interval_lookup'),
+        ),
+    ]
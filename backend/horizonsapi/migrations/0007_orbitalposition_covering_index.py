@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# The cache lookups filter OrbitalPosition by (orbital_body, center, time) and read every element.
+# On PostgreSQL an index that INCLUDEs the elements lets those lookups be answered from the index alone.
+# SQLite can't include non-key columns, and the unique_orbital_position index already serves the lookup
+# there, so this index is only created on databases that support covering indexes.
+# It isn't declared on the model, since Django would then create a plain duplicate of it on SQLite.
+INDEX_NAME = "orbital_position_covering"
+
+
+def create_covering_index(apps, schema_editor):
+    if not schema_editor.connection.features.supports_covering_indexes:
+        return
+    OrbitalPosition = apps.get_model("horizonsapi", "OrbitalPosition")
+    table = schema_editor.quote_name(OrbitalPosition._meta.db_table)
+    schema_editor.execute(
+        f"CREATE INDEX {schema_editor.quote_name(INDEX_NAME)} ON {table} "
+        "(orbital_body_id, center, time) INCLUDE (semimajor_axis, eccentricity, inclination, "
+        "mean_longitude, longitude_of_periapsis, longitude_of_ascending_node)"
+    )
+
+
+def drop_covering_index(apps, schema_editor):
+    if not schema_editor.connection.features.supports_covering_indexes:
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(INDEX_NAME)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('horizonsapi', '0006_coverageinterval'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_covering_index, drop_covering_index),
+    ]
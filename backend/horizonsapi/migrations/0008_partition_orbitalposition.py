@@ -0,0 +1,108 @@
+from django.db import migrations
+
+# On PostgreSQL, OrbitalPosition is range partitioned by time: one partition per PARTITION_YEARS from
+# FIRST_PARTITION_YEAR to LAST_PARTITION_YEAR, and a default partition for every other time.
+# Cache lookups filter on time, so they only read the partitions of the requested dates, and each
+# partition's indexes stay small. Writes to different decades don't touch the same indexes.
+# A partitioned table's primary key has to include the partition key, so it becomes (id, time).
+# ids still come from the same sequence, so they stay unique.
+# SQLite can't partition tables, so there the table is left as it is.
+FIRST_PARTITION_YEAR = 1900
+LAST_PARTITION_YEAR = 2100
+PARTITION_YEARS = 10
+
+# Same as in 0007_orbitalposition_covering_index.
+COVERING_INDEX_NAME = "orbital_position_covering"
+FOREIGN_KEY_NAME = "horizonsapi_orbitalposition_orbital_body_id_fk"
+FOREIGN_KEY_INDEX_NAME = "horizonsapi_orbitalposition_orbital_body_id_idx"
+
+
+def supports_partitioning(schema_editor) -> bool:
+    # Primary keys, unique constraints and default partitions on partitioned tables need PostgreSQL 11.
+    connection = schema_editor.connection
+    return connection.vendor == "postgresql" and connection.pg_version >= 110000
+
+
+def rebuild_table(apps, schema_editor, partitioned: bool) -> None:
+    """Moves the orbital positions into a new table, partitioned or not, with the same constraints and indexes."""
+    quote_name = schema_editor.quote_name
+    OrbitalPosition = apps.get_model("horizonsapi", "OrbitalPosition")
+    OrbitalBody = apps.get_model("horizonsapi", "OrbitalBody")
+    table = OrbitalPosition._meta.db_table
+    old_table = f"{table}_old"
+
+    schema_editor.execute(
+        f"ALTER TABLE {quote_name(table)} RENAME TO {quote_name(old_table)}"
+    )
+    partition_by = f" PARTITION BY RANGE ({quote_name('time')})" if partitioned else ""
+    schema_editor.execute(
+        f"CREATE TABLE {quote_name(table)} (LIKE {quote_name(old_table)} INCLUDING DEFAULTS)"
+        + partition_by
+    )
+    if partitioned:
+        for start_year in range(FIRST_PARTITION_YEAR, LAST_PARTITION_YEAR, PARTITION_YEARS):
+            stop_year = start_year + PARTITION_YEARS
+            schema_editor.execute(
+                f"CREATE TABLE {quote_name(f'{table}_{start_year}')} PARTITION OF {quote_name(table)} "
+                f"FOR VALUES FROM ('{start_year}-01-01 00:00:00+00') TO ('{stop_year}-01-01 00:00:00+00')"
+            )
+        schema_editor.execute(
+            f"CREATE TABLE {quote_name(f'{table}_default')} PARTITION OF {quote_name(table)} DEFAULT"
+        )
+    schema_editor.execute(
+        f"INSERT INTO {quote_name(table)} SELECT * FROM {quote_name(old_table)}"
+    )
+
+    # The id sequence belongs to the old table, and would be dropped with it.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [old_table])
+        (sequence,) = cursor.fetchone()
+    schema_editor.execute(
+        f"ALTER SEQUENCE {sequence} OWNED BY {quote_name(table)}.{quote_name('id')}"
+    )
+    schema_editor.execute(f"DROP TABLE {quote_name(old_table)}")
+
+    primary_key = "id, time" if partitioned else "id"
+    schema_editor.execute(
+        f"ALTER TABLE {quote_name(table)} ADD PRIMARY KEY ({primary_key})"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {quote_name(table)} ADD CONSTRAINT {quote_name('unique_orbital_position')} "
+        "UNIQUE (orbital_body_id, center, time)"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {quote_name(table)} ADD CONSTRAINT {quote_name(FOREIGN_KEY_NAME)} "
+        f"FOREIGN KEY (orbital_body_id) REFERENCES {quote_name(OrbitalBody._meta.db_table)} (id) "
+        "DEFERRABLE INITIALLY DEFERRED"
+    )
+    if not partitioned:
+        # The partitioned table does without it, since unique_orbital_position starts with orbital_body_id.
+        schema_editor.execute(
+            f"CREATE INDEX {quote_name(FOREIGN_KEY_INDEX_NAME)} ON {quote_name(table)} (orbital_body_id)"
+        )
+    schema_editor.execute(
+        f"CREATE INDEX {quote_name(COVERING_INDEX_NAME)} ON {quote_name(table)} "
+        "(orbital_body_id, center, time) INCLUDE (semimajor_axis, eccentricity, inclination, "
+        "mean_longitude, longitude_of_periapsis, longitude_of_ascending_node)"
+    )
+
+
+def partition_orbital_positions(apps, schema_editor):
+    if supports_partitioning(schema_editor):
+        rebuild_table(apps, schema_editor, partitioned=True)
+
+
+def unpartition_orbital_positions(apps, schema_editor):
+    if supports_partitioning(schema_editor):
+        rebuild_table(apps, schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('horizonsapi', '0007_orbitalposition_covering_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_orbital_positions, unpartition_orbital_positions),
+    ]
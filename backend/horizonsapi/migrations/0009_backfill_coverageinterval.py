@@ -0,0 +1,99 @@
+from django.db import migrations
+
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Iterable, Iterator, Optional, Tuple
+
+# Number of orbital position times loaded, and coverage intervals created, at a time.
+BACKFILL_BATCH_SIZE = 50000
+
+# The step inference lives here rather than in horizonsapi/coverage.py, so that later changes to the app
+# don't change what this migration does on databases it hasn't run on yet.
+
+# Fewest orbital positions in a row that find_regular_runs takes as a grid. Two positions on their own are
+# usually just the ends of two separately fetched ranges, and aren't worth an interval.
+MIN_RUN_LENGTH = 3
+
+
+def infer_step(gap: timedelta) -> Optional[Tuple[int, str]]:
+    """The (skip, interval) of a step of the given length, in the largest unit it's a whole number of."""
+    seconds = int(gap.total_seconds())
+    if seconds <= 0 or gap != timedelta(seconds=seconds):
+        return None
+    for interval, unit in [("d", 86400), ("h", 3600), ("min", 60)]:
+        if seconds % unit == 0:
+            return (seconds // unit, interval)
+    return None
+
+
+def find_regular_runs(
+    times: Iterable[datetime],
+) -> Iterator[Tuple[int, str, datetime, datetime]]:
+    """
+    Splits ordered times into runs on a regular grid, yielding the (skip, interval, start, stop) of each run
+    of at least MIN_RUN_LENGTH times. Used to infer the coverage of orbital positions cached before
+    coverage was recorded, when the step they were fetched with isn't known.
+    """
+    run_start = None
+    previous = None
+    gap = None
+    run_length = 0
+    for time in times:
+        if previous is not None and gap is not None and time - previous == gap:
+            run_length += 1
+        else:
+            if gap is not None and run_length >= MIN_RUN_LENGTH:
+                yield infer_step(gap) + (run_start, previous)
+            if previous is not None and infer_step(time - previous) is not None:
+                # The last time of a run can be the first of the next one.
+                (run_start, gap, run_length) = (previous, time - previous, 2)
+            else:
+                (run_start, gap, run_length) = (time, None, 1)
+        previous = time
+    if gap is not None and run_length >= MIN_RUN_LENGTH:
+        yield infer_step(gap) + (run_start, previous)
+
+
+def backfill_coverage_intervals(apps, schema_editor):
+    """
+    Records coverage intervals for the orbital positions cached before coverage was recorded, so they're
+    served from the cache instead of all being fetched from Horizons again. The step each range was fetched
+    with isn't known, so it's inferred from the runs of evenly spaced times.
+    """
+    OrbitalPosition = apps.get_model("horizonsapi", "OrbitalPosition")
+    CoverageInterval = apps.get_model("horizonsapi", "CoverageInterval")
+
+    rows = (
+        OrbitalPosition.objects.order_by("orbital_body_id", "center", "time")
+        .values_list("orbital_body_id", "center", "time")
+        .iterator(chunk_size=BACKFILL_BATCH_SIZE)
+    )
+    coverage_intervals = list()
+    for (orbital_body_id, center), group in groupby(rows, key=lambda row: row[:2]):
+        for skip, interval, start, stop in find_regular_runs(row[2] for row in group):
+            coverage_intervals.append(
+                CoverageInterval(
+                    orbital_body_id=orbital_body_id,
+                    center=center,
+                    interval=interval,
+                    skip=skip,
+                    start=start,
+                    stop=stop,
+                )
+            )
+        if len(coverage_intervals) >= BACKFILL_BATCH_SIZE:
+            CoverageInterval.objects.bulk_create(coverage_intervals)
+            coverage_intervals = list()
+    CoverageInterval.objects.bulk_create(coverage_intervals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('horizonsapi', '0008_partition_orbitalposition'),
+    ]
+
+    operations = [
+        # Going back leaves the intervals, which still describe what's cached.
+        migrations.RunPython(backfill_coverage_intervals, migrations.RunPython.noop),
+    ]
@@ -7,27 +7,62 @@ import pytz
 
 # Create your models here.
 
+# The orbital element fields of OrbitalPosition, in the order they are stored and serialized.
+ELEMENT_FIELDS = [
+    "semimajor_axis",
+    "eccentricity",
+    "inclination",
+    "mean_longitude",
+    "longitude_of_periapsis",
+    "longitude_of_ascending_node",
+]
+
+# The ephemeris date range an orbital body has until its real one is known, which every date is within.
+UNBOUNDED_FIRST_EPHEMERIS_DATE = pytz.utc.localize(datetime.min)
+UNBOUNDED_LAST_EPHEMERIS_DATE = pytz.utc.localize(datetime.max)
+
 
 class OrbitalBody(models.Model):
-    name = models.CharField(max_length=100)
-    id = models.IntegerField(primary_key=True)
-    first_ephemeris_date = models.DateTimeField(default=pytz.utc.localize(datetime.min))
-    last_ephemeris_date = models.DateTimeField(default=pytz.utc.localize(datetime.max))
+    name: models.CharField = models.CharField(max_length=100)
+    id: models.IntegerField = models.IntegerField(primary_key=True)
+    first_ephemeris_date: models.DateTimeField = models.DateTimeField(
+        default=UNBOUNDED_FIRST_EPHEMERIS_DATE
+    )
+    last_ephemeris_date: models.DateTimeField = models.DateTimeField(
+        default=UNBOUNDED_LAST_EPHEMERIS_DATE
+    )
 
     def __str__(self) -> str:
         return f"{self.name} ({self.id})"
 
 
 class OrbitalPosition(models.Model):
-    orbital_body = models.ForeignKey(OrbitalBody, on_delete=models.CASCADE)
-    center = models.CharField(max_length=20)
-    time = models.DateTimeField()
-    semimajor_axis = models.DecimalField(decimal_places=8, max_digits=18)
-    eccentricity = models.DecimalField(decimal_places=8, max_digits=18)
-    inclination = models.DecimalField(decimal_places=8, max_digits=18)
-    mean_longitude = models.DecimalField(decimal_places=8, max_digits=18)
-    longitude_of_periapsis = models.DecimalField(decimal_places=8, max_digits=18)
-    longitude_of_ascending_node = models.DecimalField(decimal_places=8, max_digits=18)
+    # The automatic primary key and foreign key column, declared for type checkers.
+    id: int
+    orbital_body_id: int
+    orbital_body: models.ForeignKey = models.ForeignKey(
+        OrbitalBody, on_delete=models.CASCADE
+    )
+    center: models.CharField = models.CharField(max_length=20)
+    time: models.DateTimeField = models.DateTimeField()
+    semimajor_axis: models.DecimalField = models.DecimalField(
+        decimal_places=8, max_digits=18
+    )
+    eccentricity: models.DecimalField = models.DecimalField(
+        decimal_places=8, max_digits=18
+    )
+    inclination: models.DecimalField = models.DecimalField(
+        decimal_places=8, max_digits=18
+    )
+    mean_longitude: models.DecimalField = models.DecimalField(
+        decimal_places=8, max_digits=18
+    )
+    longitude_of_periapsis: models.DecimalField = models.DecimalField(
+        decimal_places=8, max_digits=18
+    )
+    longitude_of_ascending_node: models.DecimalField = models.DecimalField(
+        decimal_places=8, max_digits=18
+    )
 
     class Meta:
         constraints = [
@@ -50,6 +85,66 @@ longitude of ascending node = {self.longitude_of_ascending_node} degrees
         """
 
 
+class EphemerisChunk(models.Model):
+    """
+    One calendar month of orbital positions for a body, packed into binary columns.
+    times holds sorted little-endian int64 unix timestamps, and elements holds one
+    little-endian float64 column per entry in ELEMENT_FIELDS, each as long as times.
+    """
+
+    # The automatic primary key and foreign key column, declared for type checkers.
+    id: int
+    orbital_body_id: int
+    orbital_body: models.ForeignKey = models.ForeignKey(
+        OrbitalBody, on_delete=models.CASCADE
+    )
+    center: models.CharField = models.CharField(max_length=20)
+    month: models.DateTimeField = models.DateTimeField()
+    times: models.BinaryField = models.BinaryField()
+    elements: models.BinaryField = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["orbital_body", "center", "month"],
+                name="unique_ephemeris_chunk",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.orbital_body} relative to {self.center}, {self.month:%Y-%m}"
+
+
+class CoverageInterval(models.Model):
+    """
+    A range of orbital positions that has been fetched from Horizons and cached.
+    Every time from start to stop that is a whole number of steps (skip intervals) after start is cached.
+    """
+
+    # The automatic primary key and foreign key column, declared for type checkers.
+    id: int
+    orbital_body_id: int
+    orbital_body: models.ForeignKey = models.ForeignKey(
+        OrbitalBody, on_delete=models.CASCADE
+    )
+    center: models.CharField = models.CharField(max_length=20)
+    interval: models.CharField = models.CharField(max_length=5)
+    skip: models.IntegerField = models.IntegerField()
+    start: models.DateTimeField = models.DateTimeField()
+    stop: models.DateTimeField = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["orbital_body", "center", "start", "stop"],
+                name="coverage_interval_lookup",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.orbital_body} relative to {self.center}, every {self.skip}{self.interval} from {self.start} to {self.stop}"
+
+
 class OrbitalPositionEncoder(DjangoJSONEncoder):
     def default(self, obj):
         if isinstance(obj, decimal.Decimal):
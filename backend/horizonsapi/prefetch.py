@@ -0,0 +1,155 @@
+from django.conf import settings
+
+from datetime import datetime, timedelta
+import pytz
+import time
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from .date_utils import parse_step, round_datetime_down, step_timedelta
+from .response_cache import SHARED_KEY_PREFIX, get_shared_cache
+
+# Shared cache key of the number of prefetch targets registered so far, see record_request.
+PREFETCH_TARGET_COUNT_KEY = f"{SHARED_KEY_PREFIX}:prefetch_target_count"
+
+# Number of registered prefetch targets read from the shared cache at a time.
+PREFETCH_TARGET_BATCH_SIZE = 1000
+
+# Most dates prefetched for one window, so a client asking for a huge range at a fine step
+# doesn't make the prefetcher download years of data.
+MAX_PREFETCH_DATES = 10000
+
+
+class PrefetchTarget(NamedTuple):
+    orbital_body_id: str
+    center: str
+    step: str
+
+
+class RecentRequest(NamedTuple):
+    seen_at: float
+    start_time: datetime
+    stop_time: datetime
+
+
+def is_prefetch_enabled() -> bool:
+    return settings.HORIZONSAPI_PREFETCH
+
+
+def recent_request_key(target: PrefetchTarget) -> str:
+    return f"{SHARED_KEY_PREFIX}:recent_request:{target.orbital_body_id}:{target.center}:{target.step}"
+
+
+def registration_key(target: PrefetchTarget) -> str:
+    return f"{SHARED_KEY_PREFIX}:prefetch_registered:{target.orbital_body_id}:{target.center}:{target.step}"
+
+
+def prefetch_target_key(slot: int) -> str:
+    return f"{SHARED_KEY_PREFIX}:prefetch_target:{slot}"
+
+
+def record_request(
+    orbital_body_id: str,
+    center: str,
+    step: str,
+    start_time: datetime,
+    stop_time: datetime,
+) -> None:
+    """
+    Remembers the latest window requested for an orbital body, center and step, so that the
+    prefetch_positions command can cache what comes after it. Targets that haven't been requested
+    for HORIZONSAPI_PREFETCH_IDLE seconds are forgotten.
+    Each target has its own key, and is registered in a numbered slot the first time it's seen, so
+    concurrent requests never overwrite each other's bookkeeping.
+    """
+    if not is_prefetch_enabled():
+        return
+
+    idle = settings.HORIZONSAPI_PREFETCH_IDLE
+    target = PrefetchTarget(orbital_body_id, center, step)
+    get_shared_cache().set(
+        recent_request_key(target),
+        RecentRequest(time.time(), start_time, stop_time),
+        timeout=idle,
+    )
+    if not get_shared_cache().add(registration_key(target), True, timeout=idle):
+        return
+
+    get_shared_cache().add(PREFETCH_TARGET_COUNT_KEY, 0, timeout=None)
+    try:
+        slot = get_shared_cache().incr(PREFETCH_TARGET_COUNT_KEY)
+    except ValueError:
+        # The count was evicted in the meantime, so the slots start again from the first.
+        get_shared_cache().add(PREFETCH_TARGET_COUNT_KEY, 1, timeout=None)
+        slot = 1
+    # Slots outlive the registration, so a target that keeps being requested is registered again
+    # before its previous slot expires.
+    get_shared_cache().set(prefetch_target_key(slot), target, timeout=2 * idle)
+
+
+def get_recent_requests() -> Dict[PrefetchTarget, RecentRequest]:
+    """
+    The latest window requested for every target that's been requested in the last HORIZONSAPI_PREFETCH_IDLE seconds.
+    Slots all expire the same time after they're registered, so the ones still there are the latest ones,
+    and they're read back from the newest until one is missing.
+    """
+    targets: Set[PrefetchTarget] = set()
+    slot = get_shared_cache().get(PREFETCH_TARGET_COUNT_KEY, 0)
+    while slot > 0:
+        slots = range(max(slot - PREFETCH_TARGET_BATCH_SIZE, 0) + 1, slot + 1)
+        found_targets = get_shared_cache().get_many(
+            [prefetch_target_key(number) for number in slots]
+        )
+        targets.update(found_targets.values())
+        if len(found_targets) < len(slots):
+            break
+        slot -= PREFETCH_TARGET_BATCH_SIZE
+
+    recent_requests = get_shared_cache().get_many(
+        [recent_request_key(target) for target in targets]
+    )
+    return {
+        target: recent_requests[recent_request_key(target)]
+        for target in targets
+        if recent_request_key(target) in recent_requests
+    }
+
+
+def prefetch_windows(
+    target: PrefetchTarget, recent_request: RecentRequest, now: datetime
+) -> List[Tuple[datetime, datetime]]:
+    """
+    The windows worth having cached for a recently requested target:
+    HORIZONSAPI_PREFETCH_DAYS from now, and the next HORIZONSAPI_PREFETCH_WINDOWS windows
+    of the same length after the one the client last asked for.
+    """
+    (skip, interval) = parse_step(target.step)
+    step = step_timedelta(interval, skip)
+    if step == timedelta():
+        return list()
+
+    current_start = round_datetime_down(now, interval)
+    windows = [
+        (
+            current_start,
+            current_start + timedelta(days=settings.HORIZONSAPI_PREFETCH_DAYS),
+        )
+    ]
+
+    window_length = recent_request.stop_time - recent_request.start_time
+    if settings.HORIZONSAPI_PREFETCH_WINDOWS > 0 and window_length > timedelta():
+        windows.append(
+            (
+                recent_request.stop_time,
+                recent_request.stop_time
+                + window_length * settings.HORIZONSAPI_PREFETCH_WINDOWS,
+            )
+        )
+
+    return [
+        (start_time, min(stop_time, start_time + step * (MAX_PREFETCH_DATES - 1)))
+        for start_time, stop_time in windows
+    ]
+
+
+def utc_now() -> datetime:
+    return datetime.now(pytz.utc)
@@ -0,0 +1,402 @@
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+import hashlib
+import threading
+import time
+import numpy as np
+from typing import Dict, List, NamedTuple, Tuple
+
+from .date_utils import parse_step
+from .metrics import increment, span
+from .storage import month_start
+
+# Responses are cached in two tiers: an in-process LRU cache (ResponseCache) in front of the
+# shared Django cache named by the HORIZONSAPI_CACHE setting, which every worker process can see.
+#
+# Keys in the shared cache:
+#   horizonsapi:generation:<body>:<center>:<month>
+#       Generation number of the cached positions for this orbital body and center in one calendar month
+#       (formatted as YYYYmm). Never expires. Bumped whenever positions in that month are written.
+#   horizonsapi:response:<body>:<center>:<version>:<start>:<stop>:<step>:<format>
+#       Serialized orbital_position response. The version is a digest of the generations of every month
+#       from start to stop. Start and stop are rounded to the step and formatted as YYYYmmddTHHMMSS.
+#       Expires after HORIZONSAPI_RESPONSE_CACHE_TTL seconds.
+#   horizonsapi:detail_levels:<body>:<center>:<version>:<start>:<stop>:<step>
+#       Times and levels of detail of the positions in an orbital_position window, for thinning it
+#       without working them out again. See horizonsapi/lod.py. Expires like responses do.
+#   horizonsapi:orbital_body:<body>
+#       The OrbitalBody instance.
+#   horizonsapi:unknown_body:<body>
+#       Set when Horizons didn't know the orbital body. Expires after HORIZONSAPI_NEGATIVE_CACHE_TTL seconds.
+#   horizonsapi:discovery:<body>
+#       Set when finding out the orbital body's ephemeris date range is started, so it's only tried
+#       once per HORIZONSAPI_NEGATIVE_CACHE_TTL seconds. Expires after that.
+#   horizonsapi:empty:<body>:<center>:<start>:<stop>:<step>
+#       Set when Horizons had no positions from start to stop, formatted like in response keys.
+#       Expires after HORIZONSAPI_NEGATIVE_CACHE_TTL seconds.
+#   horizonsapi:recent_request:<body>:<center>:<step>
+#       The latest window requested for the orbital body, center and step, for prefetching.
+#       Expires after HORIZONSAPI_PREFETCH_IDLE seconds.
+#   horizonsapi:prefetch_registered:<body>:<center>:<step>
+#       Set when the orbital body, center and step is given a slot. Expires after HORIZONSAPI_PREFETCH_IDLE seconds.
+#   horizonsapi:prefetch_target_count
+#       The number of slots given out so far, incremented atomically.
+#   horizonsapi:prefetch_target:<slot>
+#       The orbital body, center and step given that slot, so prefetch_positions can find every recent request.
+#       Expires after twice HORIZONSAPI_PREFETCH_IDLE seconds.
+#   All of the prefetching keys are only written when HORIZONSAPI_PREFETCH is on. See horizonsapi/prefetch.py.
+#
+# Bumping a month's generation makes every older response for that body and center that overlaps the month
+# unreachable, in every process, without having to find and delete them. They simply expire.
+# Responses for other months keep their keys (and ETags), so caching new positions doesn't churn history.
+SHARED_KEY_PREFIX = "horizonsapi"
+
+
+class ResponseKey(NamedTuple):
+    orbital_body_id: str
+    center: str
+    start_time: datetime
+    stop_time: datetime
+    step: str
+    response_format: str
+    version: str
+
+
+class ResponseCache:
+    """
+    A thread-safe, in-process LRU cache of serialized responses.
+    It holds at most max_bytes of response data, and entries expire ttl seconds after they were stored.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: OrderedDict[ResponseKey, Tuple[bytes, float]] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: ResponseKey) -> bytes | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            (data, expires_at) = entry
+            if time.monotonic() >= expires_at:
+                self.remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: ResponseKey, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (data, time.monotonic() + self.ttl)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(
+        self,
+        orbital_body_id: str,
+        center: str,
+        start_time: datetime,
+        stop_time: datetime,
+    ) -> None:
+        """Drops every response for this orbital body and center that overlaps the given time range."""
+        with self.lock:
+            stale_keys = [
+                key
+                for key in self.entries.keys()
+                if key.orbital_body_id == orbital_body_id
+                and key.center == center
+                and key.start_time <= stop_time
+                and key.stop_time >= start_time
+            ]
+            for key in stale_keys:
+                self.remove(key)
+            self.invalidations += len(stale_keys)
+
+    def remove(self, key: ResponseKey) -> None:
+        (data, _) = self.entries.pop(key)
+        self.size -= len(data)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+@lru_cache(maxsize=None)
+def get_local_cache() -> ResponseCache:
+    return ResponseCache(
+        settings.HORIZONSAPI_RESPONSE_CACHE_BYTES,
+        settings.HORIZONSAPI_RESPONSE_CACHE_TTL,
+    )
+
+
+def get_shared_cache() -> BaseCache:
+    return caches[settings.HORIZONSAPI_CACHE]
+
+
+def generation_key(orbital_body_id: str, center: str, month: datetime) -> str:
+    return f"{SHARED_KEY_PREFIX}:generation:{orbital_body_id}:{center}:{month:%Y%m}"
+
+
+def months_between(start_time: datetime, stop_time: datetime) -> List[datetime]:
+    """The start of every calendar month from the one start_time is in to the one stop_time is in."""
+    months = list()
+    month = month_start(start_time)
+    while month <= stop_time:
+        months.append(month)
+        month = month_start(month + timedelta(days=32))
+    return months
+
+
+def response_key_string(key: ResponseKey) -> str:
+    return ":".join(
+        [
+            SHARED_KEY_PREFIX,
+            "response",
+            key.orbital_body_id,
+            key.center,
+            key.version,
+            key.start_time.strftime("%Y%m%dT%H%M%S"),
+            key.stop_time.strftime("%Y%m%dT%H%M%S"),
+            key.step,
+            key.response_format,
+        ]
+    )
+
+
+def detail_levels_key(key: ResponseKey) -> str:
+    return ":".join(
+        [
+            SHARED_KEY_PREFIX,
+            "detail_levels",
+            key.orbital_body_id,
+            key.center,
+            key.version,
+            key.start_time.strftime("%Y%m%dT%H%M%S"),
+            key.stop_time.strftime("%Y%m%dT%H%M%S"),
+            key.step,
+        ]
+    )
+
+
+def orbital_body_key(orbital_body_id: str) -> str:
+    return f"{SHARED_KEY_PREFIX}:orbital_body:{orbital_body_id}"
+
+
+def response_etag(key: ResponseKey) -> str:
+    """
+    A strong ETag for the response with this key: a digest of its range, step, format and version.
+    It only changes when positions are written in a month the window covers, so windows in the past keep
+    their ETag while newer positions are cached, and it can be worked out without the response.
+    """
+    digest = hashlib.blake2b(response_key_string(key).encode("utf-8"), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def unknown_body_key(orbital_body_id: str) -> str:
+    return f"{SHARED_KEY_PREFIX}:unknown_body:{orbital_body_id.strip()}"
+
+
+def discovery_key(orbital_body_id: str) -> str:
+    return f"{SHARED_KEY_PREFIX}:discovery:{orbital_body_id.strip()}"
+
+
+def empty_range_key(
+    orbital_body_id: str,
+    center: str,
+    start_time: datetime,
+    stop_time: datetime,
+    step: str,
+) -> str:
+    return ":".join(
+        [
+            SHARED_KEY_PREFIX,
+            "empty",
+            orbital_body_id.strip(),
+            center,
+            start_time.strftime("%Y%m%dT%H%M%S"),
+            stop_time.strftime("%Y%m%dT%H%M%S"),
+            step,
+        ]
+    )
+
+
+def remember_unknown_orbital_body(orbital_body_id: str) -> None:
+    get_shared_cache().set(
+        unknown_body_key(orbital_body_id),
+        True,
+        timeout=settings.HORIZONSAPI_NEGATIVE_CACHE_TTL,
+    )
+
+
+def is_unknown_orbital_body(orbital_body_id: str) -> bool:
+    return get_shared_cache().get(unknown_body_key(orbital_body_id), False)
+
+
+def start_discovery(orbital_body_id: str) -> bool:
+    """Whether it's time to find out the orbital body's ephemeris date range (again), in which case it's marked started."""
+    return get_shared_cache().add(
+        discovery_key(orbital_body_id),
+        True,
+        timeout=settings.HORIZONSAPI_NEGATIVE_CACHE_TTL,
+    )
+
+
+def remember_empty_range(
+    orbital_body_id: str,
+    center: str,
+    start_time: datetime,
+    stop_time: datetime,
+    step: str,
+) -> None:
+    get_shared_cache().set(
+        empty_range_key(orbital_body_id, center, start_time, stop_time, step),
+        True,
+        timeout=settings.HORIZONSAPI_NEGATIVE_CACHE_TTL,
+    )
+
+
+def is_empty_range(
+    orbital_body_id: str,
+    center: str,
+    start_time: datetime,
+    stop_time: datetime,
+    step: str,
+) -> bool:
+    return get_shared_cache().get(
+        empty_range_key(orbital_body_id, center, start_time, stop_time, step), False
+    )
+
+
+def get_version(
+    orbital_body_id: str, center: str, start_time: datetime, stop_time: datetime
+) -> str:
+    """
+    The version of the cached positions from start_time to stop_time: a digest of the generations
+    of the months they're in, read with a single get_many.
+    """
+    keys = [
+        generation_key(orbital_body_id, center, month)
+        for month in months_between(start_time, stop_time)
+    ]
+    generations = get_shared_cache().get_many(keys)
+    missing_keys = [key for key in keys if key not in generations]
+    for key in missing_keys:
+        # Start from the current time rather than 0, so that if the generation is ever evicted
+        # we don't go back to a generation whose responses may still be cached.
+        get_shared_cache().add(key, time.time_ns(), timeout=None)
+    if len(missing_keys) > 0:
+        generations.update(get_shared_cache().get_many(missing_keys))
+
+    digest = hashlib.blake2b(digest_size=8)
+    for key in keys:
+        digest.update(f"{generations.get(key, 0)}:".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def make_response_key(
+    orbital_body_id: str,
+    center: str,
+    start_time: datetime,
+    stop_time: datetime,
+    step: str,
+    response_format: str,
+) -> ResponseKey:
+    orbital_body_id = orbital_body_id.strip()
+    (skip, interval) = parse_step(step)
+    return ResponseKey(
+        orbital_body_id,
+        center,
+        start_time,
+        stop_time,
+        f"{skip}{interval}",
+        response_format,
+        get_version(orbital_body_id, center, start_time, stop_time),
+    )
+
+
+def get_cached_response(key: ResponseKey) -> bytes | None:
+    with span("response_cache"):
+        data = get_local_cache().get(key)
+        if data is None:
+            data = get_shared_cache().get(response_key_string(key))
+            if data is not None:
+                get_local_cache().put(key, data)
+
+    if data is None:
+        increment("horizonsapi_response_cache_misses_total")
+    else:
+        increment("horizonsapi_response_cache_hits_total")
+    return data
+
+
+def cache_response(key: ResponseKey, data: bytes) -> None:
+    get_local_cache().put(key, data)
+    get_shared_cache().set(
+        response_key_string(key), data, timeout=settings.HORIZONSAPI_RESPONSE_CACHE_TTL
+    )
+
+
+def get_cached_detail_levels(
+    key: ResponseKey,
+) -> Tuple[np.ndarray, np.ndarray] | None:
+    """The unix times and levels of detail of the positions in the response's window, if they're cached."""
+    return get_shared_cache().get(detail_levels_key(key))
+
+
+def cache_detail_levels(
+    key: ResponseKey, times: np.ndarray, levels: np.ndarray
+) -> None:
+    get_shared_cache().set(
+        detail_levels_key(key),
+        (times, levels),
+        timeout=settings.HORIZONSAPI_RESPONSE_CACHE_TTL,
+    )
+
+
+def invalidate_responses(
+    orbital_body_id: str, center: str, start_time: datetime, stop_time: datetime
+) -> None:
+    """Makes the cached responses for this orbital body and center that overlap the given months unreachable."""
+    get_local_cache().invalidate(orbital_body_id, center, start_time, stop_time)
+
+    for month in months_between(start_time, stop_time):
+        key = generation_key(orbital_body_id, center, month)
+        get_shared_cache().add(key, time.time_ns(), timeout=None)
+        try:
+            get_shared_cache().incr(key)
+        except ValueError:
+            # The generation was evicted in the meantime.
+            get_shared_cache().add(key, time.time_ns(), timeout=None)
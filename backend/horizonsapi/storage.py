@@ -0,0 +1,149 @@
+from django.conf import settings
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+import pytz
+import sys
+from typing import Dict, Iterable, List, Tuple
+
+from .models import ELEMENT_FIELDS, EphemerisChunk, OrbitalPosition
+
+# Values for the HORIZONSAPI_STORAGE setting.
+# "rows" serves cached data from the OrbitalPosition table.
+# "chunks" serves it from EphemerisChunk, with the OrbitalPosition table still kept up to date.
+STORAGE_ROWS = "rows"
+STORAGE_CHUNKS = "chunks"
+
+
+def is_chunk_storage_enabled() -> bool:
+    return settings.HORIZONSAPI_STORAGE == STORAGE_CHUNKS
+
+
+def month_start(date: datetime) -> datetime:
+    return pytz.utc.localize(datetime(date.year, date.month, 1))
+
+
+def pack(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def unpack(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class DecodedChunk:
+    def __init__(self, chunk: EphemerisChunk):
+        self.orbital_body_id = chunk.orbital_body_id
+        self.center = chunk.center
+        self.times = unpack("q", bytes(chunk.times))
+        elements = unpack("d", bytes(chunk.elements))
+        length = len(self.times)
+        self.columns = [
+            elements[n * length : (n + 1) * length] for n in range(len(ELEMENT_FIELDS))
+        ]
+
+    def index_of(self, timestamp: int) -> int | None:
+        index = bisect_left(self.times, timestamp)
+        if index < len(self.times) and self.times[index] == timestamp:
+            return index
+        return None
+
+    def position_at(self, index: int) -> OrbitalPosition:
+        orbital_position = OrbitalPosition(
+            orbital_body_id=self.orbital_body_id,
+            center=self.center,
+            time=datetime.fromtimestamp(self.times[index], pytz.utc),
+        )
+        for field, column in zip(ELEMENT_FIELDS, self.columns):
+            setattr(orbital_position, field, column[index])
+        return orbital_position
+
+
+def find_positions(
+    orbital_body_id: str, center: str, requested_dates: List[datetime]
+) -> Tuple[List[OrbitalPosition], List[datetime]]:
+    """
+    Looks up the requested dates in the ephemeris chunks.
+    Returns the cached positions that were found and the dates that weren't.
+    """
+    if len(requested_dates) == 0:
+        return (list(), list())
+
+    chunks = {
+        chunk.month: DecodedChunk(chunk)
+        for chunk in EphemerisChunk.objects.filter(
+            orbital_body_id=orbital_body_id,
+            center=center,
+            month__range=[
+                month_start(requested_dates[0]),
+                month_start(requested_dates[-1]),
+            ],
+        )
+    }
+
+    orbital_positions = list()
+    missing_dates = list()
+    for requested_date in requested_dates:
+        chunk = chunks.get(month_start(requested_date))
+        index = None
+        if chunk is not None:
+            index = chunk.index_of(int(requested_date.timestamp()))
+        if chunk is None or index is None:
+            missing_dates.append(requested_date)
+        else:
+            orbital_positions.append(chunk.position_at(index))
+
+    return (orbital_positions, missing_dates)
+
+
+def write_positions(orbital_positions: Iterable[OrbitalPosition]) -> int:
+    """
+    Merges orbital positions into their ephemeris chunks, replacing any cached data for the same times.
+    Returns the number of chunks written.
+    """
+    positions_by_chunk: Dict[Tuple[int, str, datetime], Dict[int, List[float]]] = dict()
+    for position in orbital_positions:
+        key = (
+            int(position.orbital_body_id),
+            position.center,
+            month_start(position.time),
+        )
+        positions_by_chunk.setdefault(key, dict())[int(position.time.timestamp())] = [
+            float(getattr(position, field)) for field in ELEMENT_FIELDS
+        ]
+
+    for (orbital_body_id, center, month), new_rows in positions_by_chunk.items():
+        chunk = EphemerisChunk.objects.filter(
+            orbital_body_id=orbital_body_id, center=center, month=month
+        ).first()
+        rows = dict()
+        if chunk is None:
+            chunk = EphemerisChunk(
+                orbital_body_id=orbital_body_id, center=center, month=month
+            )
+        else:
+            decoded = DecodedChunk(chunk)
+            for index, timestamp in enumerate(decoded.times):
+                rows[timestamp] = [column[index] for column in decoded.columns]
+        rows.update(new_rows)
+        encode_chunk(chunk, rows)
+        chunk.save()
+
+    return len(positions_by_chunk)
+
+
+def encode_chunk(chunk: EphemerisChunk, rows: Dict[int, List[float]]) -> None:
+    timestamps = sorted(rows.keys())
+    elements = array("d")
+    for n in range(len(ELEMENT_FIELDS)):
+        elements.extend(rows[timestamp][n] for timestamp in timestamps)
+    chunk.times = pack(array("q", timestamps))
+    chunk.elements = pack(elements)
@@ -0,0 +1,152 @@
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import random
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+import zlib
+
+from .date_utils import generate_date_range, parse_step
+from .horizons import HORIZONS_DATE_FORMAT, UNIX_EPOCH_JD, fixture_name
+
+# A local stand-in for the Horizons API, for load tests and benchmarks that shouldn't depend on
+# (or burden) the real one. Run it with `python manage.py horizons_stub_server`.
+
+# Range of dates the stub has ephemerides for, like a real Horizons target.
+SYNTHETIC_FIRST_DATE = datetime(1600, 1, 1)
+SYNTHETIC_LAST_DATE = datetime(2500, 1, 1)
+
+SYNTHETIC_TABLE_HEADER = """            JDTDB,            Calendar Date (TDB),                     EC,                     QR,                     IN,                     OM,                     W,                     Tp,                      N,                     MA,                     TA,                      A,                     AD,                     PR,
+**************************************************************************************************************************************************************************************************************************************************************************************************************************************************************
+$$SOE
+"""
+
+
+def synthetic_elements_table(orbital_body_id: str, dates: List[datetime]) -> str:
+    """
+    A Horizons ELEMENTS table for made-up but plausible orbits: a fixed ellipse per orbital body,
+    with the mean anomaly advancing at the rate Kepler's third law gives for its semi-major axis.
+    """
+    seed = zlib.crc32(orbital_body_id.encode("utf-8"))
+    semimajor_axis = 0.4 + (seed % 3000) / 100
+    eccentricity = (seed % 97) / 400
+    inclination = (seed % 83) / 10
+    longitude_of_ascending_node = seed % 360
+    argument_of_periapsis = (seed // 360) % 360
+    mean_motion = 0.9856076686 / semimajor_axis**1.5
+
+    lines = [SYNTHETIC_TABLE_HEADER]
+    for date in dates:
+        days = (date - datetime(1970, 1, 1)).total_seconds() / 86400
+        mean_anomaly = (mean_motion * days) % 360
+        lines.append(
+            f"{UNIX_EPOCH_JD + days:.9f}, A.D. {date:%Y-%b-%d %H:%M:%S}.0000, "
+            f" {eccentricity:.15E},  {semimajor_axis * (1 - eccentricity):.15E},  {inclination:.15E}, "
+            f" {longitude_of_ascending_node:.15E},  {argument_of_periapsis:.15E},  2.451545000000000E+06, "
+            f" {mean_motion:.15E},  {mean_anomaly:.15E},  {mean_anomaly:.15E},  {semimajor_axis:.15E}, "
+            f" {semimajor_axis * (1 + eccentricity):.15E},  {360 / mean_motion:.15E},\n"
+        )
+    lines.append("$$EOE\n")
+    return "".join(lines)
+
+
+def synthetic_response(params: Dict[str, str]) -> str:
+    """A response to an ELEMENTS request, as fetch_elements_data makes them, for any orbital body."""
+    orbital_body_id = params.get("COMMAND", "").strip("'")
+    header = (
+        "*******************************************************************************\n"
+        f"Target body name: Synthetic body {orbital_body_id} ({orbital_body_id})      {{source: stub}}\n"
+        f"Center body name: {params.get('CENTER', '')}\n"
+        "*******************************************************************************\n"
+    )
+    start_time = parse_horizons_date(params.get("START_TIME", ""))
+    stop_time = parse_horizons_date(params.get("STOP_TIME", ""))
+    if start_time < SYNTHETIC_FIRST_DATE:
+        return (
+            header
+            + f'No ephemeris for target "Synthetic body {orbital_body_id}" prior to A.D. '
+            + f"{SYNTHETIC_FIRST_DATE:%Y-%b-%d %H:%M:%S}.0000 TDB\n"
+        )
+    if stop_time > SYNTHETIC_LAST_DATE:
+        return (
+            header
+            + f'No ephemeris for target "Synthetic body {orbital_body_id}" after A.D. '
+            + f"{SYNTHETIC_LAST_DATE:%Y-%b-%d %H:%M:%S}.0000 TDB\n"
+        )
+
+    (skip, interval) = parse_step(params.get("STEP_SIZE", "1d"))
+    dates = list(generate_date_range(start_time, stop_time, interval, skip))
+    return header + synthetic_elements_table(orbital_body_id, dates)
+
+
+def parse_horizons_date(date: str) -> datetime:
+    year = date.split("-")[0]
+    if len(year) < 4:
+        # strftime doesn't pad years before 1000, and strptime only reads four digit years.
+        return datetime(int(year), 1, 1)
+    return datetime.strptime(date, HORIZONS_DATE_FORMAT)
+
+
+class StubHorizonsServer(ThreadingHTTPServer):
+    """
+    Serves responses recorded with HORIZONS_FIXTURES_MODE = 'record' from fixtures_directory,
+    or made up ones if synthetic is set. Every response is delayed by latency seconds, plus up to
+    jitter seconds more, and error_rate of the requests fail with HTTP 503.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        fixtures_directory: str | None = None,
+        synthetic: bool = True,
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        seed: int | None = None,
+    ):
+        super().__init__(address, StubHorizonsHandler)
+        self.fixtures_directory = fixtures_directory
+        self.synthetic = synthetic
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    def respond(self, params: Dict[str, str]) -> Tuple[int, str]:
+        if self.fixtures_directory is not None:
+            path = os.path.join(self.fixtures_directory, fixture_name(params))
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as fixture:
+                    return (200, fixture.read())
+        if self.synthetic:
+            return (200, synthetic_response(params))
+        return (404, f"No recorded response for {params}")
+
+
+class StubHorizonsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubHorizonsServer
+
+    def do_GET(self):
+        params = dict(parse_qsl(urlsplit(self.path).query))
+        server = self.server
+        delay = server.latency + server.random.uniform(0, server.jitter)
+        failed = server.random.random() < server.error_rate
+        time.sleep(delay)
+
+        if failed:
+            (status, body) = (503, "Service temporarily unavailable (stub)")
+        else:
+            (status, body) = server.respond(params)
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
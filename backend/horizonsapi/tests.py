@@ -1,3 +1,1845 @@
-from django.test import TestCase
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.utils.cache import get_max_age
+from django.test.client import AsyncClient
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
 
-# Create your tests here.
+import asyncio
+import io
+import json
+from importlib import import_module
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+import numpy as np
+import pytz
+from typing import List
+from unittest import mock, skipUnless
+import warnings
+
+from .coverage import (
+    find_bracketing_dates,
+    find_covered_dates,
+    merge_coverage_interval,
+)
+from .encoders import BINARY_HEADER, BINARY_MAGIC, encode_binary, encode_rows
+from .horizons import (
+    FixtureClient,
+    HorizonsClient,
+    HorizonsError,
+    fixture_name,
+    get_client,
+    parse_elements_table,
+)
+from .interpolation import interpolate_positions
+from .kepler import (
+    KILOMETERS_PER_AU,
+    derive_elements,
+    mean_motions,
+    solve_elliptic_kepler,
+    solve_hyperbolic_kepler,
+)
+from .lod import LOD_TOLERANCES, LevelOfDetail, detail_levels, select_samples
+from .metrics import MetricsMiddleware, span
+from .models import (
+    ELEMENT_FIELDS,
+    CoverageInterval,
+    EphemerisChunk,
+    OrbitalBody,
+    OrbitalPosition,
+)
+from .prefetch import PrefetchTarget, get_recent_requests, record_request
+from .response_cache import (
+    ResponseCache,
+    ResponseKey,
+    discovery_key,
+    get_shared_cache,
+    make_response_key,
+)
+from .storage import find_positions, write_positions
+from .stub import StubHorizonsHandler, StubHorizonsServer, synthetic_response
+from . import views
+from .views import (
+    cache_orbital_positions,
+    check_cached_positions,
+    match_cached_positions,
+)
+
+START_TIME = pytz.utc.localize(datetime(2023, 1, 1))
+
+# Migration module names start with a digit, so they can't be imported with an import statement.
+backfill_migration = import_module(
+    "horizonsapi.migrations.0009_backfill_coverageinterval"
+)
+
+
+def make_orbit(
+    orbital_body_id: int,
+    center: str,
+    semimajor_axis: float,
+    dates: List[datetime],
+    mean_longitude: float = 331.06,
+) -> List[OrbitalPosition]:
+    """Positions on an unperturbed orbit, whose mean longitude advances at the mean motion."""
+    motions = mean_motions(np.array([semimajor_axis]), center)
+    assert motions is not None
+    (mean_motion,) = motions
+    return [
+        OrbitalPosition(
+            orbital_body_id=orbital_body_id,
+            center=center,
+            time=date,
+            semimajor_axis=semimajor_axis,
+            eccentricity=0.0151,
+            inclination=1.075,
+            mean_longitude=(
+                mean_longitude
+                + mean_motion * (date - START_TIME).total_seconds() / 86400
+            )
+            % 360,
+            longitude_of_periapsis=357.8,
+            longitude_of_ascending_node=359.9,
+        )
+        for date in dates
+    ]
+
+
+def create_orbital_body(orbital_body_id: int = 499, name: str = "Mars") -> OrbitalBody:
+    """An orbital body with a known ephemeris date range, so that finding it out isn't started in the background."""
+    return OrbitalBody.objects.create(
+        id=orbital_body_id,
+        name=name,
+        first_ephemeris_date=pytz.utc.localize(datetime(1600, 1, 1)),
+        last_ephemeris_date=pytz.utc.localize(datetime(2500, 1, 1)),
+    )
+
+
+def hourly_dates(days: int) -> List[datetime]:
+    return [START_TIME + timedelta(hours=hour) for hour in range(days * 24)]
+
+
+class StubHorizonsMixin:
+    """Runs against a StubHorizonsServer, with synthetic responses, instead of Horizons."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StubHorizonsServer(("127.0.0.1", 0))
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.horizons_settings = override_settings(
+            HORIZONS_API_URL=f"http://127.0.0.1:{cls.server.server_port}/api/horizons.api",
+            HORIZONS_FIXTURES_DIR="",
+            HORIZONS_RETRIES=0,
+        )
+        cls.horizons_settings.enable()
+        get_client.cache_clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        get_client().close()
+        get_client.cache_clear()
+        cls.horizons_settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        get_shared_cache().clear()
+
+
+class StubHorizonsTestCase(StubHorizonsMixin, TestCase):
+    pass
+
+
+class CountingStubHorizonsServer(StubHorizonsServer):
+    """
+    Counts the connections and requests it handles, fails the first failures requests with HTTP 503,
+    and closes connections that sit idle for idle_timeout seconds, like Horizons does.
+    """
+
+    def __init__(self, failures: int = 0, idle_timeout: float | None = None, **kwargs):
+        super().__init__(("127.0.0.1", 0), **kwargs)
+        self.failures = failures
+        self.connections = 0
+        self.requests = 0
+        self.count_lock = threading.Lock()
+        self.RequestHandlerClass = type(
+            "IdleTimeoutHandler", (StubHorizonsHandler,), {"timeout": idle_timeout}
+        )
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def finish_request(self, request, client_address):
+        with self.count_lock:
+            self.connections += 1
+        super().finish_request(request, client_address)
+
+    def respond(self, params):
+        with self.count_lock:
+            self.requests += 1
+            failed = self.requests <= self.failures
+        if failed:
+            return (503, "Service temporarily unavailable (stub)")
+        return super().respond(params)
+
+    def make_client(self, retries: int = 0) -> HorizonsClient:
+        return HorizonsClient(
+            f"http://127.0.0.1:{self.server_port}/api/horizons.api",
+            timeout=5,
+            retries=retries,
+            backoff=0,
+        )
+
+
+class HorizonsClientTests(SimpleTestCase):
+    params = {
+        "COMMAND": "499",
+        "CENTER": "500@10",
+        "START_TIME": "2023-01-01T00:00:00",
+        "STOP_TIME": "2023-01-02T00:00:00",
+        "STEP_SIZE": "1h",
+    }
+
+    def start_server(self, **kwargs) -> CountingStubHorizonsServer:
+        server = CountingStubHorizonsServer(**kwargs)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_identical_concurrent_requests_share_one_upstream_request(self):
+        server = self.start_server(latency=0.2)
+        client = server.make_client()
+        self.addCleanup(client.close)
+        results = [None] * 5
+
+        def get(index: int):
+            results[index] = client.get(self.params)
+
+        threads = [threading.Thread(target=get, args=(index,)) for index in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(server.requests, 1)
+        self.assertIn("$$SOE", results[0])
+        self.assertEqual(results, [results[0]] * 5)
+
+    def test_unavailable_responses_are_retried(self):
+        server = self.start_server(failures=2)
+        client = server.make_client(retries=2)
+        self.addCleanup(client.close)
+
+        self.assertIn("$$SOE", client.get(self.params))
+        self.assertEqual(server.requests, 3)
+
+    def test_unavailable_responses_fail_once_retries_run_out(self):
+        server = self.start_server(failures=2)
+        client = server.make_client(retries=1)
+        self.addCleanup(client.close)
+
+        with self.assertRaises(HorizonsError) as raised:
+            client.get(self.params)
+        self.assertEqual(raised.exception.status, 503)
+        self.assertEqual(server.requests, 2)
+
+    def test_connections_are_kept_alive(self):
+        server = self.start_server()
+        client = server.make_client()
+        self.addCleanup(client.close)
+
+        client.get(self.params)
+        client.get(self.params)
+
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(server.connections, 1)
+
+    def test_connections_closed_while_idle_are_replaced(self):
+        server = self.start_server(idle_timeout=0.05)
+        # Not retrying shows that a stale connection doesn't use up a retry.
+        client = server.make_client(retries=0)
+        self.addCleanup(client.close)
+
+        client.get(self.params)
+        time.sleep(0.3)
+        result = client.get(self.params)
+
+        self.assertIn("$$SOE", result)
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(server.connections, 2)
+
+    def test_fixtures_recorded_through_the_upstream_are_replayed_without_it(self):
+        server = self.start_server()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        recorder = FixtureClient(directory.name, upstream=server.make_client())
+        self.addCleanup(recorder.close)
+
+        recorded = recorder.get(self.params)
+        self.assertEqual(recorder.get(self.params), recorded)
+        self.assertEqual(server.requests, 1)
+        self.assertEqual(os.listdir(directory.name), [fixture_name(self.params)])
+
+        replayer = FixtureClient(directory.name)
+        # The params can be in any order.
+        self.assertEqual(replayer.get(dict(reversed(self.params.items()))), recorded)
+        self.assertIn("$$SOE", recorded)
+        self.assertEqual(server.requests, 1)
+
+    def test_unrecorded_requests_fail_when_replaying(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        with self.assertRaises(HorizonsError) as raised:
+            FixtureClient(directory.name).get(self.params)
+
+        self.assertEqual(raised.exception.status, 404)
+
+
+class ParserTests(SimpleTestCase):
+    def elements_response(self, start_time: str, stop_time: str, step: str) -> str:
+        return synthetic_response(
+            {
+                "COMMAND": "499",
+                "CENTER": "500@10",
+                "START_TIME": start_time,
+                "STOP_TIME": stop_time,
+                "STEP_SIZE": step,
+            }
+        )
+
+    def test_elements_are_parsed_into_columns(self):
+        response = self.elements_response(
+            "2023-01-01T00:00:00", "2023-01-01T05:00:00", "1h"
+        )
+        first_row = response.split("$$SOE\n")[1].splitlines()[0].split(",")
+
+        table = parse_elements_table(response)
+
+        self.assertEqual(
+            table.times.tolist(),
+            [int(date.timestamp()) for date in hourly_dates(1)[:6]],
+        )
+        node = float(first_row[5])
+        periapsis = node + float(first_row[6])
+        self.assertAlmostEqual(table.columns["semimajor_axis"][0], float(first_row[11]))
+        self.assertAlmostEqual(table.columns["eccentricity"][0], float(first_row[2]))
+        self.assertAlmostEqual(table.columns["inclination"][0], float(first_row[4]))
+        self.assertAlmostEqual(table.columns["longitude_of_ascending_node"][0], node)
+        self.assertAlmostEqual(table.columns["longitude_of_periapsis"][0], periapsis)
+        self.assertAlmostEqual(
+            table.columns["mean_longitude"][0], periapsis + float(first_row[9])
+        )
+
+    def test_julian_calendar_dates_are_taken_as_written(self):
+        # Julian 1500-Mar-01 is Gregorian 1500-Mar-11, so the Julian date alone would be ten days off.
+        row = (
+            "2268992.500000000, A.D. 1500-Mar-01 00:00:00.0000, "
+            + ", ".join(["1.0E-01"] * 12)
+            + ",\n"
+        )
+
+        table = parse_elements_table(f"$$SOE\n{row}$$EOE\n")
+
+        self.assertEqual(
+            table.times.tolist(),
+            [int((pytz.utc.localize(datetime(1500, 3, 1))).timestamp())],
+        )
+
+    def test_responses_without_positions_are_empty(self):
+        no_table = (
+            'No ephemeris for target "Mars" after A.D. 9999-DEC-30 12:00:00.0000 TDB\n'
+        )
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            for response in [no_table, "$$SOE\n$$EOE\n"]:
+                table = parse_elements_table(response)
+
+                self.assertEqual(len(table), 0)
+                self.assertEqual(len(table.to_orbital_positions("499", "500@10")), 0)
+
+
+class InterpolationTests(SimpleTestCase):
+    def test_samples_more_than_half_an_orbit_apart_are_not_interpolated(self):
+        # Phobos goes round Mars about three times a day, so daily samples say nothing about the hours between.
+        samples = make_orbit(
+            401,
+            "500@499",
+            9376 / KILOMETERS_PER_AU,
+            [START_TIME + timedelta(days=day) for day in range(-1, 4)],
+        )
+        requested_dates = hourly_dates(2)
+
+        (positions, missing_dates) = interpolate_positions(
+            samples, requested_dates, 0.01
+        )
+
+        self.assertEqual(
+            [position.time for position in positions],
+            [START_TIME, START_TIME + timedelta(days=1)],
+        )
+        self.assertEqual(len(missing_dates), 46)
+
+    def test_mean_longitude_is_unwrapped_across_revolutions(self):
+        # Mars moves about half a degree a day, so hourly positions can be interpolated from daily ones,
+        # including across 360 degrees.
+        samples = make_orbit(
+            499,
+            "500@10",
+            1.5237,
+            [START_TIME + timedelta(days=day) for day in range(-1, 4)],
+            mean_longitude=359.5,
+        )
+        requested_dates = hourly_dates(2)
+        expected = make_orbit(499, "500@10", 1.5237, requested_dates, 359.5)
+
+        (positions, missing_dates) = interpolate_positions(
+            samples, requested_dates, 0.001
+        )
+
+        self.assertEqual(missing_dates, [])
+        self.assertEqual(len(positions), len(requested_dates))
+        for position, expected_position in zip(positions, expected):
+            self.assertAlmostEqual(
+                float(position.mean_longitude) % 360,
+                float(expected_position.mean_longitude),
+                places=6,
+            )
+
+    def test_nothing_is_interpolated_around_an_unknown_center(self):
+        samples = make_orbit(
+            499,
+            "500@10",
+            1.5237,
+            [START_TIME + timedelta(days=day) for day in range(-1, 4)],
+        )
+        for sample in samples:
+            sample.center = "500@2000001"
+
+        (positions, missing_dates) = interpolate_positions(
+            samples, hourly_dates(2), 0.001
+        )
+
+        self.assertEqual(len(positions), 2)
+        self.assertEqual(len(missing_dates), 46)
+
+
+class KeplerTests(SimpleTestCase):
+    def test_elliptic_solutions_satisfy_keplers_equation(self):
+        (mean_anomaly, eccentricity) = np.meshgrid(
+            np.linspace(-np.pi, np.pi, 101), [0, 0.1, 0.5, 0.9, 0.99]
+        )
+
+        eccentric_anomaly = solve_elliptic_kepler(mean_anomaly, eccentricity)
+
+        np.testing.assert_allclose(
+            eccentric_anomaly - eccentricity * np.sin(eccentric_anomaly),
+            mean_anomaly,
+            atol=1e-10,
+        )
+
+    def test_hyperbolic_solutions_satisfy_keplers_equation(self):
+        (mean_anomaly, eccentricity) = np.meshgrid(
+            np.linspace(-50, 50, 101), [1.01, 1.5, 3, 10]
+        )
+
+        hyperbolic_anomaly = solve_hyperbolic_kepler(mean_anomaly, eccentricity)
+
+        np.testing.assert_allclose(
+            eccentricity * np.sinh(hyperbolic_anomaly) - hyperbolic_anomaly,
+            mean_anomaly,
+            atol=1e-8,
+        )
+
+    def test_positions_are_derived_from_elements(self):
+        elements = {
+            "semimajor_axis": np.array([2.0, 2.0, -2.0]),
+            "eccentricity": np.array([0.5, 0.5, 1.5]),
+            "inclination": np.array([0.0, 90.0, 0.0]),
+            "mean_longitude": np.array([30.0, 280.0, 30.0]),
+            "longitude_of_periapsis": np.array([30.0, 100.0, 30.0]),
+            "longitude_of_ascending_node": np.array([0.0, 10.0, 0.0]),
+        }
+
+        derived = derive_elements(elements)
+
+        # At periapsis, the distance is a(1 - e) for an ellipse, and |a|(e - 1) for a hyperbola.
+        # At apoapsis, it's a(1 + e), and the second orbit is polar with its periapsis due north, so that's due south.
+        np.testing.assert_allclose(derived["true_anomaly"], [0, 180, 0], atol=1e-9)
+        np.testing.assert_allclose(
+            np.stack([derived["x"], derived["y"], derived["z"]], axis=1),
+            [
+                [np.cos(np.radians(30)), np.sin(np.radians(30)), 0],
+                [0, 0, -3],
+                [np.cos(np.radians(30)), np.sin(np.radians(30)), 0],
+            ],
+            atol=1e-9,
+        )
+        np.testing.assert_allclose(
+            derived["semi_minor_axis"], [np.sqrt(3)] * 2 + [np.sqrt(5)]
+        )
+        np.testing.assert_allclose(derived["argument_of_periapsis"], [30, 90, 30])
+
+
+class BracketingDatesTests(TestCase):
+    def test_only_the_grid_points_around_requested_dates_are_found(self):
+        create_orbital_body()
+        CoverageInterval.objects.create(
+            orbital_body_id=499,
+            center="500@10",
+            interval="min",
+            skip=1,
+            start=START_TIME,
+            stop=START_TIME + timedelta(days=10),
+        )
+        requested_dates = [
+            START_TIME + timedelta(days=day, seconds=30) for day in range(10)
+        ]
+
+        bracketing_dates = find_bracketing_dates("499", "500@10", requested_dates)
+
+        expected_dates = [
+            START_TIME + timedelta(days=day, minutes=minute)
+            for day in range(10)
+            for minute in [-1, 0, 1, 2]
+            if day > 0 or minute >= 0
+        ]
+        self.assertEqual(bracketing_dates, expected_dates)
+
+
+class CoverageTests(TestCase):
+    def setUp(self):
+        create_orbital_body()
+
+    def create_coverage_interval(
+        self, interval: str, skip: int, start: datetime, stop: datetime
+    ) -> CoverageInterval:
+        return CoverageInterval.objects.create(
+            orbital_body_id=499,
+            center="500@10",
+            interval=interval,
+            skip=skip,
+            start=start,
+            stop=stop,
+        )
+
+    def test_only_dates_on_an_interval_grid_are_covered(self):
+        self.create_coverage_interval(
+            "h", 2, START_TIME, START_TIME + timedelta(days=1)
+        )
+        self.create_coverage_interval(
+            "d", 1, START_TIME + timedelta(days=3), START_TIME + timedelta(days=5)
+        )
+        requested_dates = hourly_dates(6)
+
+        (covered_dates, uncovered_dates) = find_covered_dates(
+            "499", "500@10", requested_dates
+        )
+
+        expected_dates = [
+            START_TIME + timedelta(hours=hour) for hour in range(0, 25, 2)
+        ] + [START_TIME + timedelta(days=day) for day in [3, 4, 5]]
+        self.assertEqual(covered_dates, expected_dates)
+        self.assertEqual(sorted(covered_dates + uncovered_dates), requested_dates)
+
+    def test_overlapping_and_adjacent_intervals_are_merged(self):
+        self.create_coverage_interval(
+            "h", 1, START_TIME, START_TIME + timedelta(hours=10)
+        )
+        self.create_coverage_interval(
+            "h", 1, START_TIME + timedelta(hours=21), START_TIME + timedelta(hours=30)
+        )
+
+        merge_coverage_interval(
+            "499",
+            "500@10",
+            "h",
+            1,
+            START_TIME + timedelta(hours=5),
+            START_TIME + timedelta(hours=20),
+        )
+
+        self.assertEqual(
+            list(CoverageInterval.objects.values_list("start", "stop")),
+            [(START_TIME, START_TIME + timedelta(hours=30))],
+        )
+
+    def test_intervals_on_other_grids_are_not_merged(self):
+        self.create_coverage_interval(
+            "h", 2, START_TIME, START_TIME + timedelta(hours=10)
+        )
+        # Same step, but offset by an hour.
+        self.create_coverage_interval(
+            "h",
+            1,
+            START_TIME + timedelta(minutes=30),
+            START_TIME + timedelta(hours=9, minutes=30),
+        )
+
+        merge_coverage_interval(
+            "499",
+            "500@10",
+            "h",
+            1,
+            START_TIME + timedelta(hours=10),
+            START_TIME + timedelta(hours=20),
+        )
+
+        self.assertEqual(CoverageInterval.objects.count(), 3)
+
+    def test_regular_runs_are_found_in_cached_times(self):
+        times = (
+            [START_TIME + timedelta(days=day) for day in range(5)]
+            + [START_TIME + timedelta(days=4, hours=hour) for hour in range(1, 4)]
+            # Too few to be a grid.
+            + [START_TIME + timedelta(days=10), START_TIME + timedelta(days=11)]
+            + [START_TIME + timedelta(days=20, seconds=second) for second in range(5)]
+        )
+
+        self.assertEqual(
+            list(backfill_migration.find_regular_runs(times)),
+            [
+                (1, "d", START_TIME, START_TIME + timedelta(days=4)),
+                (
+                    1,
+                    "h",
+                    START_TIME + timedelta(days=4),
+                    START_TIME + timedelta(days=4, hours=3),
+                ),
+            ],
+        )
+
+    def test_positions_cached_before_coverage_was_recorded_are_backfilled(self):
+        OrbitalPosition.objects.bulk_create(
+            make_orbit(499, "500@10", 1.524, hourly_dates(2))
+        )
+        backfill_migration.backfill_coverage_intervals(apps, None)
+
+        (covered_dates, uncovered_dates) = find_covered_dates(
+            "499", "500@10", hourly_dates(3)
+        )
+        self.assertEqual(covered_dates, hourly_dates(2))
+
+
+@override_settings(HORIZONSAPI_SERVER_TIMING=True)
+class MetricsMiddlewareTests(SimpleTestCase):
+    def test_async_requests_are_timed_without_a_thread(self):
+        async def get_response(request):
+            with span("db"):
+                await asyncio.sleep(0)
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+
+        response = asyncio.run(middleware(RequestFactory().get("/")))
+
+        self.assertRegex(response["Server-Timing"], r"^db;dur=[0-9.]+, total;dur=")
+
+    def test_sync_requests_are_timed(self):
+        def get_response(request):
+            with span("db"):
+                pass
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(get_response)
+        self.assertFalse(asyncio.iscoroutinefunction(middleware))
+
+        response = middleware(RequestFactory().get("/"))
+
+        self.assertRegex(response["Server-Timing"], r"^db;dur=[0-9.]+, total;dur=")
+
+
+class CacheLookupTests(TestCase):
+    def setUp(self):
+        create_orbital_body()
+        self.dates = hourly_dates(50)
+        # Gaps at the start, across the boundary between the first two COVERAGE_BATCH_SIZE batches, and at the end.
+        self.missing_hours = (
+            list(range(0, 3)) + list(range(495, 510)) + list(range(1150, 1200))
+        )
+        cache_orbital_positions(
+            make_orbit(
+                499,
+                "500@10",
+                1.524,
+                [
+                    date
+                    for hour, date in enumerate(self.dates)
+                    if hour not in self.missing_hours
+                ],
+            )
+        )
+        self.cached_query = OrbitalPosition.objects.filter(
+            orbital_body_id=499, center="500@10"
+        )
+
+    def test_match_cached_positions_pairs_every_date_in_order(self):
+        with self.assertNumQueries(3):
+            matches = list(match_cached_positions(self.dates, self.cached_query))
+
+        self.assertEqual([date for date, _ in matches], self.dates)
+        self.assertEqual(
+            [hour for hour, (_, position) in enumerate(matches) if position is None],
+            self.missing_hours,
+        )
+        for date, position in matches:
+            if position is not None:
+                self.assertEqual(position.time, date)
+
+    def test_check_cached_positions_splits_found_and_missing_dates(self):
+        (cached_positions, missing_dates) = check_cached_positions(
+            self.dates, self.cached_query
+        )
+
+        self.assertEqual(
+            [position.time for position in cached_positions],
+            [
+                date
+                for hour, date in enumerate(self.dates)
+                if hour not in self.missing_hours
+            ],
+        )
+        self.assertEqual(
+            missing_dates, [self.dates[hour] for hour in self.missing_hours]
+        )
+
+    def test_positions_between_the_requested_dates_are_not_loaded(self):
+        cache_orbital_positions(
+            make_orbit(
+                499,
+                "500@10",
+                1.524,
+                [date + timedelta(minutes=30) for date in self.dates],
+            )
+        )
+
+        (cached_positions, missing_dates) = check_cached_positions(
+            self.dates[::2], self.cached_query
+        )
+
+        self.assertEqual(
+            len(cached_positions) + len(missing_dates), len(self.dates[::2])
+        )
+        self.assertTrue(all(position.time.minute == 0 for position in cached_positions))
+
+
+class ExplainCacheQueriesTests(TestCase):
+    def setUp(self):
+        create_orbital_body()
+        cache_orbital_positions(
+            make_orbit(499, "500@10", 1.524, hourly_dates(30)), "1h"
+        )
+
+    def test_every_representative_range_is_explained(self):
+        stdout = io.StringIO()
+        call_command(
+            "explain_cache_queries",
+            "499",
+            "--start-time=2023-01-01T00:00:00",
+            "--repeat=1",
+            stdout=stdout,
+        )
+        output = stdout.getvalue()
+
+        self.assertTrue(output.startswith("sqlite, 720 cached orbital positions\n"))
+        self.assertEqual(
+            re.findall(r"^== (.*): (\d+) dates$", output, re.MULTILINE),
+            [
+                ("1 day, hourly", "25"),
+                ("1 month, daily", "31"),
+                ("1 year, daily", "366"),
+                ("1 year, hourly", "8761"),
+            ],
+        )
+        self.assertEqual(
+            re.findall(r" ms, (\d+) found$", output, re.MULTILINE),
+            ["25", "30", "30", "720"],
+        )
+        # Both lookups are answered from an index rather than by scanning the table.
+        self.assertEqual(output.count("USING INDEX coverage_interval_lookup"), 4)
+        self.assertNotIn("SCAN", output)
+
+
+class CacheWriteTests(TestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        create_orbital_body()
+
+    def stored_values(self, center: str = "500@10") -> List[tuple]:
+        return [
+            (time, float(semimajor_axis), float(mean_longitude))
+            for time, semimajor_axis, mean_longitude in OrbitalPosition.objects.filter(
+                orbital_body_id=499, center=center
+            )
+            .order_by("time")
+            .values_list("time", "semimajor_axis", "mean_longitude")
+        ]
+
+    def values_of(self, orbital_positions: List[OrbitalPosition]) -> List[tuple]:
+        """What the orbital positions are stored as, to the eight decimal places the database keeps."""
+        return [
+            (
+                position.time,
+                round(position.semimajor_axis, 8),
+                round(position.mean_longitude, 8),
+            )
+            for position in orbital_positions
+        ]
+
+    @mock.patch.object(views, "CACHE_BATCH_SIZE", 4)
+    def test_cached_positions_are_replaced_by_newer_ones(self):
+        dates = hourly_dates(1)
+        original = make_orbit(499, "500@10", 1.524, dates[:10])
+        other_center = make_orbit(499, "500@0", 1.524, dates[:10])
+        self.assertEqual(cache_orbital_positions(original), (10, 0))
+        cache_orbital_positions(other_center)
+
+        # Positions 5 to 9 are rewritten and 10 to 12 are new. Position 7 comes twice, in different batches.
+        rewritten = make_orbit(
+            499, "500@10", 1.6, dates[5:13] + [dates[7]], mean_longitude=10
+        )
+        (insert_count, update_count) = cache_orbital_positions(rewritten)
+
+        self.assertEqual((insert_count, update_count), (3, 6))
+        self.assertEqual(
+            self.stored_values(),
+            self.values_of(original[:5] + rewritten[:8]),
+        )
+        self.assertEqual(self.stored_values("500@0"), self.values_of(other_center))
+
+    def test_times_repeated_in_one_batch_are_stored_once(self):
+        dates = hourly_dates(1)[:3]
+        original = make_orbit(499, "500@10", 1.524, dates)
+        repeated = make_orbit(499, "500@10", 1.6, dates[1:2], mean_longitude=10)
+
+        (insert_count, update_count) = cache_orbital_positions(original + repeated)
+
+        self.assertEqual((insert_count, update_count), (3, 0))
+        self.assertEqual(
+            self.stored_values(),
+            self.values_of([original[0], repeated[0], original[2]]),
+        )
+
+
+class ChunkStorageTests(TestCase):
+    # Hourly dates on either side of the end of January.
+    dates = [
+        pytz.utc.localize(datetime(2023, 1, 31)) + timedelta(hours=hour)
+        for hour in range(48)
+    ]
+
+    def setUp(self):
+        create_orbital_body()
+
+    def assertPositionsEqual(
+        self, positions: List[OrbitalPosition], expected: List[OrbitalPosition]
+    ):
+        self.assertEqual(
+            [
+                [position.time] + [getattr(position, field) for field in ELEMENT_FIELDS]
+                for position in positions
+            ],
+            [
+                [position.time]
+                + [float(getattr(position, field)) for field in ELEMENT_FIELDS]
+                for position in expected
+            ],
+        )
+
+    def test_positions_are_read_back_across_months(self):
+        positions = make_orbit(499, "500@10", 1.524, self.dates)
+
+        self.assertEqual(write_positions(positions), 2)
+
+        self.assertEqual(EphemerisChunk.objects.count(), 2)
+        (found_positions, missing_dates) = find_positions("499", "500@10", self.dates)
+        self.assertPositionsEqual(found_positions, positions)
+        self.assertEqual(missing_dates, [])
+
+    def test_overlapping_writes_are_merged_into_existing_chunks(self):
+        first = make_orbit(499, "500@10", 1.524, self.dates[:30])
+        second = make_orbit(499, "500@10", 1.6, self.dates[20:], mean_longitude=10)
+        write_positions(first)
+
+        self.assertEqual(write_positions(second), 2)
+
+        self.assertEqual(EphemerisChunk.objects.count(), 2)
+        (found_positions, missing_dates) = find_positions("499", "500@10", self.dates)
+        self.assertPositionsEqual(found_positions, first[:20] + second)
+        self.assertEqual(missing_dates, [])
+
+    def test_dates_that_are_not_stored_are_missing(self):
+        stored_dates = self.dates[:10] + self.dates[30:40]
+        positions = make_orbit(499, "500@10", 1.524, stored_dates)
+        write_positions(positions)
+        # Between stored times, and in a month without a chunk.
+        requested_dates = sorted(
+            self.dates[5:35]
+            + [self.dates[0] + timedelta(minutes=30)]
+            + [pytz.utc.localize(datetime(2023, 3, 1))]
+        )
+
+        (found_positions, missing_dates) = find_positions(
+            "499", "500@10", requested_dates
+        )
+
+        self.assertPositionsEqual(found_positions, positions[5:15])
+        self.assertEqual(
+            missing_dates,
+            [self.dates[0] + timedelta(minutes=30)]
+            + self.dates[10:30]
+            + [pytz.utc.localize(datetime(2023, 3, 1))],
+        )
+        (_, other_center_dates) = find_positions("499", "500@0", self.dates[:10])
+        self.assertEqual(other_center_dates, self.dates[:10])
+
+    def test_cached_rows_are_imported_into_chunks(self):
+        positions = make_orbit(499, "500@10", 1.524, self.dates)
+        OrbitalPosition.objects.bulk_create(positions)
+        output = io.StringIO()
+
+        # Small batches, so that January's chunk is merged with the rows of later batches.
+        with mock.patch(
+            "horizonsapi.management.commands.import_ephemeris_chunks.IMPORT_BATCH_SIZE",
+            10,
+        ):
+            call_command("import_ephemeris_chunks", stdout=output)
+
+        self.assertIn("Imported 48 orbital positions", output.getvalue())
+        self.assertEqual(EphemerisChunk.objects.count(), 2)
+        (found_positions, missing_dates) = find_positions("499", "500@10", self.dates)
+        self.assertPositionsEqual(
+            found_positions, list(OrbitalPosition.objects.order_by("time"))
+        )
+        self.assertEqual(missing_dates, [])
+
+
+class ResponseFormatTests(TestCase):
+    params = {
+        "orbital_body_id": "499",
+        "center": "500@10",
+        "start_time": "2023-01-01T00:00:00",
+        "stop_time": "2023-01-01T23:00:00",
+        "step": "1h",
+    }
+
+    def setUp(self):
+        get_shared_cache().clear()
+        create_orbital_body()
+        cache_orbital_positions(make_orbit(499, "500@10", 1.524, hourly_dates(1)), "1h")
+
+    def get(self, response_format: str):
+        response = self.client.get(
+            "/horizonsapi/orbital_position/",
+            {**self.params, "format": response_format},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def django_rows(self) -> List[dict]:
+        """The time and orbital elements of each position in the django format, in the order it has them."""
+        return [
+            {
+                field: value
+                for field, value in position["fields"].items()
+                if field in ["time"] + ELEMENT_FIELDS
+            }
+            for position in self.get("django")
+        ]
+
+    def test_rows_hold_the_django_values_in_the_same_order(self):
+        django_rows = self.django_rows()
+        rows = self.get("rows")
+
+        self.assertEqual(len(django_rows), 24)
+        self.assertEqual(rows, django_rows)
+        for row, django_row in zip(rows, django_rows):
+            self.assertEqual(list(row.keys()), list(django_row.keys()))
+
+    def test_columns_hold_the_django_values_in_the_same_order(self):
+        django_rows = self.django_rows()
+        columns = self.get("columns")
+
+        self.assertEqual(list(columns.keys()), list(django_rows[0].keys()))
+        self.assertEqual(
+            columns,
+            {
+                field: [row[field] for row in django_rows]
+                for field in django_rows[0].keys()
+            },
+        )
+
+
+class BinaryFormatTests(TestCase):
+    params = {
+        "orbital_body_id": "499",
+        "center": "500@10",
+        "start_time": "2023-01-01T00:00:00",
+        "stop_time": "2023-01-01T23:00:00",
+        "step": "1h",
+    }
+
+    def setUp(self):
+        get_shared_cache().clear()
+        create_orbital_body()
+        cache_orbital_positions(make_orbit(499, "500@10", 1.524, hourly_dates(1)), "1h")
+
+    def decode(self, data: bytes, itemsize: int) -> dict:
+        header = BINARY_HEADER.unpack_from(data)
+        (magic, _, value_size, field_count, center_length) = header[:5]
+        (orbital_body_id, start, step, count) = header[5:]
+        self.assertEqual(magic, BINARY_MAGIC)
+        self.assertEqual(value_size, itemsize)
+        self.assertEqual(field_count, len(ELEMENT_FIELDS))
+        offset = BINARY_HEADER.size
+        center = data[offset : offset + center_length].decode("utf-8")
+        # The center is padded with zeros to a multiple of 8 bytes.
+        padded_length = -(-center_length // 8) * 8
+        self.assertEqual(
+            data[offset + center_length : offset + padded_length],
+            b"\0" * (padded_length - center_length),
+        )
+        offset += padded_length
+        if step == 0:
+            times = np.frombuffer(data, dtype="<i8", count=count, offset=offset)
+            offset += 8 * count
+        else:
+            times = start + step * np.arange(count)
+        columns = dict()
+        for field in ELEMENT_FIELDS:
+            columns[field] = np.frombuffer(
+                data, dtype=f"<f{itemsize}", count=count, offset=offset
+            )
+            offset += itemsize * count
+        self.assertEqual(offset, len(data))
+        return {
+            "orbital_body_id": orbital_body_id,
+            "center": center,
+            "step": step,
+            "times": times.tolist(),
+            "columns": columns,
+        }
+
+    def get(self, response_format: str):
+        with mock.patch.object(views, "fetch_elements_data") as fetch_elements_data:
+            response = self.client.get(
+                "/horizonsapi/orbital_position/",
+                {**self.params, "format": response_format},
+            )
+        fetch_elements_data.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_binary_formats_hold_the_rows_values(self):
+        rows = self.get("rows").json()
+
+        for response_format, itemsize, tolerance in [("bin", 8, 0), ("bin32", 4, 1e-7)]:
+            with self.subTest(response_format):
+                response = self.get(response_format)
+                self.assertEqual(response["Content-Type"], "application/octet-stream")
+                decoded = self.decode(response.content, itemsize)
+
+                self.assertEqual(decoded["orbital_body_id"], 499)
+                self.assertEqual(decoded["center"], "500@10")
+                self.assertEqual(decoded["step"], 3600)
+                self.assertEqual(
+                    decoded["times"],
+                    [int(date.timestamp()) for date in hourly_dates(1)],
+                )
+                for field in ELEMENT_FIELDS:
+                    np.testing.assert_allclose(
+                        decoded["columns"][field],
+                        [row[field] for row in rows],
+                        rtol=tolerance,
+                    )
+
+    def test_uneven_times_are_sent_as_an_array(self):
+        dates = hourly_dates(1)[:3] + [START_TIME + timedelta(hours=5)]
+        positions = make_orbit(499, "500@10", 1.524, dates)
+
+        decoded = self.decode(encode_binary(positions), 8)
+
+        self.assertEqual(decoded["step"], 0)
+        self.assertEqual(decoded["times"], [int(date.timestamp()) for date in dates])
+        np.testing.assert_array_equal(
+            decoded["columns"]["mean_longitude"],
+            [position.mean_longitude for position in positions],
+        )
+
+
+class LevelOfDetailTests(TestCase):
+    params = {
+        "orbital_body_id": "499",
+        "center": "500@10",
+        "start_time": "2023-01-01T00:00:00",
+        "stop_time": "2023-12-31T00:00:00",
+        "step": "1d",
+        "format": "rows",
+    }
+
+    def setUp(self):
+        get_shared_cache().clear()
+        create_orbital_body()
+        dates = [START_TIME + timedelta(days=day) for day in range(365)]
+        # A maneuver halfway through, which the thinned series should keep samples around.
+        self.positions = make_orbit(499, "500@10", 1.524, dates[:180]) + make_orbit(
+            499, "500@10", 1.3, dates[180:]
+        )
+        cache_orbital_positions(self.positions, "1d")
+
+    def test_coarser_levels_keep_a_subset_of_finer_ones(self):
+        levels = detail_levels(self.positions)
+        previous = set(range(len(self.positions)))
+
+        for tolerance in [0.001] + LOD_TOLERANCES + [100]:
+            indices = select_samples(levels, LevelOfDetail(None, tolerance))
+
+            self.assertLessEqual(set(indices.tolist()), previous)
+            self.assertEqual(indices[0], 0)
+            self.assertEqual(indices[-1], len(self.positions) - 1)
+            previous = set(indices.tolist())
+
+    def test_max_points_is_never_exceeded(self):
+        levels = detail_levels(self.positions)
+
+        for max_points in [2, 3, 5, 10, 50, 100, 364, 365, 1000]:
+            for tolerance in [None, 0.01, 10]:
+                with self.subTest(max_points=max_points, tolerance=tolerance):
+                    indices = select_samples(
+                        levels, LevelOfDetail(max_points, tolerance)
+                    )
+
+                    self.assertLessEqual(len(indices), max_points)
+                    self.assertEqual(indices[0], 0)
+                    self.assertEqual(indices[-1], len(self.positions) - 1)
+                    self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_thinned_responses_from_cached_levels_match_fresh_ones(self):
+        self.client.get(
+            "/horizonsapi/orbital_position/", {**self.params, "max_points": "100"}
+        )
+
+        # The levels worked out for the first request are reused for the same window.
+        with mock.patch.object(
+            views, "detail_levels", side_effect=AssertionError
+        ), mock.patch.object(views, "fetch_elements_data", side_effect=AssertionError):
+            response = self.client.get(
+                "/horizonsapi/orbital_position/", {**self.params, "max_points": "40"}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(response.json()), 2)
+        self.assertLessEqual(len(response.json()), 40)
+        stored_positions = list(
+            OrbitalPosition.objects.filter(orbital_body_id=499).order_by("time")
+        )
+        indices = select_samples(
+            detail_levels(stored_positions), LevelOfDetail(40, None)
+        )
+        self.assertEqual(
+            response.json(),
+            json.loads(encode_rows([stored_positions[index] for index in indices])),
+        )
+
+
+@override_settings(HORIZONSAPI_STORAGE="chunks")
+class ChunkStorageViewTests(TestCase):
+    params = {
+        "center": "500@10",
+        "start_time": "2023-01-01T00:00:00",
+        "stop_time": "2023-01-01T23:00:00",
+        "step": "1h",
+        "format": "rows",
+    }
+
+    def setUp(self):
+        get_shared_cache().clear()
+        create_orbital_body()
+        cache_orbital_positions(make_orbit(499, "500@10", 1.524, hourly_dates(1)), "1h")
+        # Only the chunks and the coverage are left, so anything served had to come through them.
+        OrbitalPosition.objects.all().delete()
+
+    def test_batches_are_served_from_chunks(self):
+        with mock.patch.object(
+            views, "fetch_elements_data", side_effect=AssertionError
+        ):
+            response = self.client.get(
+                "/horizonsapi/orbital_position/batch/",
+                {**self.params, "orbital_body_ids": "499"},
+            )
+
+        self.assertEqual(len(response.json()["499"]), 24)
+
+    def test_streams_are_served_from_chunks(self):
+        with mock.patch.object(
+            views, "fetch_elements_data", side_effect=AssertionError
+        ):
+            response = self.client.get(
+                "/horizonsapi/orbital_position/",
+                {**self.params, "orbital_body_id": "499", "stream": "true"},
+            )
+            body = b"".join(response.streaming_content)
+
+        self.assertEqual(len(json.loads(body)), 24)
+
+
+@skipUnless(connection.vendor == "postgresql", "Needs a PostgreSQL database")
+class PostgreSQLTests(TestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        create_orbital_body()
+
+    def test_positions_are_copied_and_upserted(self):
+        dates = hourly_dates(1)
+        cache_orbital_positions(make_orbit(499, "500@10", 1.524, dates[:10]))
+
+        with mock.patch.object(views, "replace_orbital_positions") as replace:
+            counts = cache_orbital_positions(
+                make_orbit(499, "500@10", 1.6, dates[5:15] + dates[7:8])
+            )
+
+        replace.assert_not_called()
+        self.assertEqual(counts, (5, 5))
+        self.assertEqual(
+            list(
+                OrbitalPosition.objects.order_by("time").values_list(
+                    "semimajor_axis", flat=True
+                )
+            ),
+            [Decimal("1.524")] * 5 + [Decimal("1.6")] * 10,
+        )
+
+    def test_positions_are_stored_in_partitions_by_time(self):
+        cache_orbital_positions(
+            make_orbit(
+                499,
+                "500@10",
+                1.524,
+                [START_TIME, pytz.utc.localize(datetime(2150, 1, 1))],
+            )
+        )
+        table = OrbitalPosition._meta.db_table
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT tableoid::regclass::text, count(*) FROM {connection.ops.quote_name(table)} GROUP BY 1"
+            )
+            partitions = dict(cursor.fetchall())
+
+        self.assertEqual(partitions, {f"{table}_2020": 1, f"{table}_default": 1})
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch(
+            "horizonsapi.response_cache.time.monotonic", side_effect=lambda: self.now
+        )
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.cache = ResponseCache(max_bytes=10, ttl=60)
+
+    def key(self, orbital_body_id="499", center="500@10", month=1):
+        return ResponseKey(
+            orbital_body_id,
+            center,
+            START_TIME.replace(month=month),
+            START_TIME.replace(month=month) + timedelta(days=20),
+            "1d",
+            "rows",
+            "version",
+        )
+
+    def test_least_recently_used_entries_are_evicted_past_max_bytes(self):
+        self.cache.put(self.key(month=1), b"1111")
+        self.cache.put(self.key(month=2), b"2222")
+        self.cache.get(self.key(month=1))
+        self.cache.put(self.key(month=3), b"3333")
+
+        self.assertEqual(self.cache.get(self.key(month=1)), b"1111")
+        self.assertIsNone(self.cache.get(self.key(month=2)))
+        self.assertEqual(self.cache.get(self.key(month=3)), b"3333")
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.assertEqual(self.cache.stats()["bytes"], 8)
+
+    def test_responses_larger_than_max_bytes_are_not_cached(self):
+        self.cache.put(self.key(), b"12345678901")
+
+        self.assertIsNone(self.cache.get(self.key()))
+        self.assertEqual(self.cache.stats()["bytes"], 0)
+
+    def test_entries_expire_after_the_ttl(self):
+        self.cache.put(self.key(), b"1111")
+
+        self.now += 59
+        self.assertEqual(self.cache.get(self.key()), b"1111")
+        self.now += 1
+        self.assertIsNone(self.cache.get(self.key()))
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_invalidate_drops_overlapping_responses_for_the_body_and_center(self):
+        self.cache.put(self.key(month=1), b"1")
+        self.cache.put(self.key(month=3), b"3")
+        self.cache.put(self.key(orbital_body_id="599", month=1), b"5")
+        self.cache.put(self.key(center="500@0", month=1), b"0")
+
+        self.cache.invalidate(
+            "499",
+            "500@10",
+            START_TIME + timedelta(days=10),
+            START_TIME + timedelta(days=40),
+        )
+
+        self.assertIsNone(self.cache.get(self.key(month=1)))
+        self.assertEqual(self.cache.get(self.key(month=3)), b"3")
+        self.assertEqual(self.cache.get(self.key(orbital_body_id="599")), b"5")
+        self.assertEqual(self.cache.get(self.key(center="500@0")), b"0")
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+    def test_stats(self):
+        self.cache.put(self.key(month=1), b"1111")
+        self.cache.put(self.key(month=1), b"111")
+        self.cache.get(self.key(month=1))
+        self.cache.get(self.key(month=2))
+
+        self.assertEqual(
+            self.cache.stats(),
+            {
+                "entries": 1,
+                "bytes": 3,
+                "max_bytes": 10,
+                "hits": 1,
+                "misses": 1,
+                "evictions": 0,
+                "expirations": 0,
+                "invalidations": 0,
+            },
+        )
+
+
+class ResponseInvalidationTests(TestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        create_orbital_body()
+
+    def window_key(self):
+        return make_response_key(
+            "499",
+            "500@10",
+            START_TIME,
+            START_TIME + timedelta(days=20),
+            "1d",
+            "rows",
+        )
+
+    def test_writing_other_months_keeps_the_window_key(self):
+        key = self.window_key()
+
+        cache_orbital_positions(
+            make_orbit(
+                499,
+                "500@10",
+                1.5237,
+                [
+                    START_TIME.replace(year=2030) + timedelta(days=day)
+                    for day in range(3)
+                ],
+            )
+        )
+
+        self.assertEqual(self.window_key(), key)
+
+    def test_writing_a_month_of_the_window_changes_its_key(self):
+        key = self.window_key()
+
+        cache_orbital_positions(
+            make_orbit(499, "500@10", 1.5237, [START_TIME + timedelta(days=25)])
+        )
+
+        self.assertNotEqual(self.window_key(), key)
+
+
+@override_settings(HORIZONSAPI_PREFETCH=True)
+class PrefetchTests(SimpleTestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+
+    def test_concurrent_requests_are_all_recorded(self):
+        def record(orbital_body_id: int):
+            record_request(
+                str(orbital_body_id),
+                "500@10",
+                "1d",
+                START_TIME,
+                START_TIME + timedelta(days=1),
+            )
+
+        threads = [
+            threading.Thread(target=record, args=(orbital_body_id,))
+            for orbital_body_id in range(100, 150)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(
+            set(get_recent_requests()),
+            {
+                PrefetchTarget(str(orbital_body_id), "500@10", "1d")
+                for orbital_body_id in range(100, 150)
+            },
+        )
+
+    def test_the_latest_window_is_kept(self):
+        for day in range(3):
+            record_request(
+                "499",
+                "500@10",
+                "1h",
+                START_TIME + timedelta(days=day),
+                START_TIME + timedelta(days=day + 1),
+            )
+
+        recent_requests = get_recent_requests()
+
+        self.assertEqual(len(recent_requests), 1)
+        self.assertEqual(
+            recent_requests[PrefetchTarget("499", "500@10", "1h")].start_time,
+            START_TIME + timedelta(days=2),
+        )
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        create_orbital_body()
+        cache_orbital_positions(
+            make_orbit(
+                499,
+                "500@10",
+                1.524,
+                [START_TIME + timedelta(days=day) for day in range(10)],
+            ),
+            "1d",
+        )
+
+    def get_batch(self, orbital_body_ids: str):
+        return self.client.get(
+            "/horizonsapi/orbital_position/batch/",
+            {
+                "orbital_body_ids": orbital_body_ids,
+                "center": "500@10",
+                "start_time": "2023-01-01T00:00:00",
+                "stop_time": "2023-01-10T00:00:00",
+                "step": "1d",
+            },
+        )
+
+    def test_padded_and_repeated_ids_are_served_once_from_the_cache(self):
+        with mock.patch.object(views, "fetch_elements_data") as fetch_elements_data:
+            response = self.get_batch("0499, 499,499")
+
+        fetch_elements_data.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.count(b'"499"'), 1)
+        self.assertEqual(list(response.json()), ["499"])
+
+    def test_ids_must_be_whole_numbers(self):
+        response = self.get_batch("499,mars")
+
+        self.assertEqual(response.status_code, 400)
+
+
+class GapFetchTests(StubHorizonsTestCase):
+    params = {
+        "orbital_body_id": "499",
+        "center": "500@10",
+        "start_time": "2023-01-01T00:00:00",
+        "stop_time": "2023-03-01T00:00:00",
+        "step": "1d",
+        "format": "rows",
+    }
+
+    def setUp(self):
+        super().setUp()
+        create_orbital_body()
+        self.dates = [START_TIME + timedelta(days=day) for day in range(60)]
+        cached_days = [
+            day for day in range(60) if not (day in [10, 11, 15] or 30 <= day <= 44)
+        ]
+        cache_orbital_positions(
+            make_orbit(499, "500@10", 1.524, [self.dates[day] for day in cached_days]),
+            "1d",
+        )
+
+    def test_only_uncached_gaps_are_fetched(self):
+        with mock.patch.object(
+            views, "fetch_elements_data", wraps=views.fetch_elements_data
+        ) as fetch_elements_data:
+            response = self.client.get("/horizonsapi/orbital_position/", self.params)
+
+        self.assertEqual(response.status_code, 200)
+        # Days 10, 11 and 15 are within MAX_FETCH_GAP steps of each other, so they're fetched together.
+        self.assertEqual(
+            [call.args[2:4] for call in fetch_elements_data.call_args_list],
+            [
+                (self.dates[10], self.dates[15]),
+                (self.dates[30], self.dates[44]),
+            ],
+        )
+        self.assertEqual(
+            [row["time"] for row in response.json()],
+            [date.strftime("%Y-%m-%dT%H:%M:%SZ") for date in self.dates],
+        )
+
+    def test_fetched_gaps_are_served_from_the_cache_next_time(self):
+        self.client.get("/horizonsapi/orbital_position/", self.params)
+        get_shared_cache().clear()
+
+        with mock.patch.object(
+            views, "fetch_elements_data", side_effect=AssertionError
+        ):
+            response = self.client.get("/horizonsapi/orbital_position/", self.params)
+
+        self.assertEqual(len(response.json()), 60)
+
+    @mock.patch.object(views, "STREAM_FETCH_SIZE", 4)
+    def test_streaming_matches_the_whole_response_and_caches_each_batch(self):
+        # Streaming neither merges nearby gaps nor fetches a step past single day ones, so for the cached
+        # positions to be the same, the gaps are kept apart and day 16 is made part of day 15's gap.
+        OrbitalPosition.objects.filter(time=self.dates[16]).delete()
+        with mock.patch.object(views, "cache_orbital_positions"), mock.patch.object(
+            views, "MAX_FETCH_GAP", 1
+        ):
+            expected = self.client.get(
+                "/horizonsapi/orbital_position/", self.params
+            ).content
+
+        with mock.patch.object(
+            views, "cache_orbital_positions", wraps=views.cache_orbital_positions
+        ) as cache_orbital_positions:
+            response = self.client.get(
+                "/horizonsapi/orbital_position/", {**self.params, "stream": "true"}
+            )
+            content = b"".join(response.streaming_content)
+
+        self.assertEqual(content, expected)
+        # Each gap is fetched, and cached, at most STREAM_FETCH_SIZE positions at a time.
+        self.assertEqual(
+            [
+                [position.time for position in call.args[0]]
+                for call in cache_orbital_positions.call_args_list
+            ],
+            [
+                self.dates[10:12],
+                self.dates[15:17],
+                self.dates[30:34],
+                self.dates[34:38],
+                self.dates[38:42],
+                self.dates[42:45],
+            ],
+        )
+
+
+class IngestPositionsTests(StubHorizonsMixin, TransactionTestCase):
+    # The Horizons requests are made from worker threads, with their own database connections.
+
+    def setUp(self):
+        super().setUp()
+        # Finding out a new orbital body's ephemeris date range makes Horizons requests of its own.
+        discovery = mock.patch.object(views, "discover_ephemeris_date_range")
+        discovery.start()
+        self.addCleanup(discovery.stop)
+
+    def ingest(self, *args: str) -> str:
+        stdout = io.StringIO()
+        call_command(
+            "ingest_positions",
+            *args,
+            "--start-time=2023-01-01T00:00:00",
+            "--stop-time=2023-01-29T00:00:00",
+            "--chunk-size=10",
+            stdout=stdout,
+        )
+        return stdout.getvalue()
+
+    def cached_times(self, orbital_body_id: int) -> List[datetime]:
+        return list(
+            OrbitalPosition.objects.filter(
+                orbital_body_id=orbital_body_id, center="500@10"
+            )
+            .order_by("time")
+            .values_list("time", flat=True)
+        )
+
+    def test_every_chunk_is_fetched_and_cached_once(self):
+        with mock.patch.object(
+            views, "fetch_elements_data", wraps=views.fetch_elements_data
+        ) as fetch_elements_data:
+            output = self.ingest("499")
+
+        self.assertEqual(
+            self.cached_times(499),
+            [START_TIME + timedelta(days=day) for day in range(29)],
+        )
+        self.assertEqual(
+            [call.args[2:4] for call in fetch_elements_data.call_args_list],
+            [
+                (START_TIME, START_TIME + timedelta(days=9)),
+                (START_TIME + timedelta(days=10), START_TIME + timedelta(days=19)),
+                (START_TIME + timedelta(days=20), START_TIME + timedelta(days=28)),
+            ],
+        )
+        self.assertIn("Cached 29 orbital positions from 3 chunks", output)
+
+        with mock.patch.object(
+            views, "fetch_elements_data", side_effect=AssertionError
+        ):
+            output = self.ingest("499")
+
+        self.assertIn("skipped 3 chunks that were already cached", output)
+
+    def test_catalogue_entries_get_their_own_center_and_step(self):
+        with tempfile.TemporaryDirectory() as directory:
+            catalogue = os.path.join(directory, "catalogue.json")
+            with open(catalogue, "w") as catalogue_file:
+                json.dump(
+                    [
+                        {"horizonsId": "499", "timeStep": "10d"},
+                        {"horizonsId": "401", "parent": {"horizonsId": "499"}},
+                        {"name": "Sun"},
+                    ],
+                    catalogue_file,
+                )
+            self.ingest(f"--catalogue={catalogue}")
+
+        self.assertEqual(
+            self.cached_times(499),
+            [START_TIME + timedelta(days=day) for day in range(0, 29, 10)],
+        )
+        self.assertEqual(
+            OrbitalPosition.objects.filter(orbital_body_id=401, center="499").count(),
+            29,
+        )
+
+
+class ConditionalRequestTests(StubHorizonsTestCase):
+    def setUp(self):
+        super().setUp()
+        create_orbital_body()
+
+    def get_window(self, **headers):
+        return self.client.get(
+            "/horizonsapi/orbital_position/",
+            {
+                "orbital_body_id": "499",
+                "center": "500@10",
+                "start_time": "2023-01-01T00:00:00",
+                "stop_time": "2023-01-10T00:00:00",
+                "step": "1d",
+            },
+            **headers,
+        )
+
+    def test_past_windows_keep_their_etag_when_later_positions_are_cached(self):
+        self.get_window()
+        etag = self.get_window()["ETag"]
+
+        cache_orbital_positions(
+            make_orbit(
+                499,
+                "500@10",
+                1.5237,
+                [
+                    START_TIME.replace(year=2030) + timedelta(days=day)
+                    for day in range(3)
+                ],
+            )
+        )
+        response = self.get_window(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_etag_changes_when_the_window_is_written(self):
+        self.get_window()
+        etag = self.get_window()["ETag"]
+
+        cache_orbital_positions(
+            make_orbit(499, "500@10", 1.5237, [START_TIME + timedelta(days=2)])
+        )
+        response = self.get_window(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_complete_past_windows_are_reused_for_the_history_max_age(self):
+        response = self.get_window()
+
+        self.assertEqual(len(response.json()), 10)
+        self.assertEqual(get_max_age(response), settings.HORIZONSAPI_HISTORY_MAX_AGE)
+        self.assertIn("ETag", response)
+
+    @override_settings(HORIZONSAPI_NEGATIVE_CACHE_TTL=600)
+    def test_incomplete_windows_are_only_reused_for_the_negative_cache_ttl(self):
+        cache_orbital_positions(
+            make_orbit(
+                499,
+                "500@10",
+                1.5237,
+                [START_TIME + timedelta(days=day) for day in range(5)],
+            ),
+            "1d",
+        )
+        with mock.patch.object(
+            views,
+            "fetch_elements_data",
+            return_value="Target body name: Mars (499)\n$$SOE\n$$EOE\n",
+        ):
+            response = self.get_window()
+            self.assertEqual(len(response.json()), 5)
+            self.assertEqual(get_max_age(response), 600)
+            self.assertNotIn("ETag", response)
+
+            # It isn't kept in the response cache either, to be served as if it were complete.
+            response = self.get_window()
+            self.assertEqual(get_max_age(response), 600)
+
+
+class CompressionTests(StubHorizonsTestCase):
+    params = {
+        "orbital_body_id": "499",
+        "center": "500@10",
+        "start_time": "2023-01-01T00:00:00",
+        "stop_time": "2023-01-10T00:00:00",
+        "step": "1d",
+    }
+
+    def setUp(self):
+        super().setUp()
+        create_orbital_body()
+
+    def test_orbital_positions_are_compressed(self):
+        response = self.client.get(
+            "/horizonsapi/orbital_position/", self.params, HTTP_ACCEPT_ENCODING="gzip"
+        )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_pages_with_csrf_tokens_are_not_compressed(self):
+        response = self.client.get("/admin/login/", HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+class AsyncCompressionTests(TransactionTestCase):
+    # The async view reads the database from other threads, so the test can't run in a transaction.
+
+    def setUp(self):
+        get_shared_cache().clear()
+        create_orbital_body()
+        cache_orbital_positions(
+            make_orbit(
+                499,
+                "500@10",
+                1.5237,
+                [START_TIME + timedelta(days=day) for day in range(10)],
+            ),
+            "1d",
+        )
+
+    def test_async_orbital_positions_are_compressed(self):
+        response = asyncio.run(
+            AsyncClient().get(
+                "/horizonsapi/orbital_position/async/",
+                CompressionTests.params,
+                ACCEPT_ENCODING="gzip",
+            )
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+
+class StreamingTests(TestCase):
+    params = {
+        "orbital_body_id": "499",
+        "center": "500@10",
+        "start_time": "2023-01-01T00:00:00",
+        "stop_time": "2023-01-10T00:00:00",
+        "step": "1d",
+        "stream": "true",
+    }
+
+    def setUp(self):
+        get_shared_cache().clear()
+
+    def test_unknown_orbital_bodies_are_not_found_before_streaming(self):
+        with mock.patch.object(
+            views,
+            "fetch_elements_data",
+            return_value="No matches found.",
+        ):
+            response = self.client.get("/horizonsapi/orbital_position/", self.params)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_empty_gaps_are_remembered(self):
+        create_orbital_body()
+        with mock.patch.object(
+            views,
+            "fetch_elements_data",
+            return_value="Target body name: Mars (499)\n$$SOE\n$$EOE\n",
+        ) as fetch_elements_data:
+            for _ in range(2):
+                response = self.client.get(
+                    "/horizonsapi/orbital_position/", self.params
+                )
+                self.assertEqual(b"".join(response.streaming_content), b"[]")
+
+        self.assertEqual(fetch_elements_data.call_count, 1)
+
+
+class DiscoveryTests(TestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+
+    def wait_for_discovery(self):
+        views.BACKGROUND_METADATA_DISCOVERY.submit(lambda: None).result()
+
+    def test_failed_discovery_is_logged_and_tried_again_later(self):
+        OrbitalBody.objects.create(id=-999, name="Spacecraft")
+        with mock.patch.object(
+            views,
+            "get_ephemeris_date_range",
+            side_effect=HorizonsError(503, "Service unavailable"),
+        ) as get_ephemeris_date_range:
+            with self.assertLogs("horizonsapi.views", "WARNING"):
+                views.get_orbital_body("-999")
+                self.wait_for_discovery()
+            views.get_orbital_body("-999")
+            self.wait_for_discovery()
+            self.assertEqual(get_ephemeris_date_range.call_count, 1)
+
+            # Once HORIZONSAPI_NEGATIVE_CACHE_TTL has passed.
+            get_shared_cache().delete(discovery_key("-999"))
+            with self.assertLogs("horizonsapi.views", "WARNING"):
+                views.get_orbital_body("-999")
+                self.wait_for_discovery()
+            self.assertEqual(get_ephemeris_date_range.call_count, 2)
@@ -4,5 +4,8 @@ from . import views
 
 urlpatterns = [
     path('', views.index, name="index"),
-    path('orbital_position/', views.orbital_position, name="orbital_position")
+    path('orbital_position/', views.orbital_position, name="orbital_position"),
+    path('orbital_position/async/', views.orbital_position_async, name="orbital_position_async"),
+    path('orbital_position/batch/', views.orbital_position_batch, name="orbital_position_batch"),
+    path('response_cache_stats/', views.response_cache_stats, name="response_cache_stats"),
 ]
\ No newline at end of file
@@ -1,29 +1,132 @@
-from django.http.response import HttpResponseServerError
+from django.http.response import (
+    HttpResponseBadRequest,
+    HttpResponseBase,
+    HttpResponseNotFound,
+    HttpResponseNotModified,
+    HttpResponseServerError,
+)
 from django.shortcuts import render
-from django.http import HttpResponse
-from django.core import serializers
-from django.db import IntegrityError
-from django.db.models.query import QuerySet
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.gzip import GZipMiddleware
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import QuerySet
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.gzip import gzip_page
+from asgiref.sync import sync_to_async
 
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import wraps
+from itertools import chain, groupby
+import json
+import logging
 import pytz
-from typing import Generator, List, Tuple
-
-
-import urllib.request
+from typing import (
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+    TypeVar,
+    cast,
+)
 
+from .database import copy_orbital_positions, lock_for_writing, supports_copy
 from .date_utils import (
     parse_step,
     round_datetime_down,
     round_datetime_up,
     generate_date_range,
+    group_date_ranges,
+    step_timedelta,
+)
+
+from .coverage import find_bracketing_dates, find_covered_dates, record_coverage
+from .encoders import (
+    BINARY_FORMAT,
+    CONTENT_TYPES,
+    DEFAULT_FORMAT,
+    ENCODERS,
+    STREAM_ENCODERS,
+    encode_response,
+    time_array,
+)
+from .horizons import (
+    UNIX_EPOCH,
+    UnknownOrbitalBodyError,
+    fetch_elements_data,
+    parse_elements_table,
+)
+from .interpolation import get_tolerance, interpolate_positions
+from .iter_utils import batched
+from .lod import LevelOfDetail, detail_levels, select_samples
+from .metrics import METRICS_REGISTRY, increment, span
+from .models import (
+    UNBOUNDED_FIRST_EPHEMERIS_DATE,
+    UNBOUNDED_LAST_EPHEMERIS_DATE,
+    OrbitalPosition,
+    OrbitalBody,
+)
+from .prefetch import record_request
+from .response_cache import (
+    cache_detail_levels,
+    cache_response,
+    get_cached_detail_levels,
+    get_cached_response,
+    get_local_cache,
+    get_shared_cache,
+    invalidate_responses,
+    is_empty_range,
+    is_unknown_orbital_body,
+    make_response_key,
+    orbital_body_key,
+    remember_empty_range,
+    remember_unknown_orbital_body,
+    response_etag,
+    start_discovery,
+)
+from .storage import (
+    find_positions,
+    is_chunk_storage_enabled,
+    month_start,
+    write_positions,
 )
 
-from .models import OrbitalPosition, OrbitalPositionEncoder, OrbitalBody
 
+logger = logging.getLogger(__name__)
 
 DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
 
+# Missing dates that are at most this many steps apart are fetched with a single Horizons request,
+# since refetching a few cached positions is cheaper than another round trip.
+MAX_FETCH_GAP = 10
+
+# Number of orbital positions written per query when caching.
+# Keeps the time__in lookups under SQLite's limit on query parameters.
+CACHE_BATCH_SIZE = 500
+
+# Number of requested dates looked up per query when checking the cache.
+# Keeps the time__in lookups under SQLite's limit on query parameters.
+COVERAGE_BATCH_SIZE = 500
+
+# Maximum number of orbital positions fetched from Horizons per request when streaming.
+STREAM_FETCH_SIZE = 10000
+
+T = TypeVar("T")
+
+# Writes orbital positions to the cache off the request path, one batch at a time,
+# so that background writes never compete with each other for SQLite's write lock.
+BACKGROUND_CACHE_WRITER = ThreadPoolExecutor(max_workers=1)
+
+# Finds out the ephemeris date range of newly seen orbital bodies off the request path,
+# since it takes two more Horizons requests.
+BACKGROUND_METADATA_DISCOVERY = ThreadPoolExecutor(max_workers=1)
+
 
 class HttpResponseThen(HttpResponse):
     def __init__(self, data, then_callback, **kwargs):
@@ -35,189 +138,1037 @@ class HttpResponseThen(HttpResponse):
         self.then_callback()
 
 
+def gzip_async_page(view: Callable) -> Callable:
+    """Like gzip_page, for async views. Compressing runs in a thread, so it doesn't hold up the event loop."""
+    middleware = GZipMiddleware(view)
+
+    @wraps(view)
+    async def compressed_view(request, *args, **kwargs):
+        response = await view(request, *args, **kwargs)
+        return await asyncio.to_thread(middleware.process_response, request, response)
+
+    return compressed_view
+
+
 def index(request):
     return HttpResponse("Hello world!")
 
 
-def orbital_position(request) -> HttpResponseThen:
+# Only the orbital position views are compressed, not the whole site, since compressing pages with
+# CSRF tokens (like the admin's) would expose them to BREACH.
+@gzip_page
+def orbital_position(request) -> HttpResponseBase:
     orbital_body_id = request.GET.get("orbital_body_id", "")
     center = request.GET.get("center", "")
-    start_time = request.GET.get("start_time", "")
-    stop_time = request.GET.get("stop_time", "")
     step = request.GET.get("step", "")
+    response_format = get_response_format(request)
+    stream = request.GET.get("stream", "false") == "true"
+    interpolate = request.GET.get("interpolate", "false") == "true"
+    try:
+        level_of_detail = parse_level_of_detail(request)
+    except ValueError:
+        return HttpResponseBadRequest(
+            "max_points must be a whole number of at least 2, and tolerance a number of degrees above 0"
+        )
+
+    if response_format not in ENCODERS:
+        return HttpResponseBadRequest(f"Unknown format: {response_format}")
+    if stream and response_format not in STREAM_ENCODERS:
+        return HttpResponseBadRequest(f"The {response_format} format can't be streamed")
+    if stream and interpolate:
+        return HttpResponseBadRequest("Interpolated responses can't be streamed")
+    if level_of_detail is not None and (stream or interpolate):
+        return HttpResponseBadRequest(
+            "Thinned responses can't be streamed or interpolated"
+        )
+
+    (start_time, stop_time) = parse_time_range(request, step)
+    if is_unknown_orbital_body(orbital_body_id):
+        return HttpResponseNotFound(f"Unknown orbital body: {orbital_body_id}")
+    record_request(orbital_body_id, center, step, start_time, stop_time)
+
+    # Interpolated and thinned responses are cached separately from whole ones made only of Horizons data.
+    cached_format = response_format
+    if interpolate:
+        cached_format += "+interpolated"
+    if level_of_detail is not None:
+        cached_format += (
+            f"+lod:{level_of_detail.max_points}:{level_of_detail.tolerance}"
+        )
+    response_key = make_response_key(
+        orbital_body_id, center, start_time, stop_time, step, cached_format
+    )
+    if not stream:
+        etag = response_etag(response_key)
+        if is_not_modified(request, etag):
+            return add_caching_headers(HttpResponseNotModified(), etag, stop_time)
+        cached_response = get_cached_response(response_key)
+        if cached_response is not None:
+            return add_caching_headers(
+                HttpResponse(
+                    cached_response, content_type=CONTENT_TYPES[response_format]
+                ),
+                etag,
+                stop_time,
+            )
+
+    # Try to find this orbital body in our database.
+    orbital_body = get_orbital_body(orbital_body_id)
+
+    if stream:
+        try:
+            # Errors before the first position (like an orbital body Horizons doesn't know) get a proper
+            # response, rather than a truncated one once the status has been sent.
+            position_stream = start_streaming(
+                stream_orbital_positions(
+                    orbital_body, orbital_body_id, center, start_time, stop_time, step
+                )
+            )
+        except UnknownOrbitalBodyError as error:
+            return HttpResponseNotFound(str(error))
+        return StreamingHttpResponse(
+            STREAM_ENCODERS[response_format](position_stream),
+            content_type="application/json",
+        )
+
+    (skip, interval) = parse_step(step)
+    requested_dates = list(
+        clamp_to_ephemeris(
+            orbital_body, generate_date_range(start_time, stop_time, interval, skip)
+        )
+    )
+    cached_levels = None
+    if level_of_detail is not None:
+        # If the window has been thinned before, only the positions that are kept need loading.
+        cached_levels = get_cached_detail_levels(response_key)
+        if cached_levels is not None:
+            (times, levels) = cached_levels
+            requested_dates = [
+                UNIX_EPOCH + timedelta(seconds=int(timestamp))
+                for timestamp in times[select_samples(levels, level_of_detail)]
+            ]
+    if interpolate:
+        (cached_positions, missing_dates) = find_interpolated_positions(
+            orbital_body,
+            orbital_body_id,
+            center,
+            start_time,
+            stop_time,
+            requested_dates,
+        )
+    else:
+        (cached_positions, missing_dates) = find_cached_positions(
+            orbital_body,
+            orbital_body_id,
+            center,
+            start_time,
+            stop_time,
+            requested_dates,
+        )
+    try:
+        fetched_positions = fetch_missing_positions(
+            orbital_body, orbital_body_id, center, missing_dates, step
+        )
+    except UnknownOrbitalBodyError as error:
+        return HttpResponseNotFound(str(error))
+    orbital_positions = splice_positions(
+        requested_dates, cached_positions, fetched_positions
+    )
+    complete = len(orbital_positions) == len(requested_dates)
+    if level_of_detail is not None and cached_levels is None:
+        with span("lod"):
+            levels = detail_levels(orbital_positions)
+        if len(fetched_positions) == 0:
+            cache_detail_levels(response_key, time_array(orbital_positions), levels)
+        orbital_positions = [
+            orbital_positions[index]
+            for index in select_samples(levels, level_of_detail)
+        ]
+
+    def response_callback():
+        if len(fetched_positions) > 0:
+            cache_orbital_positions(fetched_positions, step)
+
+    serialized_data = serialize(response_format, orbital_positions)
+    increment("horizonsapi_positions_served_total", len(orbital_positions))
+    if len(fetched_positions) == 0 and complete:
+        cache_response(response_key, serialized_data)
+    return add_caching_headers(
+        HttpResponseThen(
+            serialized_data,
+            response_callback,
+            content_type=CONTENT_TYPES[response_format],
+        ),
+        etag,
+        stop_time,
+        complete,
+    )
+
+
+@gzip_async_page
+async def orbital_position_async(request) -> HttpResponse:
+    """
+    Like orbital_position, but doesn't tie up a worker thread while waiting for Horizons when served over ASGI.
+    Gaps are fetched concurrently and the new positions are cached in the background.
+    """
+    orbital_body_id = request.GET.get("orbital_body_id", "")
+    center = request.GET.get("center", "")
+    step = request.GET.get("step", "")
+    response_format = get_response_format(request)
+
+    if response_format not in ENCODERS:
+        return HttpResponseBadRequest(f"Unknown format: {response_format}")
+
+    (start_time, stop_time) = parse_time_range(request, step)
+    if await sync_to_async(is_unknown_orbital_body)(orbital_body_id):
+        return HttpResponseNotFound(f"Unknown orbital body: {orbital_body_id}")
+    await sync_to_async(record_request)(
+        orbital_body_id, center, step, start_time, stop_time
+    )
+
+    response_key = await sync_to_async(make_response_key)(
+        orbital_body_id, center, start_time, stop_time, step, response_format
+    )
+    etag = response_etag(response_key)
+    if is_not_modified(request, etag):
+        return add_caching_headers(HttpResponseNotModified(), etag, stop_time)
+    cached_response = await sync_to_async(get_cached_response)(response_key)
+    if cached_response is not None:
+        return add_caching_headers(
+            HttpResponse(cached_response, content_type=CONTENT_TYPES[response_format]),
+            etag,
+            stop_time,
+        )
+
+    orbital_body = await sync_to_async(get_orbital_body)(orbital_body_id)
+
+    (skip, interval) = parse_step(step)
+    requested_dates = list(
+        clamp_to_ephemeris(
+            orbital_body, generate_date_range(start_time, stop_time, interval, skip)
+        )
+    )
+    (cached_positions, missing_dates) = await sync_to_async(find_cached_positions)(
+        orbital_body, orbital_body_id, center, start_time, stop_time, requested_dates
+    )
+    try:
+        fetched_positions = await fetch_missing_positions_async(
+            orbital_body, orbital_body_id, center, missing_dates, step
+        )
+    except UnknownOrbitalBodyError as error:
+        return HttpResponseNotFound(str(error))
+    orbital_positions = splice_positions(
+        requested_dates, cached_positions, fetched_positions
+    )
+    complete = len(orbital_positions) == len(requested_dates)
+
+    # Serializing a large response takes long enough to hold up every other request on the event loop.
+    serialized_data = await asyncio.to_thread(
+        serialize, response_format, orbital_positions
+    )
+    increment("horizonsapi_positions_served_total", len(orbital_positions))
+    if len(fetched_positions) > 0:
+        cache_in_background(fetched_positions, step)
+    elif complete:
+        await sync_to_async(cache_response)(response_key, serialized_data)
+    return add_caching_headers(
+        HttpResponse(serialized_data, content_type=CONTENT_TYPES[response_format]),
+        etag,
+        stop_time,
+        complete,
+    )
+
+
+def response_cache_stats(request) -> JsonResponse:
+    """Hit, miss and eviction counts of the in-process response cache, for sizing it."""
+    return JsonResponse(get_local_cache().stats())
+
+
+def metrics(request) -> HttpResponse:
+    """Timings and counters of this process, in the Prometheus text format."""
+    return HttpResponse(
+        METRICS_REGISTRY.render(), content_type="text/plain; version=0.0.4"
+    )
+
+
+@gzip_page
+def orbital_position_batch(request) -> HttpResponse:
+    """
+    Like orbital_position, but for several orbital bodies at once, given as a comma separated
+    orbital_body_ids parameter. Responds with an object mapping each ID (without leading zeros,
+    and only once however many times it's given) to its orbital positions.
+    """
+    requested_ids = request.GET.get("orbital_body_ids", "").split(",")
+    try:
+        # Normalized like the IDs of the cached orbital bodies, so that "0499" finds 499's positions,
+        # and each orbital body is only looked up, fetched and serialized once.
+        orbital_body_ids = list(
+            dict.fromkeys(
+                str(int(orbital_body_id))
+                for orbital_body_id in requested_ids
+                if orbital_body_id.strip() != ""
+            )
+        )
+    except ValueError:
+        return HttpResponseBadRequest("orbital_body_ids must be whole numbers")
+    center = request.GET.get("center", "")
+    step = request.GET.get("step", "")
+    response_format = request.GET.get("format", DEFAULT_FORMAT)
+
+    if response_format not in ENCODERS:
+        return HttpResponseBadRequest(f"Unknown format: {response_format}")
+    if CONTENT_TYPES[response_format] != "application/json":
+        # Every orbital body's positions are embedded in one JSON object.
+        return HttpResponseBadRequest(
+            f"The {response_format} format isn't available for batches"
+        )
+
+    (start_time, stop_time) = parse_time_range(request, step)
+    for orbital_body_id in orbital_body_ids:
+        record_request(orbital_body_id, center, step, start_time, stop_time)
+    (skip, interval) = parse_step(step)
+    requested_dates = list(generate_date_range(start_time, stop_time, interval, skip))
+
+    orbital_bodies = OrbitalBody.objects.in_bulk(
+        [int(orbital_body_id) for orbital_body_id in orbital_body_ids]
+    )
+    cached_positions_by_body = dict()
+    missing_dates_by_body = dict()
+    for orbital_body_id, cached_positions, missing_dates in check_cached_bodies(
+        orbital_bodies, center, start_time, stop_time, requested_dates
+    ):
+        cached_positions_by_body[orbital_body_id] = cached_positions
+        missing_dates_by_body[orbital_body_id] = missing_dates
+
+    # Fetch whatever isn't cached from Horizons, for all the orbital bodies at once,
+    # except dates outside their ephemerides and orbital bodies Horizons doesn't know.
+    for orbital_body_id in orbital_body_ids:
+        missing_dates_by_body[orbital_body_id] = list(
+            clamp_to_ephemeris(
+                orbital_bodies.get(int(orbital_body_id)),
+                missing_dates_by_body.get(orbital_body_id, requested_dates),
+            )
+        )
+    uncached_body_ids = [
+        orbital_body_id
+        for orbital_body_id in orbital_body_ids
+        if len(missing_dates_by_body[orbital_body_id]) > 0
+        and not is_unknown_orbital_body(orbital_body_id)
+    ]
+    fetched_positions_by_body = dict()
+    with ThreadPoolExecutor(max_workers=settings.HORIZONS_MAX_CONNECTIONS) as executor:
+        fetches = {
+            orbital_body_id: executor.submit(
+                with_own_connection(fetch_missing_positions),
+                orbital_bodies.get(int(orbital_body_id)),
+                orbital_body_id,
+                center,
+                missing_dates_by_body[orbital_body_id],
+                step,
+            )
+            for orbital_body_id in uncached_body_ids
+        }
+        for orbital_body_id, fetch in fetches.items():
+            try:
+                fetched_positions_by_body[orbital_body_id] = fetch.result()
+            except UnknownOrbitalBodyError:
+                # It gets no positions, like dates Horizons has no data for.
+                pass
+
+    # Only the JSON formats, which encode to str, are available for batches.
+    encode = cast(Callable[[List[OrbitalPosition]], str], ENCODERS[response_format])
+    serialized_bodies = list()
+    for orbital_body_id in orbital_body_ids:
+        orbital_positions = splice_positions(
+            requested_dates,
+            cached_positions_by_body.get(orbital_body_id, list()),
+            fetched_positions_by_body.get(orbital_body_id, list()),
+        )
+        with span("serialize"):
+            serialized_bodies.append(
+                f"{json.dumps(orbital_body_id)}:{encode(orbital_positions)}"
+            )
+        increment("horizonsapi_positions_served_total", len(orbital_positions))
+
+    def response_callback():
+        fetched_positions = [
+            position
+            for positions in fetched_positions_by_body.values()
+            for position in positions
+        ]
+        if len(fetched_positions) > 0:
+            cache_orbital_positions(fetched_positions, step)
+
+    serialized_data = "{" + ",".join(serialized_bodies) + "}"
+    return HttpResponseThen(
+        serialized_data, response_callback, content_type="application/json"
+    )
+
+
+def serialize(response_format: str, orbital_positions: List[OrbitalPosition]) -> bytes:
+    with span("serialize"):
+        return encode_response(response_format, orbital_positions)
+
+
+def get_response_format(request) -> str:
+    """The format parameter, or the bin format for clients that ask for application/octet-stream."""
+    response_format = request.GET.get("format")
+    if response_format is not None:
+        return response_format
+    if "application/octet-stream" in request.headers.get("Accept", ""):
+        return BINARY_FORMAT
+    return DEFAULT_FORMAT
+
+
+def parse_level_of_detail(request) -> LevelOfDetail | None:
+    """
+    Reads the max_points and tolerance (degrees) parameters, which ask for the positions to be thinned out.
+    Raises ValueError if they aren't valid.
+    """
+    max_points = request.GET.get("max_points")
+    tolerance = request.GET.get("tolerance")
+    if max_points is None and tolerance is None:
+        return None
+
+    level_of_detail = LevelOfDetail(
+        int(max_points) if max_points is not None else None,
+        float(tolerance) if tolerance is not None else None,
+    )
+    if level_of_detail.max_points is not None and level_of_detail.max_points < 2:
+        raise ValueError("max_points must be at least 2")
+    if level_of_detail.tolerance is not None and not level_of_detail.tolerance > 0:
+        raise ValueError("tolerance must be above 0")
+    return level_of_detail
+
+
+def is_not_modified(request, etag: str) -> bool:
+    """Whether the client's If-None-Match header already has this ETag, so that a 304 will do."""
+    client_etags = parse_etags(request.headers.get("If-None-Match", ""))
+    # gzip_page sends weak versions of the ETags, which match just as well here.
+    return "*" in client_etags or etag in [
+        client_etag.removeprefix("W/") for client_etag in client_etags
+    ]
 
+
+def add_caching_headers(
+    response: HttpResponse, etag: str, stop_time: datetime, complete: bool = True
+) -> HttpResponse:
+    """
+    Positions in the past don't change, so responses for windows that have ended can be reused
+    for HORIZONSAPI_HISTORY_MAX_AGE. Others have to be revalidated against the ETag.
+    Incomplete responses, missing positions that Horizons didn't have this time, are only reused for
+    HORIZONSAPI_NEGATIVE_CACHE_TTL, after which asking Horizons again may fill them in. They get no ETag,
+    since it only identifies the window, and revalidating against it would keep the incomplete copy.
+    """
+    if complete:
+        response["ETag"] = etag
+    if stop_time < datetime.now(pytz.utc):
+        max_age = settings.HORIZONSAPI_HISTORY_MAX_AGE
+        if not complete:
+            max_age = min(max_age, settings.HORIZONSAPI_NEGATIVE_CACHE_TTL)
+        patch_cache_control(response, public=True, max_age=max_age)
+    else:
+        patch_cache_control(response, no_cache=True)
+    # The format depends on the Accept header when there's no format parameter.
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+def parse_time_range(request, step: str) -> Tuple[datetime, datetime]:
+    """Reads the start_time and stop_time parameters, rounded outwards to the step interval."""
     (skip, interval) = parse_step(step)
+    start_time = request.GET.get("start_time", "")
+    stop_time = request.GET.get("stop_time", "")
 
     start_time = pytz.utc.localize(datetime.strptime(start_time, DATE_FORMAT))
     stop_time = pytz.utc.localize(datetime.strptime(stop_time, DATE_FORMAT))
     start_time = round_datetime_down(start_time, interval)
     stop_time = round_datetime_up(stop_time, interval)
+    return (start_time, stop_time)
 
-    orbital_body = None
-    cache_miss = False
-    orbital_positions = list()
-    try:
-        # Try to find this orbital body in our database.
-        orbital_body = OrbitalBody.objects.get(id=orbital_body_id)
 
-        # Try to find all the requested orbital position data in our database.
-        cached_positions = OrbitalPosition.objects.filter(
-            orbital_body_id=orbital_body_id, time__range=[start_time, stop_time]
-        ).order_by("time")
+def check_cached_bodies(
+    orbital_bodies: Dict[int, OrbitalBody],
+    center: str,
+    start_time: datetime,
+    stop_time: datetime,
+    requested_dates: List[datetime],
+) -> Generator[Tuple[str, List[OrbitalPosition], List[datetime]], None, None]:
+    """
+    Checks the cache for several orbital bodies, looking up the dates their recorded coverage covers
+    with a single query. Yields each orbital body ID with its cached positions and missing dates.
+    """
+    if is_chunk_storage_enabled():
+        for orbital_body_id, orbital_body in orbital_bodies.items():
+            yield (
+                str(orbital_body_id),
+                *find_cached_positions(
+                    orbital_body,
+                    str(orbital_body_id),
+                    center,
+                    start_time,
+                    stop_time,
+                    requested_dates,
+                ),
+            )
+        return
+
+    with span("coverage"):
+        covered_dates_by_body = {
+            orbital_body_id: set(
+                find_covered_dates(str(orbital_body_id), center, requested_dates)[0]
+            )
+            for orbital_body_id in orbital_bodies.keys()
+        }
+    covered_dates = sorted(set().union(*covered_dates_by_body.values()))
+    cached_query = OrbitalPosition.objects.filter(
+        orbital_body_id__in=orbital_bodies.keys(), center=center
+    )
+    cached_positions_by_body: Dict[int, Dict[datetime, OrbitalPosition]] = {
+        orbital_body_id: dict() for orbital_body_id in orbital_bodies.keys()
+    }
+    with span("db"):
+        for batch in batched(covered_dates, COVERAGE_BATCH_SIZE):
+            for cached_position in cached_query.filter(time__in=batch):
+                cached_positions_by_body[cached_position.orbital_body_id][
+                    cached_position.time
+                ] = cached_position
+
+    for orbital_body_id, cached_positions in cached_positions_by_body.items():
+        covered = covered_dates_by_body[orbital_body_id]
+        cached: List[OrbitalPosition] = list()
+        missing_dates: List[datetime] = list()
+        for requested_date in requested_dates:
+            position = None
+            if requested_date in covered:
+                position = cached_positions.get(requested_date)
+            if position is None:
+                missing_dates.append(requested_date)
+            else:
+                cached.append(position)
+        increment("horizonsapi_positions_cached_total", len(cached))
+        increment("horizonsapi_positions_missing_total", len(missing_dates))
+        yield (str(orbital_body_id), cached, missing_dates)
 
-        requested_date_range = generate_date_range(
-            start_time, stop_time, interval, skip
+
+def get_orbital_body(orbital_body_id: str) -> OrbitalBody | None:
+    """
+    The orbital body, if we know it. If we still don't know its ephemeris date range,
+    finding it out is tried again (at most every HORIZONSAPI_NEGATIVE_CACHE_TTL seconds).
+    """
+    cache_key = orbital_body_key(orbital_body_id.strip())
+    orbital_body = get_shared_cache().get(cache_key)
+    if orbital_body is None:
+        try:
+            orbital_body = OrbitalBody.objects.get(id=orbital_body_id)
+        except OrbitalBody.DoesNotExist:
+            return None
+        get_shared_cache().set(cache_key, orbital_body)
+    if is_unbounded(orbital_body):
+        discover_ephemeris_date_range(orbital_body_id)
+    return orbital_body
+
+
+def is_unbounded(orbital_body: OrbitalBody) -> bool:
+    """Whether the orbital body still has the default ephemeris date range, which every date is within."""
+    return (
+        orbital_body.first_ephemeris_date == UNBOUNDED_FIRST_EPHEMERIS_DATE
+        and orbital_body.last_ephemeris_date == UNBOUNDED_LAST_EPHEMERIS_DATE
+    )
+
+
+def find_cached_positions(
+    orbital_body: OrbitalBody | None,
+    orbital_body_id: str,
+    center: str,
+    start_time: datetime,
+    stop_time: datetime,
+    requested_dates: List[datetime],
+) -> Tuple[List[OrbitalPosition], List[datetime]]:
+    """
+    Looks up the requested dates in whichever storage is enabled.
+    Returns the cached positions that were found and the dates that weren't.
+    """
+    cached_positions: List[OrbitalPosition] = list()
+    missing_dates = requested_dates
+    # If the orbital body doesn't exist, then we must not have any orbital position data for it yet.
+    if orbital_body is not None:
+        # Only look in the cache for dates that a recorded fetch has covered.
+        with span("coverage"):
+            (covered_dates, uncovered_dates) = find_covered_dates(
+                orbital_body_id, center, requested_dates
+            )
+        if len(covered_dates) > 0:
+            with span("db"):
+                (cached_positions, missing_dates) = lookup_cached_positions(
+                    orbital_body_id, center, covered_dates
+                )
+            if len(uncovered_dates) > 0:
+                missing_dates = sorted(missing_dates + uncovered_dates)
+
+    increment("horizonsapi_positions_cached_total", len(cached_positions))
+    increment("horizonsapi_positions_missing_total", len(missing_dates))
+    return (cached_positions, missing_dates)
+
+
+def find_interpolated_positions(
+    orbital_body: OrbitalBody | None,
+    orbital_body_id: str,
+    center: str,
+    start_time: datetime,
+    stop_time: datetime,
+    requested_dates: List[datetime],
+) -> Tuple[List[OrbitalPosition], List[datetime]]:
+    """
+    Like find_cached_positions, but serves requested dates between cached positions by interpolating,
+    wherever the cached positions are dense enough for the orbital body's tolerance.
+    """
+    if orbital_body is None or len(requested_dates) == 0:
+        return (list(), requested_dates)
+
+    # Only the cached positions on either side of each requested date are loaded, not the whole range.
+    with span("coverage"):
+        sample_dates = find_bracketing_dates(orbital_body_id, center, requested_dates)
+    with span("db"):
+        (samples, _) = lookup_cached_positions(orbital_body_id, center, sample_dates)
+    with span("interpolate"):
+        (positions, missing_dates) = interpolate_positions(
+            samples, requested_dates, get_tolerance(orbital_body_id)
         )
 
-        cache_result = check_cached_positions(requested_date_range, cached_positions)
-        if cache_result is None:
-            cache_miss = True
-        else:
-            orbital_positions = cache_result
+    increment("horizonsapi_positions_cached_total", len(positions))
+    increment("horizonsapi_positions_missing_total", len(missing_dates))
+    return (positions, missing_dates)
+
+
+def lookup_cached_positions(
+    orbital_body_id: str, center: str, requested_dates: List[datetime]
+) -> Tuple[List[OrbitalPosition], List[datetime]]:
+    if is_chunk_storage_enabled():
+        return find_positions(orbital_body_id, center, requested_dates)
+
+    cached_query = OrbitalPosition.objects.filter(
+        orbital_body_id=orbital_body_id, center=center
+    )
+    return check_cached_positions(requested_dates, cached_query)
+
+
+def clamp_to_ephemeris(
+    orbital_body: OrbitalBody | None, dates: Iterable[datetime]
+) -> Iterable[datetime]:
+    """The dates within the orbital body's ephemeris date range, since Horizons has no data for the others."""
+    if orbital_body is None:
+        return dates
+    first_date = orbital_body.first_ephemeris_date
+    last_date = orbital_body.last_ephemeris_date
+    return (date for date in dates if first_date <= date <= last_date)
+
+
+def find_missing_dates(
+    orbital_body: OrbitalBody | None,
+    orbital_body_id: str,
+    center: str,
+    start_time: datetime,
+    stop_time: datetime,
+    step: str,
+) -> List[datetime]:
+    """
+    The dates from start_time to stop_time that aren't cached yet, for filling the cache ahead of requests.
+    Dates outside the orbital body's ephemeris date range are left out.
+    """
+    (skip, interval) = parse_step(step)
+    requested_dates = list(
+        clamp_to_ephemeris(
+            orbital_body, generate_date_range(start_time, stop_time, interval, skip)
+        )
+    )
+    if len(requested_dates) == 0:
+        return list()
+
+    (_, missing_dates) = find_cached_positions(
+        orbital_body, orbital_body_id, center, start_time, stop_time, requested_dates
+    )
+    return missing_dates
+
+
+def fetch_missing_positions(
+    orbital_body: OrbitalBody | None,
+    orbital_body_id: str,
+    center: str,
+    missing_dates: List[datetime],
+    step: str,
+) -> List[OrbitalPosition]:
+    """
+    Fetches the missing dates from Horizons, creating the orbital body first if we don't know it yet.
+    Nearby missing dates are grouped so that as few requests as possible are made, and gaps that
+    Horizons recently had no positions for are skipped.
+    Raises UnknownOrbitalBodyError if Horizons doesn't know the orbital body.
+    """
+    gaps = plan_fetches(orbital_body_id, center, missing_dates, step)
+    # Fetched one at a time, so that nothing more is fetched once the first shows the orbital body is unknown.
+    results = (
+        fetch_elements_data(orbital_body_id, center, gap_start, gap_stop, step)
+        for gap_start, gap_stop in gaps
+    )
+    return parse_fetched_gaps(
+        orbital_body, orbital_body_id, center, step, gaps, results
+    )
+
+
+async def fetch_missing_positions_async(
+    orbital_body: OrbitalBody | None,
+    orbital_body_id: str,
+    center: str,
+    missing_dates: List[datetime],
+    step: str,
+) -> List[OrbitalPosition]:
+    """Like fetch_missing_positions, but fetches all the gaps concurrently."""
+    gaps = await sync_to_async(plan_fetches)(
+        orbital_body_id, center, missing_dates, step
+    )
+    if len(gaps) == 0:
+        return list()
+
+    results = await asyncio.gather(
+        *[
+            asyncio.to_thread(
+                fetch_elements_data, orbital_body_id, center, gap_start, gap_stop, step
+            )
+            for gap_start, gap_stop in gaps
+        ]
+    )
+    return await sync_to_async(parse_fetched_gaps)(
+        orbital_body, orbital_body_id, center, step, gaps, results
+    )
 
-    except OrbitalBody.DoesNotExist:
-        # If the orbital body doesn't exist, then we must not have any orbital position data for it yet.
-        cache_miss = True
 
-    if cache_miss:
-        result = fetch_elements_data(
-            orbital_body_id, center, start_time, stop_time, step
+def plan_fetches(
+    orbital_body_id: str, center: str, missing_dates: List[datetime], step: str
+) -> List[Tuple[datetime, datetime]]:
+    """
+    The ranges to fetch from Horizons for the missing dates: nearby dates grouped together,
+    leaving out ranges that Horizons recently had no positions for.
+    """
+    (skip, interval) = parse_step(step)
+    gaps = [
+        fetch_range(gap_start, gap_stop, interval, skip)
+        for gap_start, gap_stop in group_date_ranges(
+            missing_dates, interval, skip, MAX_FETCH_GAP
         )
+    ]
+    return [
+        (gap_start, gap_stop)
+        for gap_start, gap_stop in gaps
+        if not is_empty_range(orbital_body_id, center, gap_start, gap_stop, step)
+    ]
 
+
+def fetch_range(
+    gap_start: datetime, gap_stop: datetime, interval: str, skip: int
+) -> Tuple[datetime, datetime]:
+    """The range to ask Horizons for to get the dates from gap_start to gap_stop."""
+    # Horizons needs the stop time to be after the start time.
+    return (gap_start, max(gap_stop, gap_start + step_timedelta(interval, skip)))
+
+
+def parse_fetched_gaps(
+    orbital_body: OrbitalBody | None,
+    orbital_body_id: str,
+    center: str,
+    step: str,
+    gaps: List[Tuple[datetime, datetime]],
+    results: Iterable[str],
+) -> List[OrbitalPosition]:
+    """
+    Parses the Horizons responses for the gaps, creating the orbital body from the first one if we don't
+    know it yet, and remembers the gaps that Horizons had no positions for.
+    Raises UnknownOrbitalBodyError if Horizons doesn't know the orbital body.
+    """
+    fetched_positions: List[OrbitalPosition] = list()
+    for (gap_start, gap_stop), result in zip(gaps, results):
         if orbital_body is None:
-            create_orbital_body(orbital_body_id, result)
+            orbital_body = create_orbital_body(orbital_body_id, result)
 
-        orbital_positions = parse_elements_data(result, orbital_body_id, center)
+        positions = parse_elements_data(result, orbital_body_id, center)
+        if len(positions) == 0:
+            remember_empty_range(orbital_body_id, center, gap_start, gap_stop, step)
+        fetched_positions += positions
+    return fetched_positions
 
-    def response_callback():
-        if cache_miss:
-            cache_orbital_positions(orbital_positions)
 
-    serialized_data = serializers.serialize(
-        "json", orbital_positions, cls=OrbitalPositionEncoder
+def cache_in_background(orbital_positions: List[OrbitalPosition], step: str) -> None:
+    """Caches orbital positions after the response has been sent, one batch at a time."""
+    BACKGROUND_CACHE_WRITER.submit(
+        with_own_connection(cache_orbital_positions), orbital_positions, step
     )
-    return HttpResponseThen(serialized_data, response_callback)
 
 
-def cache_orbital_positions(orbital_positions: List[OrbitalPosition]) -> None:
+def with_own_connection(function: Callable[..., T]) -> Callable[..., T]:
+    """Wraps a function to run in a worker thread, closing the database connection it opened afterwards."""
+
+    @wraps(function)
+    def run(*args):
+        try:
+            return function(*args)
+        finally:
+            connections.close_all()
+
+    return run
+
+
+def cache_orbital_positions(
+    orbital_positions: List[OrbitalPosition], step: str | None = None
+) -> Tuple[int, int]:
+    """
+    Upserts orbital positions inside a single transaction, with COPY on PostgreSQL and in batches elsewhere.
+    Positions we already have are overwritten, since the Horizons system may have more up-to-date data.
+    If the step they were fetched with is given, the range they cover is recorded too.
+    Returns the number of inserted and updated positions.
+    """
+    with span("cache_write"):
+        with transaction.atomic():
+            if supports_copy():
+                (insert_count, update_count) = copy_orbital_positions(orbital_positions)
+            else:
+                lock_for_writing()
+                (insert_count, update_count) = replace_orbital_positions(
+                    orbital_positions
+                )
+            if is_chunk_storage_enabled():
+                write_positions(orbital_positions)
+            if step is not None:
+                record_coverage(orbital_positions, step)
+        invalidate_cached_responses(orbital_positions)
+    increment("horizonsapi_positions_written_total", insert_count, operation="insert")
+    increment("horizonsapi_positions_written_total", update_count, operation="update")
+    return (insert_count, update_count)
+
+
+def replace_orbital_positions(
+    orbital_positions: List[OrbitalPosition],
+) -> Tuple[int, int]:
+    """Upserts orbital positions CACHE_BATCH_SIZE at a time. Returns the number of inserted and updated positions."""
     insert_count = 0
     update_count = 0
-    for new_position in orbital_positions:
-        try:
-            new_position.save()
-            insert_count += 1
-        except IntegrityError:
-            # We already have data for this orbital position in the database.
-            # The Horizons system may have more up-to-date data though.
-            OrbitalPosition.objects.filter(
-                orbital_body_id=new_position.orbital_body_id,
-                center=new_position.center,
-                time=new_position.time,
-            ).update(
-                eccentricity=new_position.eccentricity,
-                inclination=new_position.inclination,
-                longitude_of_ascending_node=new_position.longitude_of_ascending_node,
-                longitude_of_periapsis=new_position.longitude_of_periapsis,
-                mean_longitude=new_position.mean_longitude,
-                semimajor_axis=new_position.semimajor_axis,
-            )
-            update_count += 1
-    print(f"Updated {update_count} and inserted {insert_count}")
+    for batch_start in range(0, len(orbital_positions), CACHE_BATCH_SIZE):
+        batch = orbital_positions[batch_start : batch_start + CACHE_BATCH_SIZE]
+        (new_positions, existing_positions) = split_existing_positions(batch)
+        # Django 4.0's bulk_create can't update on conflict, and bulk_update builds a huge CASE
+        # expression per field. Replacing the existing rows (keeping their primary keys) is much faster.
+        OrbitalPosition.objects.filter(
+            id__in=[position.id for position in existing_positions]
+        ).delete()
+        OrbitalPosition.objects.bulk_create(new_positions + existing_positions)
+        insert_count += len(new_positions)
+        update_count += len(existing_positions)
+    return (insert_count, update_count)
+
+
+def invalidate_cached_responses(orbital_positions: List[OrbitalPosition]) -> None:
+    """
+    Drops the cached responses that overlap the months of the given orbital positions, since they may be
+    out of date. Months in between that no position was written in are left alone.
+    """
+    time_ranges: Dict[Tuple[str, str, datetime], Tuple[datetime, datetime]] = dict()
+    for position in orbital_positions:
+        key = (
+            str(position.orbital_body_id),
+            position.center,
+            month_start(position.time),
+        )
+        (start_time, stop_time) = time_ranges.get(key, (position.time, position.time))
+        time_ranges[key] = (
+            min(start_time, position.time),
+            max(stop_time, position.time),
+        )
+
+    for (orbital_body_id, center, _), (start_time, stop_time) in time_ranges.items():
+        invalidate_responses(orbital_body_id, center, start_time, stop_time)
+
+
+def split_existing_positions(
+    orbital_positions: List[OrbitalPosition],
+) -> Tuple[List[OrbitalPosition], List[OrbitalPosition]]:
+    """
+    Splits orbital positions into ones that are new and ones that are already in the database,
+    matching on the unique_orbital_position constraint. Existing positions get their primary key filled in.
+    """
+    positions_by_key: Dict[Tuple[int, str], Dict[datetime, OrbitalPosition]] = dict()
+    for position in orbital_positions:
+        key = (position.orbital_body_id, position.center)
+        positions_by_key.setdefault(key, dict())[position.time] = position
+
+    existing_positions = list()
+    for (orbital_body_id, center), positions_by_time in positions_by_key.items():
+        existing_rows = OrbitalPosition.objects.filter(
+            orbital_body_id=orbital_body_id,
+            center=center,
+            time__in=list(positions_by_time.keys()),
+        ).values_list("time", "id")
+        for time, id in existing_rows:
+            position = positions_by_time.pop(time)
+            position.id = id
+            existing_positions.append(position)
+
+    new_positions = [
+        position
+        for positions_by_time in positions_by_key.values()
+        for position in positions_by_time.values()
+    ]
+    return (new_positions, existing_positions)
 
 
 def check_cached_positions(
-    requested_time_range: Generator[datetime, None, None],
-    cached_orbital_positions: QuerySet[OrbitalPosition],
-) -> List[OrbitalPosition] | None:
+    requested_dates: List[datetime],
+    cached_query: QuerySet[OrbitalPosition],
+) -> Tuple[List[OrbitalPosition], List[datetime]]:
+    """
+    Looks up the requested dates in the cached orbital positions.
+    Returns the cached positions that were found and the dates that weren't.
+    """
     requested_orbital_positions = list()
-    cache_index = 0
-    for requested_date in requested_time_range:
-        is_date_cached = False
-        # Look through the query result for an orbital position with this date.
-        # The query result may have more granular data than requested,
-        # for example a position every minute when we want every hour.
-        # So we have to keep looping through until we find the desired date.
-        # This is possible because cached_positions is ordered by time.
-        while True:
-            if cache_index > len(cached_orbital_positions) - 1:
-                # We've reached the end of the query result set
-                break
-            cached_position = cached_orbital_positions[cache_index]
-            if requested_date == cached_position.time:
-                is_date_cached = True
-                requested_orbital_positions.append(cached_position)
-                break
-
-            cache_index += 1
-
-        if not is_date_cached:
-            return None
+    missing_dates = list()
+    for requested_date, cached_position in match_cached_positions(
+        requested_dates, cached_query
+    ):
+        if cached_position is None:
+            missing_dates.append(requested_date)
+        else:
+            requested_orbital_positions.append(cached_position)
+
+    return (requested_orbital_positions, missing_dates)
 
-    return requested_orbital_positions
 
+def match_cached_positions(
+    requested_dates: Iterable[datetime],
+    cached_query: QuerySet[OrbitalPosition],
+) -> Generator[Tuple[datetime, OrbitalPosition | None], None, None]:
+    """
+    Pairs each requested date with its cached orbital position, or None if it isn't cached.
+    Only the rows at exactly the requested dates are loaded, COVERAGE_BATCH_SIZE dates per query,
+    so cached positions that are more granular than requested are never read.
+    """
+    for batch in batched(requested_dates, COVERAGE_BATCH_SIZE):
+        cached_positions = {
+            cached_position.time: cached_position
+            for cached_position in cached_query.filter(time__in=batch)
+        }
+        for requested_date in batch:
+            yield (requested_date, cached_positions.get(requested_date))
 
-def fetch_elements_data(
+
+def stream_orbital_positions(
+    orbital_body: OrbitalBody | None,
     orbital_body_id: str,
     center: str,
     start_time: datetime,
     stop_time: datetime,
     step: str,
-) -> str:
-    url = (
-        "https://ssd.jpl.nasa.gov/api/horizons.api?format=text&COMMAND="
-        + orbital_body_id
-        + "&OBJ_DATA=NO&MAKE_EPHEM=YES&EPHEM_TYPE=ELEMENTS&CENTER="
-        + center
-        + "&START_TIME="
-        + start_time.strftime(DATE_FORMAT)
-        + "&STOP_TIME="
-        + stop_time.strftime(DATE_FORMAT)
-        + "&STEP_SIZE="
-        + step
-        + "&QUANTITIES='1,9,20,23,24,29'&CSV_FORMAT=YES&OUT_UNITS=AU-D"
+) -> Generator[OrbitalPosition, None, None]:
+    """
+    Yields the requested orbital positions in order, without holding the whole range in memory.
+    Cached positions are looked up with find_cached_positions, STREAM_FETCH_SIZE dates at a time, so like other
+    requests only recorded coverage counts as cached, and chunk storage is read when it's enabled.
+    Uncached gaps are fetched from Horizons at most STREAM_FETCH_SIZE positions at a time, except ones that
+    Horizons recently had no positions for, and each fetched batch is cached once it has been yielded.
+    Raises UnknownOrbitalBodyError if Horizons doesn't know the orbital body.
+    """
+    (skip, interval) = parse_step(step)
+    requested_dates = clamp_to_ephemeris(
+        orbital_body, generate_date_range(start_time, stop_time, interval, skip)
     )
-    with urllib.request.urlopen(url) as response:
-        return response.read().decode("utf-8")
 
+    for is_cached, matches in groupby(
+        stream_cached_matches(orbital_body, orbital_body_id, center, requested_dates),
+        key=lambda match: match[1] is not None,
+    ):
+        if is_cached:
+            for _, cached_position in matches:
+                if cached_position is not None:
+                    yield cached_position
+            continue
 
-def parse_elements_data(
-    response: str, orbital_body_id: str, center: str
-) -> list[OrbitalPosition]:
-    lines = response.split("\n")
-    reading_elements = False
-    orbital_positions = list()
-    for line in lines:
-        if "$$EOE" in line:
-            break
-
-        elif reading_elements:
-            elements = line.split(",")
-            orbital_position = OrbitalPosition()
-            orbital_position.orbital_body_id = orbital_body_id
-            orbital_position.time = pytz.utc.localize(
-                datetime.strptime(elements[1].strip(), "A.D. %Y-%b-%d %H:%M:%S.0000")
-            )
-            orbital_position.semimajor_axis = float(elements[11])
-            orbital_position.eccentricity = float(elements[2])
-            orbital_position.inclination = float(elements[4])
-            argument_of_periapsis = float(elements[6])
-            mean_anomaly = float(elements[9])
-            orbital_position.longitude_of_ascending_node = float(elements[5])
-            orbital_position.mean_longitude = (
-                orbital_position.longitude_of_ascending_node
-                + argument_of_periapsis
-                + mean_anomaly
+        for gap in batched(matches, STREAM_FETCH_SIZE):
+            gap_start = gap[0][0]
+            gap_stop = gap[-1][0]
+            (fetch_start, fetch_stop) = fetch_range(gap_start, gap_stop, interval, skip)
+            if is_empty_range(orbital_body_id, center, fetch_start, fetch_stop, step):
+                continue
+            result = fetch_elements_data(
+                orbital_body_id, center, fetch_start, fetch_stop, step
             )
-            orbital_position.longitude_of_periapsis = (
-                orbital_position.longitude_of_ascending_node + argument_of_periapsis
-            )
-            orbital_position.center = center
-            orbital_positions.append(orbital_position)
 
-        elif "$$SOE" in line:
-            reading_elements = True
+            if orbital_body is None:
+                orbital_body = create_orbital_body(orbital_body_id, result)
 
-    return orbital_positions
+            with span("parse"):
+                fetched_positions = (
+                    parse_elements_table(result)
+                    .until(gap_stop)
+                    .to_orbital_positions(orbital_body_id, center)
+                )
+            # Don't hold on to the raw response while the positions stream out.
+            del result
+            if len(fetched_positions) == 0:
+                remember_empty_range(
+                    orbital_body_id, center, fetch_start, fetch_stop, step
+                )
+            yield from fetched_positions
+            cache_orbital_positions(fetched_positions, step)
+
+
+def stream_cached_matches(
+    orbital_body: OrbitalBody | None,
+    orbital_body_id: str,
+    center: str,
+    requested_dates: Iterable[datetime],
+) -> Generator[Tuple[datetime, OrbitalPosition | None], None, None]:
+    """
+    Pairs each requested date with its cached orbital position, or None if it isn't cached, looking them up
+    with find_cached_positions STREAM_FETCH_SIZE dates at a time.
+    """
+    for batch in batched(requested_dates, STREAM_FETCH_SIZE):
+        (cached_positions, _) = find_cached_positions(
+            orbital_body, orbital_body_id, center, batch[0], batch[-1], batch
+        )
+        positions_by_time = {position.time: position for position in cached_positions}
+        for requested_date in batch:
+            yield (requested_date, positions_by_time.get(requested_date))
+
+
+def start_streaming(orbital_positions: Iterator[T]) -> Iterator[T]:
+    """Runs a generator up to its first item now, so that anything it raises before then is raised here."""
+    try:
+        first_position = next(orbital_positions)
+    except StopIteration:
+        return iter(list())
+    return chain([first_position], orbital_positions)
+
+
+def splice_positions(
+    requested_dates: List[datetime],
+    cached_positions: List[OrbitalPosition],
+    fetched_positions: List[OrbitalPosition],
+) -> List[OrbitalPosition]:
+    """
+    Merges cached and freshly fetched positions into one list covering the requested dates.
+    Fetched positions win over cached ones, since Horizons may have more up-to-date data.
+    """
+    positions_by_time = {position.time: position for position in cached_positions}
+    for position in fetched_positions:
+        positions_by_time[position.time] = position
+    return [
+        positions_by_time[date] for date in requested_dates if date in positions_by_time
+    ]
+
+
+def parse_elements_data(
+    response: str, orbital_body_id: str, center: str
+) -> list[OrbitalPosition]:
+    with span("parse"):
+        return parse_elements_table(response).to_orbital_positions(
+            orbital_body_id, center
+        )
 
 
 def parse_name(response: str, orbital_body_id: str) -> str:
@@ -232,22 +1183,27 @@ def parse_name(response: str, orbital_body_id: str) -> str:
 
 
 def get_ephemeris_date_range(orbital_body_id: str) -> Tuple[datetime, datetime]:
-    first_result = fetch_elements_data(
-        orbital_body_id,
-        "500@10",
-        datetime.min,
-        datetime.min + timedelta(seconds=1),
-        "1d",
-    )
-    first_date = parse_ephemeris_date(first_result, False)
-    last_result = fetch_elements_data(
-        orbital_body_id,
-        "500@10",
-        datetime.max - timedelta(seconds=1),
-        datetime.max,
-        "1d",
-    )
-    last_date = parse_ephemeris_date(last_result, True)
+    # Ask for dates before and after every possible ephemeris, at the same time,
+    # and read the ephemeris range from the error messages.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first_result = executor.submit(
+            fetch_elements_data,
+            orbital_body_id,
+            "500@10",
+            datetime.min,
+            datetime.min + timedelta(seconds=1),
+            "1d",
+        )
+        last_result = executor.submit(
+            fetch_elements_data,
+            orbital_body_id,
+            "500@10",
+            datetime.max - timedelta(seconds=1),
+            datetime.max,
+            "1d",
+        )
+        first_date = parse_ephemeris_date(first_result.result(), False)
+        last_date = parse_ephemeris_date(last_result.result(), True)
     return (first_date, last_date)
 
 
@@ -265,11 +1221,61 @@ def parse_ephemeris_date(response: str, last: bool) -> datetime:
             return date
 
 
-def create_orbital_body(orbital_body_id: str, horizons_result: str) -> None:
+def create_orbital_body(orbital_body_id: str, horizons_result: str) -> OrbitalBody:
+    """
+    Saves an orbital body we haven't seen before, named from a Horizons response for it.
+    Its ephemeris date range is found out in the background, and until then it's unbounded.
+    Raises UnknownOrbitalBodyError if the response shows that Horizons doesn't know it.
+    """
+    name = parse_name(horizons_result, orbital_body_id)
+    if name is None:
+        remember_unknown_orbital_body(orbital_body_id)
+        raise UnknownOrbitalBodyError(orbital_body_id)
+
     orbital_body = OrbitalBody()
     orbital_body.id = int(orbital_body_id)
-    orbital_body.name = parse_name(horizons_result, orbital_body_id)
-    (first_date, last_date) = get_ephemeris_date_range(orbital_body_id)
-    orbital_body.first_ephemeris_date = first_date
-    orbital_body.last_ephemeris_date = last_date
+    orbital_body.name = name
     orbital_body.save()
+    get_shared_cache().set(orbital_body_key(orbital_body_id.strip()), orbital_body)
+    discover_ephemeris_date_range(orbital_body_id)
+    return orbital_body
+
+
+def discover_ephemeris_date_range(orbital_body_id: str) -> None:
+    """
+    Finds out the orbital body's ephemeris date range in the background, unless that has been tried in the last
+    HORIZONSAPI_NEGATIVE_CACHE_TTL seconds. If it fails, it's tried again once that has passed.
+    """
+    if not start_discovery(orbital_body_id):
+        return
+    discovery = BACKGROUND_METADATA_DISCOVERY.submit(
+        with_own_connection(save_ephemeris_date_range), orbital_body_id
+    )
+    discovery.add_done_callback(
+        lambda discovery: log_discovery_failure(orbital_body_id, discovery)
+    )
+
+
+def log_discovery_failure(orbital_body_id: str, discovery: Future) -> None:
+    error = discovery.exception()
+    if error is not None:
+        logger.warning(
+            "Couldn't find out the ephemeris date range of orbital body %s",
+            orbital_body_id,
+            exc_info=error,
+        )
+
+
+def save_ephemeris_date_range(orbital_body_id: str) -> None:
+    (first_date, last_date) = get_ephemeris_date_range(orbital_body_id)
+    if first_date is None or last_date is None:
+        # Horizons didn't say, so the orbital body stays unbounded until it's tried again.
+        logger.warning(
+            "Horizons didn't give the ephemeris date range of orbital body %s",
+            orbital_body_id,
+        )
+        return
+    OrbitalBody.objects.filter(id=orbital_body_id).update(
+        first_ephemeris_date=first_date, last_ephemeris_date=last_date
+    )
+    get_shared_cache().delete(orbital_body_key(orbital_body_id.strip()))